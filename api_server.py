@@ -0,0 +1,378 @@
+# api_server.py
+"""Async JSON API for the chatbot, alongside the Streamlit UI.
+
+    python api_server.py --port 8000
+
+Endpoints (JSON in, JSON out):
+    POST   /sessions                                 {"cohort": optional} -> {"session_id"}
+    GET    /sessions/{id}/messages[?older=N]             recent messages, or N before them
+    POST   /sessions/{id}/chat                       {"message", "stream": false}
+    POST   /sessions/{id}/questionnaire/start        {"test": "PHQ9" | "GAD7"}
+    POST   /sessions/{id}/questionnaire/answer       {"score": 0-3}
+    POST   /sessions/{id}/questionnaire/decline      {"test": "PHQ9" | "GAD7"}
+    GET    /sessions/{id}/risk
+    DELETE /sessions/{id}
+    GET    /healthz, /readyz
+    GET    /metrics                                  only with API_METRICS=1
+
+With "stream": true the chat reply is sent as NDJSON: {"delta": ...} lines as
+the LLM produces them, then one {"done": true, ...} line with the same fields
+as the non-streamed response. Active sessions live in this process; with
+SESSION_DB_PATH set they are also stored in SQLite, so any worker on the host
+resumes a session id it has not seen (restart, load-balancer failover). Every
+session shares the retriever, the query batcher and one async LLM client.
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+import config
+from modules.analytics import allowed_cohort
+from modules.batcher import collect_metrics as batcher_metrics
+from modules.chat_manager import ChatManager
+from modules.llm_client import AsyncLLMClient
+from modules.metrics import REGISTRY, stats_collector
+from modules.phq_gad import OPTIONS
+from modules.rag import collect_metrics as rag_metrics
+from modules.session_store import get_shared_session_store
+from modules import warmup
+
+TEST_NAMES = {"PHQ9": "PHQ-9", "GAD7": "GAD-7"}
+DECLINE_REPLIES = {
+    "PHQ9": "🧠 No problem! We can continue chatting. I'll check in with you again later about the questionnaires.",
+    "GAD7": "🧠 That's okay! We can continue our conversation. The GAD-7 can wait for another time.",
+}
+ANSWER_ERROR_REPLY = (
+    "🧠 It looks like there was an issue. Let's continue chatting, or you can start the questionnaire again later."
+)
+
+
+class Session:
+    __slots__ = ("chat", "lock", "last_used")
+
+    def __init__(self, session_id=None, cohort=None, store=None):
+        # store=None: the shared session store, if one is configured
+        self.chat = ChatManager(session_id=session_id, cohort=cohort, store=store)
+        # One turn at a time per session; different sessions run concurrently
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+
+
+class SessionRegistry:
+    """Active sessions keyed by id, dropped after ttl idle seconds or beyond max_sessions (LRU).
+
+    With a session store, dropped sessions are only unloaded: the next request
+    for the id loads them back. Store reads (and the write-behind flush they
+    trigger) are SQLite calls, so they run on a worker thread, not the loop.
+    """
+
+    def __init__(self, ttl=config.API_SESSION_TTL, max_sessions=config.API_MAX_SESSIONS, store=None):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        # store=False keeps sessions in memory even when a store is configured
+        self.store = get_shared_session_store() if store is None else (store or None)
+        self._sessions = OrderedDict()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    async def create(self, cohort=None):
+        # A new ChatManager checks the store for its id
+        return self._add(await asyncio.to_thread(Session, uuid.uuid4().hex, cohort, self.store or False))
+
+    def _add(self, session):
+        self._sessions[session.chat.session_id] = session
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return session.chat.session_id
+
+    async def get(self, session_id):
+        session = self._sessions.get(session_id)
+        if session is None:
+            if self.store is None:
+                return None
+            loaded = await asyncio.to_thread(self._load, session_id)
+            if loaded is None:
+                return None
+            # Another request for the id may have loaded it while this one waited
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = loaded
+                self._add(session)
+        session.last_used = time.monotonic()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _load(self, session_id):
+        # Checked first so an unknown id never creates a session; ChatManager reads the state
+        if not self.store.exists(session_id):
+            return None
+        return Session(session_id, store=self.store)
+
+    async def delete(self, session_id):
+        found = self._sessions.pop(session_id, None) is not None
+        if self.store is not None:
+            found = await asyncio.to_thread(self.store.delete, session_id) or found
+        return found
+
+    def expire(self):
+        cutoff = time.monotonic() - self.ttl
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.last_used > cutoff:
+                break
+            del self._sessions[session_id]
+
+
+SESSIONS = web.AppKey("sessions", SessionRegistry)
+LLM = web.AppKey("llm", AsyncLLMClient)
+EXPIRY = web.AppKey("expiry", asyncio.Task)
+
+
+async def _session(request):
+    session = await request.app[SESSIONS].get(request.match_info["session_id"])
+    if session is None:
+        raise web.HTTPNotFound(text=json.dumps({"error": "unknown session"}), content_type="application/json")
+    return session
+
+
+async def _json_body(request):
+    try:
+        body = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise web.HTTPBadRequest(text=json.dumps({"error": "body must be JSON"}), content_type="application/json")
+    if not isinstance(body, dict):
+        raise web.HTTPBadRequest(text=json.dumps({"error": "body must be a JSON object"}),
+                                 content_type="application/json")
+    return body
+
+
+def _bad_request(message):
+    return web.json_response({"error": message}, status=400)
+
+
+def _question_payload(chat, question):
+    return {
+        "test": chat.current_test_name,
+        "question": question,
+        "index": chat.test_index,
+        "total": len(chat.current_test),
+        "options": [{"label": label, "score": score} for label, score in OPTIONS],
+    }
+
+
+def _risk_payload(chat):
+    return {
+        "phq9_risk": chat.phq9_risk,
+        "gad7_risk": chat.gad7_risk,
+        "overall_risk": chat.calculate_overall_risk(),
+    }
+
+
+def _reply_payload(chat):
+    reply, show_buttons, test_type = chat.last_reply
+    return {"reply": reply, "show_test_prompt": show_buttons, "test_type": test_type}
+
+
+async def create_session(request):
+    # The body is optional; a cohort only groups anonymous questionnaire analytics
+    cohort = (await _json_body(request)).get("cohort") if request.can_read_body else None
+    if cohort is not None and allowed_cohort(cohort) is None:
+        return _bad_request("cohort must be one of the configured cohorts (ANALYTICS_COHORTS)")
+    return web.json_response({"session_id": await request.app[SESSIONS].create(cohort)}, status=201)
+
+
+async def delete_session(request):
+    if not await request.app[SESSIONS].delete(request.match_info["session_id"]):
+        return web.json_response({"error": "unknown session"}, status=404)
+    return web.json_response({"deleted": True})
+
+
+async def get_messages(request):
+    session = await _session(request)
+    older = request.query.get("older")
+    if older is not None:
+        if not older.isdigit():
+            return _bad_request("older must be a non-negative integer")
+        # Older messages are read from the session store
+        messages = await asyncio.to_thread(session.chat.get_older_messages, int(older))
+        return web.json_response({"messages": messages})
+    return web.json_response({"messages": session.chat.get_messages(), "total": len(session.chat.messages)})
+
+
+async def chat_turn(request):
+    session = await _session(request)
+    body = await _json_body(request)
+    message = body.get("message")
+    if not isinstance(message, str) or not message.strip():
+        return _bad_request("message must be a non-empty string")
+
+    async with session.lock:
+        chat = session.chat
+        if chat.current_test is not None:
+            return web.json_response({"error": "questionnaire in progress"}, status=409)
+        chat.add_user_message(message)
+        replies = chat.generate_reply_stream_async(message, request.app[LLM])
+        try:
+            if not body.get("stream"):
+                async for _ in replies:
+                    pass
+                return web.json_response(_reply_payload(chat))
+
+            response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+            await response.prepare(request)
+            try:
+                async for delta in replies:
+                    await response.write(json.dumps({"delta": delta}).encode("utf-8") + b"\n")
+                await response.write(json.dumps(dict(_reply_payload(chat), done=True)).encode("utf-8") + b"\n")
+                await response.write_eof()
+            except ConnectionResetError:
+                pass  # the client went away; closing replies records what it was sent
+            return response
+        finally:
+            # Frees the LLM slot at once and, if the reply was cut short, records the partial reply
+            await replies.aclose()
+
+
+async def start_questionnaire(request):
+    session = await _session(request)
+    test = (await _json_body(request)).get("test", "PHQ9")
+    if test not in TEST_NAMES:
+        return _bad_request("test must be PHQ9 or GAD7")
+    async with session.lock:
+        chat = session.chat
+        question = chat.start_test(test)
+        chat.add_bot_message(f"{TEST_NAMES[test]} Question {chat.test_index + 1}/{len(chat.current_test)}: {question}")
+        return web.json_response(_question_payload(chat, question))
+
+
+async def answer_questionnaire(request):
+    session = await _session(request)
+    score = (await _json_body(request)).get("score")
+    if isinstance(score, bool) or score not in [s for _, s in OPTIONS]:
+        return _bad_request("score must be 0, 1, 2 or 3")
+    async with session.lock:
+        chat = session.chat
+        if chat.current_test is None:
+            return web.json_response({"error": "no questionnaire in progress"}, status=409)
+        result = chat.record_answer(score)
+
+        if result is None:
+            chat.add_bot_message(ANSWER_ERROR_REPLY)
+            return web.json_response({"error": "could not record answer", "reply": ANSWER_ERROR_REPLY}, status=500)
+
+        if isinstance(result, tuple):
+            risk_level, completed_test = result
+            if completed_test == "PHQ9":
+                message = f"✅ *PHQ-9 Complete!* Your depression screening result: *{risk_level.upper()}*"
+            else:
+                overall_risk = chat.calculate_overall_risk()
+                message = f"✅ *GAD-7 Complete!* Your anxiety screening result: *{risk_level.upper()}*\n\n"
+                message += "📊 Overall Assessment Summary:\n"
+                message += f"• Depression (PHQ-9): *{chat.phq9_risk.upper()}*\n"
+                message += f"• Anxiety (GAD-7): *{chat.gad7_risk.upper()}*\n"
+                message += f"• *Overall Risk Level: {overall_risk.upper()}*\n"
+            chat.add_bot_message(message)
+            return web.json_response(dict(_risk_payload(chat), completed=completed_test, risk=risk_level,
+                                          reply=message))
+
+        chat.add_bot_message(f"*Question {chat.test_index + 1}/{len(chat.current_test)}*: {result}")
+        return web.json_response(_question_payload(chat, result))
+
+
+async def decline_questionnaire(request):
+    session = await _session(request)
+    test = (await _json_body(request)).get("test", "PHQ9")
+    if test not in TEST_NAMES:
+        return _bad_request("test must be PHQ9 or GAD7")
+    async with session.lock:
+        session.chat.decline_test(test)
+        session.chat.add_bot_message(DECLINE_REPLIES[test])
+        return web.json_response({"reply": DECLINE_REPLIES[test]})
+
+
+async def get_risk(request):
+    session = await _session(request)
+    return web.json_response(_risk_payload(session.chat))
+
+
+async def healthz(request):
+    return web.json_response({"ok": True, "ready": warmup.is_ready(), "sessions": len(request.app[SESSIONS])})
+
+
+async def readyz(request):
+    """503 until the model and index are loaded and warm; route traffic here once it is 200"""
+    return web.json_response(warmup.status(), status=200 if warmup.is_ready() else 503)
+
+
+async def metrics(request):
+    return web.Response(text=REGISTRY.render_prometheus(), content_type="text/plain", charset="utf-8")
+
+
+async def _expire_sessions(app):
+    while True:
+        await asyncio.sleep(60)
+        app[SESSIONS].expire()
+
+
+async def _on_startup(app):
+    loop = asyncio.get_running_loop()
+    # Retrieval and other blocking work run here (asyncio.to_thread uses the default executor)
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=config.API_WORKER_THREADS,
+                                                 thread_name_prefix="api-worker"))
+    app[LLM] = AsyncLLMClient()
+    # Load the model and index in the background; requests are served meanwhile
+    # (a chat turn arriving first waits for the retriever) and /readyz reports when done
+    warmup.start()
+    app[EXPIRY] = asyncio.create_task(_expire_sessions(app))
+    REGISTRY.register_collector("api", lambda: [("pfa_api_sessions", {}, len(app[SESSIONS]))])
+    REGISTRY.register_collector("llm_async", stats_collector("pfa_llm_async", app[LLM].stats))
+    REGISTRY.register_collector("batcher", batcher_metrics)
+    REGISTRY.register_collector("rag", rag_metrics)
+
+
+async def _on_cleanup(app):
+    app[EXPIRY].cancel()
+    await app[LLM].aclose()
+
+
+def make_app(sessions=None, metrics_route=config.API_METRICS):
+    app = web.Application()
+    # An empty registry is falsy (__len__), so test for None
+    app[SESSIONS] = sessions if sessions is not None else SessionRegistry()
+    app.on_startup.append(_on_startup)
+    app.on_cleanup.append(_on_cleanup)
+    app.add_routes([
+        web.post("/sessions", create_session),
+        web.delete("/sessions/{session_id}", delete_session),
+        web.get("/sessions/{session_id}/messages", get_messages),
+        web.post("/sessions/{session_id}/chat", chat_turn),
+        web.post("/sessions/{session_id}/questionnaire/start", start_questionnaire),
+        web.post("/sessions/{session_id}/questionnaire/answer", answer_questionnaire),
+        web.post("/sessions/{session_id}/questionnaire/decline", decline_questionnaire),
+        web.get("/sessions/{session_id}/risk", get_risk),
+        web.get("/healthz", healthz),
+        web.get("/readyz", readyz),
+    ])
+    if metrics_route:
+        # Unauthenticated and API_HOST is usually public; otherwise use METRICS_PORT (localhost)
+        app.add_routes([web.get("/metrics", metrics)])
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=config.API_HOST)
+    parser.add_argument("--port", type=int, default=config.API_PORT)
+    args = parser.parse_args()
+    web.run_app(make_app(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,11 @@
 import streamlit as st
 from modules.chat_manager import ChatManager
 from modules.phq_gad import OPTIONS
-import json
+from modules.metrics import REGISTRY, span, start_metrics_server, stats_collector, timed_render
+from modules import warmup
+
+# Model and index load in the background (once per process) while the page renders
+warmup.start()
 
 # ---------------------------
 # Session state for PHQ/GAD
@@ -18,6 +22,8 @@ if "show_test_prompt_buttons" not in st.session_state:
     st.session_state.show_test_prompt_buttons = False
 if "pending_test_type" not in st.session_state:
     st.session_state.pending_test_type = "PHQ9"
+if "older_shown" not in st.session_state:
+    st.session_state.older_shown = 0
 
 # ---------------------------
 # Page setup
@@ -29,9 +35,29 @@ st.title("🧠 Student Mental Health Support Bot")
 # Initialize chat manager
 # ---------------------------
 if "chat" not in st.session_state:
-    st.session_state.chat = ChatManager()
+    # With a session store (SESSION_DB_PATH) the ?sid= in the URL resumes the
+    # conversation after a restart or on another replica
+    # ?cohort= files questionnaire results under a group for analytics (ANALYTICS_COHORTS only)
+    st.session_state.chat = ChatManager(session_id=st.query_params.get("sid"), cohort=st.query_params.get("cohort"))
+    if st.session_state.chat.store is not None:
+        st.query_params["sid"] = st.session_state.chat.session_id
+    if st.session_state.chat.current_test is not None:
+        st.session_state.test_phase = True
+        st.session_state.current_question = st.session_state.chat.get_next_question()
 chat = st.session_state.chat
 
+# ---------------------------
+# Metrics endpoint (once per process; Streamlit reruns this script every interaction)
+# ---------------------------
+if start_metrics_server() is not None:
+    from modules.batcher import collect_metrics as batcher_metrics
+    from modules.rag import collect_metrics as rag_metrics
+    from modules.utils import get_client
+    REGISTRY.register_collector("llm", stats_collector("pfa_llm", lambda: get_client().stats()))
+    REGISTRY.register_collector("intent", stats_collector("pfa_intent", chat.router.stats))
+    REGISTRY.register_collector("batcher", batcher_metrics)
+    REGISTRY.register_collector("rag", rag_metrics)
+
 # ---------------------------
 # API Mode (for frontend fetch)
 # ---------------------------
@@ -52,9 +78,14 @@ if api_mode:
 # ---------------------------
 # Display chat history
 # ---------------------------
-for msg in chat.get_messages():
-    with st.chat_message(msg["role"]):
-        st.markdown(msg["content"])
+with span("render_history"):
+    # Only recent messages are kept in memory; older ones are read on request
+    hidden = len(chat.messages) - len(chat.get_messages()) - st.session_state.older_shown
+    if hidden > 0 and st.button(f"Show earlier messages ({hidden})"):
+        st.session_state.older_shown += 20
+    for msg in chat.get_older_messages(st.session_state.older_shown) + chat.get_messages():
+        with st.chat_message(msg["role"]):
+            st.markdown(msg["content"])
 
 # ---------------------------
 # Handle test prompt buttons (Yes/No)
@@ -168,12 +199,16 @@ if user_input := st.chat_input("Type your message here...", disabled=st.session_
         st.markdown(user_input)
 
     if not st.session_state.test_phase:
-        bot_reply, show_buttons, test_type = chat.generate_reply(user_input)
+        if not warmup.is_ready():
+            with st.spinner("Loading the knowledge base…"):
+                warmup.wait_ready()
+        # Render the reply token by token as it streams in. render_reply is the
+        # Streamlit drawing time only; the turn itself is llm_ttft/llm_total/turn
+        with st.chat_message("assistant"):
+            st.write_stream(timed_render(chat.generate_reply_stream(user_input), "render_reply"))
+        _, show_buttons, test_type = chat.last_reply
         st.session_state.show_test_prompt_buttons = show_buttons
         st.session_state.pending_test_type = test_type
 
-        with st.chat_message("assistant"):
-            st.markdown(bot_reply)
-
         if show_buttons:
             st.rerun()
\ No newline at end of file
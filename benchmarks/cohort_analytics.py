@@ -0,0 +1,94 @@
+# benchmarks/cohort_analytics.py
+"""Compare cohort reports from the aggregate cube against a full rescan.
+
+    python -m benchmarks.cohort_analytics
+    python -m benchmarks.cohort_analytics --rows 5000000 --cohorts 40 --json results.json
+
+Writes synthetic PHQ-9 / GAD-7 submissions spread over a year into a
+throwaway store, then times the severity-by-cohort and monthly-trend
+reports two ways: from the folded per-day aggregates (what the module
+serves), and by reading every segment back and grouping the rows with
+pandas (what a report without the cube would cost).
+"""
+import argparse
+import json
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from modules.analytics import QuestionnaireStore, QUESTIONS, TESTS, severity_bands
+
+BATCH = 200_000
+
+
+def ingest(store, rows, cohorts, seed=0):
+    rng = np.random.default_rng(seed)
+    labels = np.array([f"cohort-{i:02d}" for i in range(cohorts)])
+    start = int(time.time()) - 365 * 86400
+    for offset in range(0, rows, BATCH):
+        test = TESTS[(offset // BATCH) % len(TESTS)]
+        n = min(BATCH, rows - offset)
+        answers = rng.integers(0, 4, (n, len(QUESTIONS[test]))) * (rng.random((n, len(QUESTIONS[test]))) < 0.5)
+        store.append_many(test, answers, labels[rng.integers(0, cohorts, n)], start + rng.integers(0, 365 * 86400, n))
+
+
+def rescan_reports(store, test):
+    rows = store.scan()
+    frame = pd.DataFrame({"ts": rows["ts"], "test": rows["test"], "cohort": rows["cohort"], "total": rows["total"]})
+    frame = frame[frame["test"] == TESTS.index(test)]
+    frame["band"] = severity_bands(frame["test"].to_numpy(), frame["total"].to_numpy())
+    by_cohort = frame.groupby("cohort").agg(n=("total", "size"), mean_total=("total", "mean"))
+    bands = pd.crosstab(frame["cohort"], frame["band"], normalize="index")
+    month = pd.to_datetime(frame["ts"], unit="s").dt.to_period("M")
+    trend = frame.groupby(month)["total"].agg(["size", "mean"])
+    return by_cohort.join(bands), trend
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--cohorts", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        store = QuestionnaireStore(root, flush_interval=0, min_count=0, allowed_cohorts=None)
+        start = time.perf_counter()
+        ingest(store, args.rows, args.cohorts)
+        ingest_s = time.perf_counter() - start
+
+        def cube_reports():
+            store.severity_distribution("PHQ9", by_cohort=True)
+            store.trend("PHQ9", "M")
+
+        results = {
+            "rows": args.rows,
+            "cohorts": args.cohorts,
+            "segments": len(store._segment_names()),
+            "ingest_rows_per_s": round(args.rows / ingest_s),
+            "cube_ms": round(timed(cube_reports, args.repeat), 2),
+            "rescan_ms": round(timed(lambda: rescan_reports(store, "PHQ9"), args.repeat), 2),
+        }
+        results["speedup"] = round(results["rescan_ms"] / results["cube_ms"], 1)
+
+    for name, value in results.items():
+        print(f"{name:<18} {value}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
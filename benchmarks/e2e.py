@@ -0,0 +1,271 @@
+# benchmarks/e2e.py
+"""End-to-end chat benchmark: ChatManager against a local fake LLM, no Streamlit.
+
+    python -m benchmarks.e2e                                  # 32 sessions, 8 at a time
+    python -m benchmarks.e2e --sessions 200 --concurrency 50 --ttft 0.4
+    python -m benchmarks.e2e --stream --json results.json
+    python -m benchmarks.e2e --build-sizes 500,2000,8000      # index build time vs corpus size
+
+Every session replays a scripted conversation (small talk, venting, the PHQ-9
+and GAD-7 flows through start_test/record_answer). Reports turn throughput,
+exact turn latency percentiles, per-stage percentiles from modules.metrics
+(bucket upper bounds, as Prometheus would estimate them), peak RSS and the
+RAGRetriever startup time. Write --json from every version to compare runs.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from modules.fake_llm import FakeLLMServer
+
+# ("say", text) is a chat turn; ("test", name) answers a whole questionnaire
+SCRIPTS = [
+    [
+        ("say", "hi"),
+        ("say", "I've been feeling really stressed about my exams lately"),
+        ("say", "I can't sleep properly and I keep worrying I'll fail"),
+        ("say", "my parents expect a lot from me"),
+        ("test", "PHQ9"),
+        ("say", "ok"),
+        ("say", "what can I do to focus better when I'm anxious?"),
+        ("say", "I also feel lonely since I moved to the hostel"),
+        ("test", "GAD7"),
+        ("say", "thank you"),
+        ("say", "bye"),
+    ],
+    [
+        ("say", "hello, how are you?"),
+        ("say", "I feel low most days and nothing seems fun anymore"),
+        ("say", "I skipped classes this week because I couldn't get out of bed"),
+        ("say", "yes"),
+        ("test", "PHQ9"),
+        ("say", "how do I talk to a counsellor about this?"),
+        ("say", "I'm scared my friends will judge me"),
+        ("test", "GAD7"),
+        ("say", "thanks, that helps"),
+    ],
+    [
+        ("say", "hey"),
+        ("say", "how do I deal with panic attacks before presentations?"),
+        ("say", "my heart races and my hands shake"),
+        ("say", "are breathing exercises actually useful?"),
+        ("say", "I think I procrastinate because I'm afraid of failing"),
+        ("say", "good night"),
+    ],
+]
+
+_SENTENCES = [
+    "Exam stress is common among students and usually eases with regular sleep and breaks.",
+    "Talking to a trusted friend or counsellor can reduce feelings of isolation.",
+    "Slow breathing for a few minutes activates the body's relaxation response.",
+    "Breaking study tasks into small steps makes procrastination easier to overcome.",
+    "Persistent low mood for more than two weeks is worth discussing with a professional.",
+    "Physical activity, even a short walk, has measurable benefits for anxiety.",
+    "Campus counselling services are confidential and free for enrolled students.",
+    "Writing worries down before bed can help quieten racing thoughts.",
+]
+
+
+def percentiles(values):
+    if not values:
+        return {"p50": None, "p95": None, "p99": None}
+    ms = np.array(values) * 1000
+    return {f"p{q}": round(float(np.percentile(ms, q)), 2) for q in (50, 95, 99)}
+
+
+def peak_rss_bytes():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _bound_ms(seconds):
+    # Past the last bucket the histogram only knows "more than that"
+    return None if seconds == float("inf") else round(seconds * 1000, 2)
+
+
+def run_session(make_chat, script, stream, rng, turn_times, lock):
+    chat = make_chat()
+    for step, arg in script:
+        start = time.perf_counter()
+        if step == "say":
+            chat.add_user_message(arg)
+            if stream:
+                for _ in chat.generate_reply_stream(arg):
+                    pass
+            else:
+                chat.generate_reply(arg)
+        else:
+            question = chat.start_test(arg)
+            while question is not None and not isinstance(question, tuple):
+                chat.add_bot_message(question)
+                question = chat.record_answer(rng.randint(0, 3))
+        elapsed = time.perf_counter() - start
+        with lock:
+            turn_times.setdefault(step, []).append(elapsed)
+
+
+def run_load(sessions, concurrency, stream, seed=0):
+    """Replay sessions scripted conversations, concurrency at a time, through the shared engine"""
+    from modules.chat_manager import ChatManager
+    from modules.metrics import REGISTRY
+
+    turn_times = {}
+    lock = threading.Lock()
+    rng = random.Random(seed)
+    jobs = [(SCRIPTS[i % len(SCRIPTS)], random.Random(rng.random())) for i in range(sessions)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [
+            # Scripted PHQ/GAD answers must not land in the real questionnaire analytics
+            pool.submit(run_session, lambda: ChatManager(analytics=False), script, stream, session_rng, turn_times,
+                        lock)
+            for script, session_rng in jobs
+        ]
+        for future in futures:
+            future.result()
+    wall = time.perf_counter() - start
+
+    turns = sum(len(v) for v in turn_times.values())
+    stages = {}
+    for key, (count, total, p50, p95, p99) in sorted(REGISTRY.snapshot("pfa_stage_seconds").items()):
+        stages[dict(key)["stage"]] = {
+            "count": count,
+            "mean_ms": round(total / count * 1000, 2) if count else None,
+            "p50_ms_le": _bound_ms(p50),
+            "p95_ms_le": _bound_ms(p95),
+            "p99_ms_le": _bound_ms(p99),
+        }
+    return {
+        "sessions": sessions,
+        "concurrency": concurrency,
+        "stream": stream,
+        "wall_s": round(wall, 3),
+        "turns": turns,
+        "turns_per_s": round(turns / wall, 2) if wall else None,
+        "chat_turn_ms": percentiles(turn_times.get("say", [])),
+        "questionnaire_ms": percentiles(turn_times.get("test", [])),
+        "stages": stages,
+    }
+
+
+def write_corpus(folder, chunks, chunk_size=1000, seed=0):
+    """Synthetic .txt corpus of about `chunks` chunks, 50 chunks per file"""
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    per_file = 50
+    for n in range(0, chunks, per_file):
+        sentences = []
+        size = 0
+        while size < min(per_file, chunks - n) * chunk_size:
+            sentence = rng.choice(_SENTENCES)
+            sentences.append(sentence)
+            size += len(sentence) + 1
+        with open(os.path.join(folder, f"doc_{n // per_file:05d}.txt"), "w", encoding="utf-8") as f:
+            f.write(" ".join(sentences))
+
+
+def time_index_builds(sizes):
+    """Cold build and warm startup of a RAGRetriever for each synthetic corpus size"""
+    from modules.rag import RAGRetriever
+
+    results = []
+    for size in sizes:
+        root = tempfile.mkdtemp(prefix="pfa-bench-")
+        try:
+            write_corpus(os.path.join(root, "docs"), size)
+            paths = dict(docs_path=os.path.join(root, "docs"), index_dir=os.path.join(root, "index"))
+            start = time.perf_counter()
+            retriever = RAGRetriever(**paths)
+            build_s = time.perf_counter() - start
+            chunks = len(retriever.store)
+            del retriever
+
+            start = time.perf_counter()
+            RAGRetriever(**paths)
+            load_s = time.perf_counter() - start
+            results.append({"target_chunks": size, "chunks": chunks, "build_s": round(build_s, 3),
+                            "startup_s": round(load_s, 3)})
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--stream", action="store_true", help="use generate_reply_stream, as the UI does")
+    parser.add_argument("--ttft", type=float, default=0.2, help="fake LLM seconds to first token")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="fake LLM seconds between tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of fake LLM calls answered 429")
+    parser.add_argument("--build-sizes", default="", help="comma-separated corpus sizes (chunks) to time builds for")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    server = FakeLLMServer(ttft=args.ttft, token_delay=args.token_delay, error_rate=args.error_rate,
+                           retry_after=0, seed=args.seed).start()
+    # The shared LLM client reads the base URL when it is first created
+    import config
+    config.GROQ_BASE_URL = server.url
+
+    try:
+        from modules.rag import get_shared_retriever
+        start = time.perf_counter()
+        get_shared_retriever()
+        startup_s = time.perf_counter() - start
+
+        load = run_load(args.sessions, args.concurrency, args.stream, args.seed)
+        sizes = [int(s) for s in args.build_sizes.split(",") if s]
+        builds = time_index_builds(sizes) if sizes else []
+    finally:
+        server.stop()
+
+    from modules.batcher import get_shared_batcher
+    from modules.utils import get_client
+    results = {
+        "retriever_startup_s": round(startup_s, 3),
+        "fake_llm": {"ttft": args.ttft, "token_delay": args.token_delay, "error_rate": args.error_rate,
+                     "requests": server.requests},
+        "load": load,
+        "llm_client": get_client().stats(),
+        # None with BATCH_ENABLED=0: sessions then query the retriever directly
+        "batcher": get_shared_batcher().stats() if config.BATCH_ENABLED else None,
+        "peak_rss_bytes": peak_rss_bytes(),
+        "index_builds": builds,
+    }
+
+    print(f"RAGRetriever startup: {results['retriever_startup_s']} s")
+    print(f"{load['sessions']} sessions x{load['concurrency']}: {load['turns']} turns in {load['wall_s']} s "
+          f"= {load['turns_per_s']} turns/s")
+    print(f"chat turn ms: {load['chat_turn_ms']}, questionnaire ms: {load['questionnaire_ms']}")
+    print(f"{'stage':<16} {'count':>7} {'mean ms':>9} {'p50 <=':>8} {'p95 <=':>8} {'p99 <=':>8}")
+    for stage, s in load["stages"].items():
+        print(f"{stage:<16} {s['count']:>7} {s['mean_ms']:>9} {str(s['p50_ms_le']):>8} "
+              f"{str(s['p95_ms_le']):>8} {str(s['p99_ms_le']):>8}")
+    if results["batcher"]:
+        b = results["batcher"]
+        print(f"batcher: {b['queries']} queries in {b['batches']} batches (mean {b['mean_batch_size']}), "
+              f"queue delay ms {b['queue_delay_ms']}")
+    print(f"peak RSS: {results['peak_rss_bytes'] / 1e6:.1f} MB")
+    for b in builds:
+        print(f"build {b['chunks']:>7} chunks: {b['build_s']} s, warm startup {b['startup_s']} s")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# benchmarks/hybrid_retrieval.py
+"""Compare dense-only, hybrid (dense + BM25, RRF) and lexical-only retrieval.
+
+    python -m benchmarks.hybrid_retrieval
+    python -m benchmarks.hybrid_retrieval --queries 500 -k 4 --json results.json
+
+Queries are sampled from the indexed chunks themselves (known-item search),
+in two shapes: a sentence-length phrase from the chunk, and two of its
+rarest terms as a keyword query ("insomnia helpline"). A query scores a hit
+when its source chunk is in the top k. Reports hit@k, MRR and per-query
+latency for each mode, with the result cache disabled.
+"""
+import argparse
+import json
+import random
+import time
+
+import numpy as np
+
+from modules.bm25 import tokenize
+from modules.rag import RAGRetriever
+
+MODES = ("dense", "hybrid", "lexical")
+
+
+def make_queries(retriever, count, seed=0):
+    rng = random.Random(seed)
+    bm25 = retriever.bm25
+    phrases, keywords = [], []
+    for chunk_id in rng.sample(range(len(retriever.store)), min(count, len(retriever.store))):
+        words = retriever.store[chunk_id]["content"].split()
+        if len(words) < 12:
+            continue
+        start = rng.randrange(0, len(words) - 10)
+        phrases.append((" ".join(words[start:start + rng.randint(6, 10)]), chunk_id))
+        # Rarest terms by document frequency, like someone searching for a specific name
+        terms = sorted(set(tokenize(" ".join(words))),
+                       key=lambda t: bm25.offsets[bm25.terms[t] + 1] - bm25.offsets[bm25.terms[t]])
+        if len(terms) >= 2:
+            keywords.append((" ".join(terms[:2]), chunk_id))
+    return {"phrase": phrases, "keywords": keywords}
+
+
+def evaluate(retriever, queries, mode, k):
+    retriever.hybrid = mode == "hybrid"
+    # Lexical mode answers every query from BM25; the others never do
+    retriever.lexical_fast_words = 10 ** 6 if mode == "lexical" else 0
+
+    latencies, ranks = [], []
+    for query, chunk_id in queries:
+        start = time.perf_counter()
+        results = retriever.retrieve(query, top_k=k, max_distance=None)
+        latencies.append(time.perf_counter() - start)
+        target = retriever.store[chunk_id]["content"]
+        contents = [doc["content"] for doc in results]
+        ranks.append(contents.index(target) + 1 if target in contents else None)
+
+    latencies = np.array(latencies) * 1000
+    return {
+        "mode": mode,
+        "queries": len(queries),
+        f"hit@{k}": round(sum(r is not None for r in ranks) / len(ranks), 4) if ranks else None,
+        "mrr": round(sum(1 / r for r in ranks if r) / len(ranks), 4) if ranks else None,
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3) if len(latencies) else None,
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3) if len(latencies) else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=300, help="chunks to sample queries from")
+    parser.add_argument("-k", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    retriever = RAGRetriever()
+    retriever.cache = None  # measure retrieval, not cache hits
+    query_sets = make_queries(retriever, args.queries, args.seed)
+
+    results = []
+    print(f"{'queries':<10} {'mode':<8} {'hit@k':>7} {'mrr':>7} {'p50 ms':>8} {'p95 ms':>8}")
+    for shape, queries in query_sets.items():
+        for mode in MODES:
+            r = dict(evaluate(retriever, queries, mode, args.k), shape=shape)
+            results.append(r)
+            print(f"{shape:<10} {mode:<8} {r[f'hit@{args.k}']:>7} {r['mrr']:>7} {r['p50_ms']:>8} {r['p95_ms']:>8}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"k": args.k, "chunks": len(retriever.store), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
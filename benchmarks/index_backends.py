@@ -0,0 +1,118 @@
+# benchmarks/index_backends.py
+"""Compare FAISS index backends against the exact flat index.
+
+    python -m benchmarks.index_backends                      # embeddings of the served index version
+    python -m benchmarks.index_backends --synthetic 200000   # random corpus
+    python -m benchmarks.index_backends --json results.json
+
+Reports recall@k against IndexFlatL2, build time, query latency and index size
+for every backend, so a deployment can pick its memory/latency trade-off.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+import config
+from modules.index_backends import BACKENDS, build_index, index_nbytes
+
+
+def synthetic_corpus(n, dim=384, clusters=256, seed=0):
+    """Clustered unit vectors, which behave much more like sentence embeddings than uniform noise"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype("float32")
+    vectors = centers[rng.integers(0, clusters, n)] + 0.35 * rng.standard_normal((n, dim)).astype("float32")
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_queries(vectors, count, seed=1):
+    """Perturbed corpus vectors, so every query has meaningful near neighbours"""
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.integers(0, len(vectors), count)] + 0.05 * rng.standard_normal((count, vectors.shape[1]))
+    queries = queries.astype("float32")
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def current_vectors():
+    """Path of the saved embedding matrix of the version currently served"""
+    from modules.index_versions import VersionDir
+    from modules.rag import VECTORS_FILE
+    versions = VersionDir(config.INDEX_DIR)
+    if versions.current() is None:
+        raise SystemExit(f"No index built in {config.INDEX_DIR} yet; pass --vectors or --synthetic")
+    return versions.path(versions.current(), VECTORS_FILE)
+
+
+def recall_at_k(found, truth):
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def run(vectors, queries, k=10, backends=BACKENDS):
+    results = []
+    truth = None
+    for backend in backends:
+        start = time.perf_counter()
+        index, params = build_index(vectors, backend)
+        build_s = time.perf_counter() - start
+
+        # One query at a time, like the chat path does
+        latencies = []
+        found = np.empty((len(queries), k), dtype="int64")
+        for i, query in enumerate(queries):
+            start = time.perf_counter()
+            _, ids = index.search(query.reshape(1, -1), k)
+            latencies.append(time.perf_counter() - start)
+            found[i] = ids[0]
+        if backend == "flat":
+            truth = found
+        latencies = np.array(latencies) * 1000
+        results.append({
+            "backend": backend,
+            "effective_backend": params["backend"],
+            "params": params,
+            "build_s": round(build_s, 3),
+            "index_bytes": index_nbytes(index),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 4),
+            "p95_ms": round(float(np.percentile(latencies, 95)), 4),
+            f"recall@{k}": None if truth is None else round(recall_at_k(found, truth), 4),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", help="saved embedding matrix to index (default: the current index version's)")
+    parser.add_argument("--synthetic", type=int, default=0, help="use N synthetic vectors instead")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        vectors = synthetic_corpus(args.synthetic)
+    else:
+        vectors = np.load(args.vectors or current_vectors()).astype("float32")
+    queries = make_queries(vectors, args.queries)
+    backends = [b for b in args.backends.split(",") if b]
+    if "flat" in backends:
+        backends.remove("flat")
+    # flat always runs first: it is the ground truth for recall
+    results = run(vectors, queries, k=args.k, backends=["flat"] + backends)
+
+    print(f"{len(vectors)} vectors, dim {vectors.shape[1]}, {len(queries)} queries, k={args.k}")
+    print(f"{'backend':<10} {'used':<10} {'build s':>8} {'MB':>8} {'p50 ms':>8} {'p95 ms':>8} {'recall':>7}")
+    for r in results:
+        print(
+            f"{r['backend']:<10} {r['effective_backend']:<10} {r['build_s']:>8} "
+            f"{r['index_bytes'] / 1e6:>8.2f} {r['p50_ms']:>8} {r['p95_ms']:>8} {r[f'recall@{args.k}']:>7}"
+        )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"n": len(vectors), "dim": int(vectors.shape[1]), "k": args.k, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
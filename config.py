@@ -1,2 +1,117 @@
 import os
 GROQ_API_KEY = "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"
+
+# Point the LLM client at another OpenAI-compatible server (e.g. modules/fake_llm.py)
+GROQ_BASE_URL = os.environ.get("GROQ_BASE_URL") or None
+
+# LLM client: connection pool, concurrency limit / load shedding, timeouts and retries
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", 32))
+LLM_MAX_KEEPALIVE = int(os.environ.get("LLM_MAX_KEEPALIVE", 16))
+LLM_MAX_IN_FLIGHT = int(os.environ.get("LLM_MAX_IN_FLIGHT", 16))
+LLM_MAX_QUEUE = int(os.environ.get("LLM_MAX_QUEUE", 64))
+LLM_QUEUE_TIMEOUT = float(os.environ.get("LLM_QUEUE_TIMEOUT", 10))
+LLM_REQUEST_TIMEOUT = float(os.environ.get("LLM_REQUEST_TIMEOUT", 20))
+LLM_DEADLINE = float(os.environ.get("LLM_DEADLINE", 45))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 3))
+
+# FAISS index backend: flat, ivf_flat, hnsw, ivf_pq or sq8 (see modules/index_backends.py)
+INDEX_BACKEND = os.environ.get("INDEX_BACKEND", "flat")
+
+# Load FAISS indexes with mmap so worker processes share their pages
+INDEX_MMAP = os.environ.get("INDEX_MMAP", "1") == "1"
+
+# Chunking and retrieval filtering (see RAGRetriever.retrieve)
+CHUNK_OVERLAP = int(os.environ.get("CHUNK_OVERLAP", 150))
+RAG_MAX_DISTANCE = float(os.environ.get("RAG_MAX_DISTANCE", 1.3))  # squared L2, ~cosine >= 0.35
+RAG_MMR_LAMBDA = float(os.environ.get("RAG_MMR_LAMBDA", 0.7))
+RAG_DUP_THRESHOLD = float(os.environ.get("RAG_DUP_THRESHOLD", 0.95))
+# Prompt tokens available for knowledge-base context per turn
+RAG_CONTEXT_TOKENS = int(os.environ.get("RAG_CONTEXT_TOKENS", 350))
+
+# Embedding inference: fp32 or int8 (dynamic quantization), torch threads
+# (0 = torch default), batch size, and worker processes for index builds
+EMBED_BACKEND = os.environ.get("EMBED_BACKEND", "fp32")
+EMBED_THREADS = int(os.environ.get("EMBED_THREADS", 0))
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", 64))
+EMBED_PROCESSES = int(os.environ.get("EMBED_PROCESSES", 1))
+
+# Cross-session micro-batching of retrieval queries (modules/batcher.py)
+BATCH_ENABLED = os.environ.get("BATCH_ENABLED", "1") == "1"
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", 16))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", 3))
+
+# Query embedding / retrieval result cache (modules/retrieval_cache.py).
+# Set RAG_CACHE_DISK_PATH to a SQLite file to share hits across workers and restarts.
+RAG_CACHE_ENABLED = os.environ.get("RAG_CACHE_ENABLED", "1") == "1"
+RAG_CACHE_MAX_BYTES = int(os.environ.get("RAG_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+RAG_CACHE_TTL = float(os.environ.get("RAG_CACHE_TTL", 6 * 3600))
+RAG_CACHE_DISK_PATH = os.environ.get("RAG_CACHE_DISK_PATH") or None
+
+# Conversation memory (modules/memory.py): recent-window and summary sizes in tokens,
+# tokens that must fall out of the window before a summary call, and the
+# summary calls in flight per process (their own LLM client, see modules/utils.py)
+MEMORY_WINDOW_TOKENS = int(os.environ.get("MEMORY_WINDOW_TOKENS", 600))
+MEMORY_SUMMARY_TOKENS = int(os.environ.get("MEMORY_SUMMARY_TOKENS", 150))
+MEMORY_REPLY_TOKENS = int(os.environ.get("MEMORY_REPLY_TOKENS", 120))
+MEMORY_SUMMARY_BATCH_TOKENS = int(os.environ.get("MEMORY_SUMMARY_BATCH_TOKENS", 300))
+MEMORY_SUMMARY_WORKERS = int(os.environ.get("MEMORY_SUMMARY_WORKERS", 2))
+
+# Pre-LLM intent router (modules/intent.py): optional MiniLM prototype classifier
+INTENT_CLASSIFIER = os.environ.get("INTENT_CLASSIFIER", "0") == "1"
+INTENT_THRESHOLD = float(os.environ.get("INTENT_THRESHOLD", 0.75))
+
+# Per-stage latency metrics (modules/metrics.py): Prometheus endpoint port
+# (unset or 0 = off) and interface, and the fraction of spans recorded
+METRICS_PORT = int(os.environ.get("METRICS_PORT") or 0)
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_SAMPLE_RATE = float(os.environ.get("METRICS_SAMPLE_RATE", 1.0))
+
+# Async JSON API server (api_server.py): sessions idle longer than
+# API_SESSION_TTL seconds are dropped, oldest first beyond API_MAX_SESSIONS.
+# API_METRICS=1 also serves /metrics on API_HOST, which is unauthenticated
+API_HOST = os.environ.get("API_HOST", "0.0.0.0")
+API_PORT = int(os.environ.get("API_PORT", 8000))
+API_METRICS = os.environ.get("API_METRICS", "0") == "1"
+API_SESSION_TTL = float(os.environ.get("API_SESSION_TTL", 3600))
+API_MAX_SESSIONS = int(os.environ.get("API_MAX_SESSIONS", 10000))
+API_WORKER_THREADS = int(os.environ.get("API_WORKER_THREADS", 32))
+
+# Durable sessions (modules/session_store.py): SQLite file shared by every
+# worker on the host (unset = sessions live only in memory), write-behind
+# flush interval in seconds, and messages kept in memory per session
+SESSION_DB_PATH = os.environ.get("SESSION_DB_PATH") or None
+SESSION_FLUSH_INTERVAL = float(os.environ.get("SESSION_FLUSH_INTERVAL", 0.2))
+SESSION_HOT_MESSAGES = int(os.environ.get("SESSION_HOT_MESSAGES", 50))
+
+# Hybrid retrieval (modules/bm25.py): fuse BM25 with dense hits, the RRF
+# constant, and max words for keyword queries answered by BM25 alone (0 = off)
+RAG_HYBRID = os.environ.get("RAG_HYBRID", "1") == "1"
+RAG_RRF_K = int(os.environ.get("RAG_RRF_K", 60))
+RAG_LEXICAL_FAST_WORDS = int(os.environ.get("RAG_LEXICAL_FAST_WORDS", 0))
+
+# Near-duplicate chunk elimination at build time (modules/dedup.py): estimated
+# Jaccard similarity of word 5-gram sets at which a chunk is collapsed (0 = off).
+# Off by default: the shipped PDFs paraphrase each other rather than repeat
+# verbatim (no chunk pair above ~0.48), so it would only add build time. Turn
+# it on (e.g. 0.85) for corpora with copied material
+DEDUP_THRESHOLD = float(os.environ.get("DEDUP_THRESHOLD", 0))
+
+# Versioned index builds (modules/index_versions.py): root directory, seconds
+# between corpus checks for hot reload (0 = off), and versions kept on disk
+INDEX_DIR = os.environ.get("INDEX_DIR", "data/index")
+INDEX_WATCH_INTERVAL = float(os.environ.get("INDEX_WATCH_INTERVAL", 10))
+INDEX_KEEP_VERSIONS = int(os.environ.get("INDEX_KEEP_VERSIONS", 2))
+
+# Cohort analytics over completed questionnaires (modules/analytics.py): store
+# directory (unset = off), cohort label for sessions that don't give one,
+# buffered rows / seconds before a segment is written, segments that trigger
+# a compaction, and the smallest group whose figures are reported
+ANALYTICS_PATH = os.environ.get("ANALYTICS_PATH") or None
+ANALYTICS_DEFAULT_COHORT = os.environ.get("ANALYTICS_DEFAULT_COHORT", "all")
+# Comma-separated cohort labels sessions may use; any other label is filed
+# under the default cohort (every label is a slice of the aggregate cube)
+ANALYTICS_COHORTS = tuple(c.strip() for c in os.environ.get("ANALYTICS_COHORTS", "").split(",") if c.strip())
+ANALYTICS_FLUSH_ROWS = int(os.environ.get("ANALYTICS_FLUSH_ROWS", 1000))
+ANALYTICS_FLUSH_INTERVAL = float(os.environ.get("ANALYTICS_FLUSH_INTERVAL", 60))
+ANALYTICS_COMPACT_SEGMENTS = int(os.environ.get("ANALYTICS_COMPACT_SEGMENTS", 256))
+ANALYTICS_MIN_COUNT = int(os.environ.get("ANALYTICS_MIN_COUNT", 10))
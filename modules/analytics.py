@@ -0,0 +1,560 @@
+# modules/analytics.py
+"""Cohort analytics over completed PHQ-9 / GAD-7 questionnaires.
+
+    python -m modules.analytics                                   # store at ANALYTICS_PATH
+    python -m modules.analytics data/analytics --test GAD7 --since 2026-09-01 --freq M
+    python -m modules.analytics data/analytics --compact
+
+Each completed questionnaire is one anonymous row: time, test, cohort label
+(faculty, campus, intake...), the item answers and the total. There is no
+session id and no text. Rows are written as immutable column segments, and
+per-(day, test, cohort) aggregates are folded in once per segment, so
+reports read a small cube instead of rescanning every submission.
+"""
+import argparse
+import atexit
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+import numpy as np
+
+import config
+from modules.index_versions import file_lock
+from modules.phq_gad import GAD7_QUESTIONS, PHQ9_QUESTIONS, SELF_HARM_ITEM, SEVERITY_BANDS, SEVERITY_CUTOFFS
+
+TESTS = ("PHQ9", "GAD7")
+QUESTIONS = {"PHQ9": PHQ9_QUESTIONS, "GAD7": GAD7_QUESTIONS}
+MAX_ITEMS = max(len(q) for q in QUESTIONS.values())
+N_ANSWERS = 4
+N_BANDS = max(len(b) for b in SEVERITY_BANDS.values())
+# Item columns a shorter questionnaire leaves empty
+NO_ANSWER = 255
+# "moderate" and above, i.e. total >= 10: the usual screening cut-off on both tests
+MODERATE_BAND = 2
+DAY = 86400
+
+# Last axis of the aggregate cube: count, sum and sum of squares of the
+# totals, count per severity band, then count per (item, answer)
+F_COUNT, F_TOTAL, F_TOTAL_SQ = 0, 1, 2
+F_BAND = 3
+F_ITEM = F_BAND + N_BANDS
+N_FIELDS = F_ITEM + MAX_ITEMS * N_ANSWERS
+
+COLUMNS = {"ts": "<i8", "test": "u1", "cohort": "<u4", "items": "u1", "total": "u1"}
+STAGING_PREFIX = ".staging-"
+
+
+def day_number(value):
+    """Days since 1970-01-01 (UTC) of a date, datetime, ISO string or datetime64; None passes through"""
+    if value is None:
+        return None
+    return int(np.datetime64(value, "D").astype(np.int64))
+
+
+def severity_bands(tests, totals):
+    """Severity band of each total (tests are indexes into TESTS)"""
+    bands = np.zeros(len(totals), dtype=np.int64)
+    for t, name in enumerate(TESTS):
+        mask = tests == t
+        bands[mask] = np.searchsorted(SEVERITY_CUTOFFS[name], totals[mask], side="right")
+    return bands
+
+
+def allowed_cohort(label, allowed=config.ANALYTICS_COHORTS):
+    """label if it is the default cohort or in allowed (None allows any label), else None"""
+    if not isinstance(label, str):
+        return None
+    label = label.strip()
+    if label == config.ANALYTICS_DEFAULT_COHORT or (label and (allowed is None or label in allowed)):
+        return label
+    return None
+
+
+def _shares(counts, n, keep):
+    """counts / n per group, NaN where the group is suppressed or empty"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        shares = counts / n
+    return np.where(keep, shares, np.nan)
+
+
+class QuestionnaireStore:
+    """Append-only columnar store of questionnaire submissions, with incremental aggregates.
+
+    On disk, under root:
+      segments/<name>/<column>.npy   ts, test, cohort, items (n x 9) and total
+      segments/<name>/cohorts.json   labels the segment's cohort column indexes
+      segments/<name>/sources.json   compacted segments only: [name, start, end] of the rows they replace
+      aggregates.npz                 the cube, its first day, cohort labels and the segments folded in
+    Segments are written under a staging name and renamed, so a reader never
+    sees a partial one and worker processes can append to the same store.
+
+    The cube holds N_FIELDS counters per (day, test, cohort) and is updated
+    with one bincount per new segment. Every report slices and sums it, so
+    its cost depends on days x cohorts, not on the number of submissions.
+    Reports cover flushed rows; appends are buffered up to flush_rows rows
+    or flush_interval seconds. Groups smaller than min_count are reported
+    with their size only. Cohort labels outside allowed_cohorts are filed
+    under ANALYTICS_DEFAULT_COHORT, so untrusted labels can't grow the cube.
+    """
+
+    def __init__(self, root, flush_rows=config.ANALYTICS_FLUSH_ROWS, flush_interval=config.ANALYTICS_FLUSH_INTERVAL,
+                 compact_segments=config.ANALYTICS_COMPACT_SEGMENTS, min_count=config.ANALYTICS_MIN_COUNT,
+                 allowed_cohorts=config.ANALYTICS_COHORTS):
+        self.root = root
+        self.segments_dir = os.path.join(root, "segments")
+        os.makedirs(self.segments_dir, exist_ok=True)
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.compact_segments = compact_segments
+        self.min_count = min_count
+        self.allowed_cohorts = allowed_cohorts
+        self._buffer = []  # (ts, test, cohort, items, total)
+        self._cond = threading.Condition()
+        self._closed = False
+        # Guards the cube and everything folded into it
+        self._lock = threading.RLock()
+        self._load_aggregates()
+        self.refresh()
+        self._thread = None
+        if flush_interval > 0:
+            self._thread = threading.Thread(target=self._run, name="analytics-flush", daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    # ---------------------------
+    # Writing
+    # ---------------------------
+    def append(self, test, answers, cohort=None, ts=None):
+        """Buffer one completed questionnaire (answers 0-3 in question order)"""
+        items = self._validate(test, np.asarray(answers, dtype=np.int64).reshape(1, -1))[0]
+        with self._cond:
+            self._buffer.append((
+                int(ts if ts is not None else time.time()), TESTS.index(test),
+                self._cohort(cohort), items, int(items[items != NO_ANSWER].sum()),
+            ))
+            if len(self._buffer) >= self.flush_rows:
+                self._cond.notify()
+
+    def append_many(self, test, answers, cohorts=None, ts=None):
+        """Write many submissions of one test as a segment right away; returns the row count.
+
+        answers is (n, items); cohorts one label or n labels; ts n epoch seconds (default now).
+        """
+        items = self._validate(test, np.asarray(answers, dtype=np.int64))
+        n = len(items)
+        if not n:
+            return 0
+        ts = np.full(n, int(time.time()), dtype=np.int64) if ts is None else np.asarray(ts, dtype=np.int64)
+        if cohorts is None or isinstance(cohorts, str):
+            labels, cohort = [self._cohort(cohorts)], np.zeros(n, dtype=np.int64)
+        else:
+            labels, cohort = np.unique(np.asarray(cohorts, dtype=str), return_inverse=True)
+            # Labels that aren't allowed collapse into the default cohort
+            labels, merged = np.unique([self._cohort(label) for label in labels.tolist()], return_inverse=True)
+            labels, cohort = labels.tolist(), merged[cohort]
+        totals = np.where(items == NO_ANSWER, 0, items).sum(axis=1)
+        self._write_segment({"ts": ts, "test": np.full(n, TESTS.index(test)), "cohort": cohort, "items": items,
+                             "total": totals}, labels)
+        return n
+
+    def _cohort(self, label):
+        return allowed_cohort(label, self.allowed_cohorts) or config.ANALYTICS_DEFAULT_COHORT
+
+    def _validate(self, test, answers):
+        if test not in QUESTIONS:
+            raise ValueError(f"Unknown test {test!r}, expected one of {TESTS}")
+        n_items = len(QUESTIONS[test])
+        if answers.ndim != 2 or answers.shape[1] != n_items:
+            raise ValueError(f"{test} has {n_items} items, got answers of shape {answers.shape}")
+        if answers.size and (answers.min() < 0 or answers.max() >= N_ANSWERS):
+            raise ValueError(f"Answers must be 0-{N_ANSWERS - 1}")
+        items = np.full((len(answers), MAX_ITEMS), NO_ANSWER, dtype=np.uint8)
+        items[:, :n_items] = answers
+        return items
+
+    def flush(self):
+        """Write buffered submissions as a new segment"""
+        with self._cond:
+            rows, self._buffer = self._buffer, []
+        if not rows:
+            return
+        labels = sorted({row[2] for row in rows})
+        index = {label: i for i, label in enumerate(labels)}
+        self._write_segment({
+            "ts": np.array([row[0] for row in rows]),
+            "test": np.array([row[1] for row in rows]),
+            "cohort": np.array([index[row[2]] for row in rows]),
+            "items": np.stack([row[3] for row in rows]),
+            "total": np.array([row[4] for row in rows]),
+        }, labels)
+
+    def _write_segment(self, columns, labels, sources=None):
+        # Names sort by creation time; pid + random suffix keep workers apart
+        name = f"{time.time_ns():020d}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        staging = os.path.join(self.segments_dir, STAGING_PREFIX + name)
+        os.makedirs(staging)
+        try:
+            for column, dtype in COLUMNS.items():
+                np.save(os.path.join(staging, column + ".npy"), np.ascontiguousarray(columns[column], dtype=dtype))
+            with open(os.path.join(staging, "cohorts.json"), "w", encoding="utf-8") as f:
+                json.dump(list(labels), f)
+            if sources is not None:
+                with open(os.path.join(staging, "sources.json"), "w", encoding="utf-8") as f:
+                    json.dump(sources, f)
+            os.rename(staging, os.path.join(self.segments_dir, name))
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        self.refresh()
+        if sources is None and self.compact_segments and len(self._segment_names()) > self.compact_segments:
+            self.compact()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed:
+                    self._cond.wait(self.flush_interval)
+                closed = self._closed
+            try:
+                self.flush()
+            except OSError as exc:
+                # Rows stay lost rather than blocking questionnaires; keep trying later batches
+                print(f"Analytics flush failed: {exc}")
+            if closed:
+                return
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+        else:
+            self.flush()
+
+    # ---------------------------
+    # Segments and aggregates
+    # ---------------------------
+    def _segment_names(self):
+        return sorted(n for n in os.listdir(self.segments_dir) if not n.startswith(STAGING_PREFIX))
+
+    def _read_segment(self, name, columns=tuple(COLUMNS)):
+        path = os.path.join(self.segments_dir, name)
+        data = {c: np.load(os.path.join(path, c + ".npy"), mmap_mode="r") for c in columns}
+        with open(os.path.join(path, "cohorts.json"), "r", encoding="utf-8") as f:
+            labels = json.load(f)
+        sources = None
+        if os.path.exists(os.path.join(path, "sources.json")):
+            with open(os.path.join(path, "sources.json"), "r", encoding="utf-8") as f:
+                sources = json.load(f)
+        return data, labels, sources
+
+    @property
+    def _aggregates_path(self):
+        return os.path.join(self.root, "aggregates.npz")
+
+    def _load_aggregates(self):
+        self.cube = np.zeros((0, len(TESTS), 0, N_FIELDS), dtype=np.int64)
+        self.origin = 0  # day number of cube[0]
+        self.cohorts = []
+        self._cohort_ids = {}
+        self.folded = set()
+        try:
+            with np.load(self._aggregates_path) as saved:
+                cube, origin = saved["cube"], int(saved["origin"])
+                cohorts = json.loads(str(saved["cohorts"]))
+                folded = set(json.loads(str(saved["folded"])))
+        except (OSError, KeyError, ValueError):
+            return  # missing or unreadable: refresh() folds every segment again
+        if cube.shape[1:] == self.cube.shape[1:2] + (len(cohorts), N_FIELDS):
+            self.cube, self.origin, self.cohorts, self.folded = cube, origin, cohorts, folded
+            self._cohort_ids = {label: i for i, label in enumerate(cohorts)}
+
+    def _save_aggregates(self, names):
+        # Forget segments that are gone, except the sources of compacted segments
+        # still on disk: their names decide which rows of those were folded
+        live = set(names)
+        for name in names:
+            path = os.path.join(self.segments_dir, name, "sources.json")
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    live.update(source for source, _, _ in json.load(f))
+        self.folded &= live
+        tmp = self._aggregates_path + f".tmp-{os.getpid()}"
+        with open(tmp, "wb") as f:
+            np.savez(f, cube=self.cube, origin=self.origin, cohorts=json.dumps(self.cohorts),
+                     folded=json.dumps(sorted(self.folded)))
+        os.replace(tmp, self._aggregates_path)
+
+    def refresh(self):
+        """Fold segments written since the last call (by any process) into the aggregates"""
+        with self._lock:
+            names = self._segment_names()
+            new = [name for name in names if name not in self.folded]
+            if not new:
+                return 0
+            rows = 0
+            for name in new:
+                try:
+                    data, labels, sources = self._read_segment(name)
+                except OSError:
+                    continue  # compacted away meanwhile; its rows come with the merged segment
+                if sources is None:
+                    rows += self._fold(data, labels)
+                else:
+                    # A compacted segment: only fold the ranges whose source was never folded here
+                    for source, start, end in sources:
+                        if source not in self.folded:
+                            rows += self._fold({c: v[start:end] for c, v in data.items()}, labels)
+                        self.folded.add(source)
+                self.folded.add(name)
+            self._save_aggregates(names)
+            return rows
+
+    def _fold(self, data, labels):
+        n = len(data["ts"])
+        if not n:
+            return 0
+        days = np.asarray(data["ts"]) // DAY
+        for label in labels:
+            if label not in self._cohort_ids:
+                self._cohort_ids[label] = len(self.cohorts)
+                self.cohorts.append(label)
+        cohort = np.array([self._cohort_ids[label] for label in labels], dtype=np.int64)[np.asarray(data["cohort"])]
+        self._grow(int(days.min()), int(days.max()))
+
+        test = np.asarray(data["test"], dtype=np.int64)
+        items = np.asarray(data["items"], dtype=np.int64)
+        total = np.asarray(data["total"], dtype=np.int64)
+        base = np.ravel_multi_index((days - self.origin, test, cohort), self.cube.shape[:3]) * N_FIELDS
+        index = [base + F_COUNT, base + F_BAND + severity_bands(test, total)]
+        for item in range(MAX_ITEMS):
+            answered = items[:, item] != NO_ANSWER
+            index.append(base[answered] + F_ITEM + item * N_ANSWERS + items[answered, item])
+        flat = self.cube.reshape(-1)
+        flat += np.bincount(np.concatenate(index), minlength=flat.size)
+        sums = np.bincount(np.concatenate([base + F_TOTAL, base + F_TOTAL_SQ]),
+                           weights=np.concatenate([total, total * total]), minlength=flat.size)
+        flat += sums.astype(np.int64)
+        return n
+
+    def _grow(self, first_day, last_day):
+        """Widen the cube to cover these days and every known cohort"""
+        days, _, cohorts, _ = self.cube.shape
+        origin = min(self.origin, first_day) if days else first_day
+        end = max(self.origin + days, last_day + 1) if days else last_day + 1
+        if (origin, end, len(self.cohorts)) == (self.origin, self.origin + days, cohorts):
+            return
+        cube = np.zeros((end - origin, len(TESTS), len(self.cohorts), N_FIELDS), dtype=np.int64)
+        offset = self.origin - origin
+        cube[offset:offset + days, :, :cohorts] = self.cube
+        self.cube, self.origin = cube, origin
+
+    def compact(self):
+        """Merge every segment into one, so listing and folding stay cheap as the store grows"""
+        with file_lock(os.path.join(self.root, ".compact.lock")):
+            names = self._segment_names()
+            if len(names) < 2:
+                return
+            parts, labels, index, sources, offset = {c: [] for c in COLUMNS}, [], {}, [], 0
+            for name in names:
+                data, seg_labels, seg_sources = self._read_segment(name)
+                remap = np.array([index.setdefault(label, len(index)) for label in seg_labels], dtype=np.int64)
+                for column in COLUMNS:
+                    parts[column].append(remap[data["cohort"]] if column == "cohort" else data[column])
+                n = len(data["ts"])
+                # Row ranges of the original segments, also through repeated compactions,
+                # so a process that already folded one of them skips its rows
+                for source, start, end in seg_sources or [(name, 0, n)]:
+                    sources.append([source, offset + start, offset + end])
+                offset += n
+            labels = list(index)
+            self._write_segment({c: np.concatenate(parts[c]) for c in COLUMNS}, labels, sources)
+            for name in names:
+                shutil.rmtree(os.path.join(self.segments_dir, name), ignore_errors=True)
+            print(f"✅ Compacted {len(names)} analytics segments ({offset} submissions)")
+
+    def scan(self, since=None, until=None):
+        """Every flushed row between two dates as columns, cohorts mapped to self.cohorts; a full rescan"""
+        self.refresh()
+        lo, hi = day_number(since), day_number(until)
+        parts = {c: [] for c in COLUMNS}
+        for name in self._segment_names():
+            data, labels, _ = self._read_segment(name)
+            days = np.asarray(data["ts"]) // DAY
+            keep = np.ones(len(days), dtype=bool)
+            if lo is not None:
+                keep &= days >= lo
+            if hi is not None:
+                keep &= days <= hi
+            remap = np.array([self._cohort_ids[label] for label in labels], dtype=np.int64)
+            for column in COLUMNS:
+                values = np.asarray(data[column])[keep]
+                parts[column].append(remap[values] if column == "cohort" else values)
+        return {c: np.concatenate(v) if v else np.empty(0, dtype=COLUMNS[c]) for c, v in parts.items()}
+
+    # ---------------------------
+    # Reports (pandas DataFrames)
+    # ---------------------------
+    def _window(self, test, since, until, cohorts=None):
+        """(days, cohorts, N_FIELDS) slice of the cube for one test, and the cohort labels"""
+        self.refresh()
+        with self._lock:
+            lo = max(day_number(since) - self.origin, 0) if since is not None else 0
+            hi = day_number(until) - self.origin + 1 if until is not None else self.cube.shape[0]
+            cube = self.cube[lo:max(hi, lo), TESTS.index(test)]
+            labels = list(self.cohorts)
+        if cohorts is not None:
+            picked = [labels.index(c) for c in cohorts if c in labels]
+            cube, labels = cube[:, picked], [labels[i] for i in picked]
+        return cube, labels, lo + self.origin
+
+    def _summary(self, test, fields, labels):
+        """Headline figures per row of fields (groups x N_FIELDS), small groups suppressed"""
+        import pandas as pd  # only needed for reports, not when recording
+        n = fields[:, F_COUNT].astype(float)
+        keep = n >= max(self.min_count, 1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = fields[:, F_TOTAL] / n
+            std = np.sqrt(np.maximum(fields[:, F_TOTAL_SQ] / n - mean ** 2, 0))
+        frame = {"n": fields[:, F_COUNT], "mean_total": np.where(keep, mean, np.nan),
+                 "std_total": np.where(keep, std, np.nan)}
+        bands = SEVERITY_BANDS[test]
+        for b, band in enumerate(bands):
+            frame[band] = _shares(fields[:, F_BAND + b], n, keep)
+        frame["moderate_or_above"] = _shares(fields[:, F_BAND + MODERATE_BAND:F_BAND + len(bands)].sum(axis=1), n, keep)
+        if test == "PHQ9":
+            item9 = F_ITEM + SELF_HARM_ITEM * N_ANSWERS
+            frame["item9_flagged"] = _shares(fields[:, item9 + 1:item9 + N_ANSWERS].sum(axis=1), n, keep)
+        return pd.DataFrame(frame, index=pd.Index(labels, name="cohort"))
+
+    def severity_distribution(self, test="PHQ9", since=None, until=None, by_cohort=False):
+        """Submissions, mean total and share per severity band, overall or per cohort"""
+        cube, labels, _ = self._window(test, since, until)
+        fields = cube.sum(axis=0)
+        if not by_cohort:
+            fields, labels = fields.sum(axis=0, keepdims=True), ["all"]
+        return self._summary(test, fields, labels)
+
+    def item_prevalence(self, test="PHQ9", since=None, until=None, cohort=None):
+        """Per item: mean answer and share answering at least "several days" / "more than half the days".
+
+        For PHQ-9, item 9 is the self-harm question; see self_harm_flags for counts per cohort.
+        """
+        import pandas as pd
+        cube, _, _ = self._window(test, since, until, None if cohort is None else [cohort])
+        n_items = len(QUESTIONS[test])
+        answers = cube.sum(axis=(0, 1))[F_ITEM:F_ITEM + n_items * N_ANSWERS].reshape(n_items, N_ANSWERS)
+        n = answers.sum(axis=1).astype(float)
+        keep = n >= max(self.min_count, 1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = (answers * np.arange(N_ANSWERS)).sum(axis=1) / n
+        return pd.DataFrame({
+            "question": QUESTIONS[test],
+            "n": answers.sum(axis=1),
+            "mean_answer": np.where(keep, mean, np.nan),
+            "several_days_or_more": _shares(answers[:, 1:].sum(axis=1), n, keep),
+            "more_than_half_the_days": _shares(answers[:, 2:].sum(axis=1), n, keep),
+        }, index=pd.RangeIndex(1, n_items + 1, name="item"))
+
+    def self_harm_flags(self, since=None, until=None, by_cohort=True):
+        """PHQ-9 item 9 answers above "Not at all": counts by answer and the flagged share"""
+        import pandas as pd
+        cube, labels, _ = self._window("PHQ9", since, until)
+        fields = cube.sum(axis=0)
+        if not by_cohort:
+            fields, labels = fields.sum(axis=0, keepdims=True), ["all"]
+        item9 = fields[:, F_ITEM + SELF_HARM_ITEM * N_ANSWERS:F_ITEM + (SELF_HARM_ITEM + 1) * N_ANSWERS]
+        n = fields[:, F_COUNT].astype(float)
+        keep = n >= max(self.min_count, 1)
+        flagged = item9[:, 1:].sum(axis=1)
+        frame = {"n": fields[:, F_COUNT], "flagged": np.where(keep, flagged, np.nan)}
+        for answer, label in enumerate(("several_days", "more_than_half_the_days", "nearly_every_day"), start=1):
+            frame[label] = np.where(keep, item9[:, answer], np.nan)
+        frame["flagged_share"] = _shares(flagged, n, keep)
+        return pd.DataFrame(frame, index=pd.Index(labels, name="cohort"))
+
+    def trend(self, test="PHQ9", freq="W", since=None, until=None, cohort=None):
+        """Headline figures per time window (a pandas period frequency: D, W, M, Q, Y)"""
+        import pandas as pd
+        cube, _, first_day = self._window(test, since, until, None if cohort is None else [cohort])
+        per_day = cube.sum(axis=1)
+        periods = pd.DatetimeIndex(np.datetime64(first_day, "D") + np.arange(len(per_day))).to_period(freq)
+        # Days are contiguous, so each window is a run of rows: sum the runs
+        starts = np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]]) if len(periods) else np.empty(0, int)
+        fields = np.add.reduceat(per_day, starts, axis=0) if len(starts) else per_day[:0]
+        frame = self._summary(test, fields, periods[starts] if len(starts) else [])
+        frame.index.name = "period"
+        return frame
+
+    def compare_cohorts(self, test="PHQ9", since=None, until=None):
+        """Each cohort against everyone else: headline figures plus the difference in the
+        moderate-or-above share with a two-proportion z score (|z| > 1.96 ~ p < 0.05)"""
+        cube, labels, _ = self._window(test, since, until)
+        fields = cube.sum(axis=0)
+        frame = self._summary(test, fields, labels)
+        bands = len(SEVERITY_BANDS[test])
+        cases = fields[:, F_BAND + MODERATE_BAND:F_BAND + bands].sum(axis=1).astype(float)
+        n = fields[:, F_COUNT].astype(float)
+        rest_cases, rest_n = cases.sum() - cases, n.sum() - n
+        keep = (n >= max(self.min_count, 1)) & (rest_n >= max(self.min_count, 1))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            p, p_rest = cases / n, rest_cases / rest_n
+            pooled = (cases + rest_cases) / (n + rest_n)
+            z = (p - p_rest) / np.sqrt(pooled * (1 - pooled) * (1 / n + 1 / rest_n))
+        frame["rest_moderate_or_above"] = np.where(keep, p_rest, np.nan)
+        frame["difference"] = np.where(keep, p - p_rest, np.nan)
+        frame["z"] = np.where(keep, z, np.nan)
+        return frame.sort_values("difference", ascending=False)
+
+
+_shared_lock = threading.Lock()
+_shared_store = None
+
+
+def get_shared_analytics():
+    """Process-wide store at ANALYTICS_PATH, or None when analytics are off"""
+    global _shared_store
+    if not config.ANALYTICS_PATH:
+        return None
+    with _shared_lock:
+        if _shared_store is None:
+            _shared_store = QuestionnaireStore(config.ANALYTICS_PATH)
+    return _shared_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", nargs="?", default=config.ANALYTICS_PATH, help="store directory")
+    parser.add_argument("--test", default="PHQ9", choices=TESTS)
+    parser.add_argument("--since", help="first day, YYYY-MM-DD")
+    parser.add_argument("--until", help="last day, YYYY-MM-DD")
+    parser.add_argument("--freq", default="W", help="trend window: D, W, M, Q or Y")
+    parser.add_argument("--compact", action="store_true", help="merge all segments into one and exit")
+    args = parser.parse_args()
+    if not args.path:
+        parser.error("pass a store directory or set ANALYTICS_PATH")
+
+    import pandas as pd
+    store = QuestionnaireStore(args.path, flush_interval=0)
+    if args.compact:
+        store.compact()
+        return
+    window = dict(since=args.since, until=args.until)
+    with pd.option_context("display.width", 160, "display.max_columns", 20, "display.precision", 3):
+        print(f"== {args.test} severity by cohort\n{store.severity_distribution(args.test, by_cohort=True, **window)}\n")
+        print(f"== {args.test} items\n{store.item_prevalence(args.test, **window)}\n")
+        if args.test == "PHQ9":
+            print(f"== PHQ-9 item 9 (self-harm) flags\n{store.self_harm_flags(**window)}\n")
+        print(f"== {args.test} trend ({args.freq})\n{store.trend(args.test, args.freq, **window)}\n")
+        print(f"== {args.test} cohorts vs the rest\n{store.compare_cohorts(args.test, **window)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# modules/batcher.py
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import config
+from modules.rag import get_shared_retriever
+
+# Upper bounds of the batch-size histogram buckets
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+class _Request:
+    __slots__ = ("query", "options", "future", "enqueued")
+
+    def __init__(self, query, options):
+        self.query = query
+        self.options = options
+        self.future = Future()
+        self.enqueued = time.perf_counter()
+
+
+class QueryBatcher:
+    """Coalesces concurrent retrieve() calls into one embed + one FAISS search.
+
+    Callers block in retrieve() exactly as with RAGRetriever. A single worker
+    thread takes whatever is queued, up to max_batch queries, and runs them
+    through retriever.retrieve_batch. It only lingers up to max_wait_ms for
+    more queries when the previous batch had company, so at low load a lone
+    query goes straight through and p50 latency is unchanged.
+    """
+
+    def __init__(self, retriever, max_batch=config.BATCH_MAX_SIZE, max_wait_ms=config.BATCH_MAX_WAIT_MS):
+        self.retriever = retriever
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._histogram = {bucket: 0 for bucket in BATCH_BUCKETS + (float("inf"),)}
+        self._delays = deque(maxlen=2048)  # recent queueing delays, seconds
+        self._batches = 0
+        self._queries = 0
+        self._last_batch_size = 1
+        self._worker = threading.Thread(target=self._run, name="query-batcher", daemon=True)
+        self._worker.start()
+
+    def retrieve(self, query, top_k=2, **options):
+        """Same contract as RAGRetriever.retrieve, served from a shared batch"""
+        request = _Request(query, dict(options, top_k=top_k))
+        self._queue.put(request)
+        return request.future.result()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        # Drain whatever piled up while the previous batch ran
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if self._last_batch_size > 1 and len(batch) < self.max_batch and self.max_wait > 0:
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            self._record(batch, started)
+
+            # Queries with different options can't share a search
+            groups = {}
+            for request in batch:
+                key = tuple(sorted(request.options.items()))
+                groups.setdefault(key, []).append(request)
+            for key, requests in groups.items():
+                try:
+                    results = self.retriever.retrieve_batch([r.query for r in requests], **dict(key))
+                except BaseException as exc:
+                    # Not only Exception: anything that escaped would end the worker
+                    # and leave these callers, and every later one, blocked for good
+                    for request in requests:
+                        request.future.set_exception(exc)
+                    continue
+                for request, result in zip(requests, results):
+                    request.future.set_result(result)
+
+    def _record(self, batch, started):
+        size = len(batch)
+        self._last_batch_size = size
+        bucket = next(b for b in self._histogram if size <= b)
+        with self._stats_lock:
+            self._histogram[bucket] += 1
+            self._batches += 1
+            self._queries += size
+            self._delays.extend(started - request.enqueued for request in batch)
+
+    def stats(self):
+        """Batch-size histogram and queueing delay (ms) over recent queries"""
+        with self._stats_lock:
+            delays = sorted(self._delays)
+            histogram = {("+Inf" if b == float("inf") else b): n for b, n in self._histogram.items()}
+            batches, queries = self._batches, self._queries
+
+        def pct(p):
+            return round(delays[min(len(delays) - 1, int(p * len(delays)))] * 1000, 3) if delays else 0.0
+
+        return {
+            "batches": batches,
+            "queries": queries,
+            "mean_batch_size": round(queries / batches, 2) if batches else 0.0,
+            "batch_size_histogram": histogram,
+            "queue_delay_ms": {"p50": pct(0.5), "p95": pct(0.95), "max": pct(1.0)},
+            "queued": self._queue.qsize(),
+        }
+
+
+_shared_lock = threading.Lock()
+_shared_batcher = None
+
+
+def collect_metrics():
+    """Gauges from the shared batcher for REGISTRY.register_collector; none until it exists"""
+    batcher = _shared_batcher
+    if batcher is None:
+        return []
+    stats = batcher.stats()
+    gauges = [(f"pfa_batcher_{key}", {}, stats[key]) for key in ("batches", "queries", "mean_batch_size", "queued")]
+    gauges += [("pfa_batcher_batches_by_size", {"size_le": str(bound)}, n)
+               for bound, n in stats["batch_size_histogram"].items()]
+    gauges += [("pfa_batcher_queue_delay_ms", {"quantile": q}, v) for q, v in stats["queue_delay_ms"].items()]
+    return gauges
+
+
+def get_shared_batcher():
+    """Process-wide QueryBatcher in front of the shared RAGRetriever"""
+    global _shared_batcher
+    with _shared_lock:
+        if _shared_batcher is None:
+            _shared_batcher = QueryBatcher(get_shared_retriever())
+    return _shared_batcher
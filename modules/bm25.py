@@ -0,0 +1,132 @@
+# modules/bm25.py
+import json
+import math
+import os
+import re
+
+import numpy as np
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+# Function words only; terms like "pfa" or "helpline" must stay searchable
+STOPWORDS = frozenset(
+    "a an and are as at be been but by can do does for from had has have how i if in into is it its me my no "
+    "not of on or our so that the their them then there these they this to was we were what when where which "
+    "who why will with you your".split()
+)
+MAX_TF = np.iinfo(np.uint16).max
+
+
+def tokenize(text):
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def _paths(prefix):
+    return (prefix + ".vocab.json", prefix + ".offsets.npy", prefix + ".docs.npy", prefix + ".tfs.npy",
+            prefix + ".doclen.npy")
+
+
+class BM25Index:
+    """Okapi BM25 over the chunk store, as flat arrays that are mmap'd on load.
+
+    On disk (next to the chunk store):
+      <prefix>.vocab.json    sorted term list; term i's postings are
+      <prefix>.offsets.npy   docs[offsets[i]:offsets[i+1]] and the same slice of
+      <prefix>.docs.npy      tfs (uint16 term frequency per posting)
+      <prefix>.tfs.npy
+      <prefix>.doclen.npy    token count per chunk
+    Doc ids are chunk ids, i.e. the same row numbers FAISS returns.
+    """
+
+    def __init__(self, prefix, k1=1.2, b=0.75):
+        self.prefix = prefix
+        self.k1 = k1
+        self.b = b
+        vocab_path, offsets_path, docs_path, tfs_path, doclen_path = _paths(prefix)
+        with open(vocab_path, "r", encoding="utf-8") as f:
+            self.terms = {term: i for i, term in enumerate(json.load(f))}
+        self.offsets = np.load(offsets_path, mmap_mode="r")
+        self.docs = np.load(docs_path, mmap_mode="r")
+        self.tfs = np.load(tfs_path, mmap_mode="r")
+        self.doclen = np.load(doclen_path, mmap_mode="r")
+        self.n = len(self.doclen)
+        # 1.0 keeps an all-empty corpus from dividing by zero
+        self.avgdl = (float(self.doclen.mean()) if self.n else 0.0) or 1.0
+
+    @staticmethod
+    def exists(prefix):
+        return all(os.path.exists(p) for p in _paths(prefix))
+
+    @staticmethod
+    def write(prefix, docs):
+        """Build the index over docs (chunk dicts or text, in chunk-id order) and write it"""
+        postings = {}
+        doclen = []
+        for doc_id, doc in enumerate(docs):
+            tokens = tokenize(doc["content"] if isinstance(doc, dict) else doc)
+            doclen.append(len(tokens))
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                postings.setdefault(token, []).append((doc_id, min(tf, MAX_TF)))
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype="<i8")
+        for i, term in enumerate(terms):
+            offsets[i + 1] = offsets[i] + len(postings[term])
+        flat = [posting for term in terms for posting in postings[term]]
+        doc_ids = np.array([d for d, _ in flat], dtype="<i4")
+        tfs = np.array([tf for _, tf in flat], dtype="<u2")
+
+        vocab_path, offsets_path, docs_path, tfs_path, doclen_path = _paths(prefix)
+        os.makedirs(os.path.dirname(prefix) or ".", exist_ok=True)
+        for path, array in ((offsets_path, offsets), (docs_path, doc_ids), (tfs_path, tfs),
+                            (doclen_path, np.array(doclen, dtype="<i4"))):
+            np.save(path + ".tmp.npy", array)
+            os.replace(path + ".tmp.npy", path)
+        with open(vocab_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(terms, f)
+        os.replace(vocab_path + ".tmp", vocab_path)
+        return len(terms)
+
+    def covers(self, query):
+        """True if the query has terms and every one is in the vocabulary"""
+        tokens = tokenize(query)
+        return bool(tokens) and all(t in self.terms for t in tokens)
+
+    def search(self, query, k):
+        """Top k (chunk id, score) pairs, best first; empty if no term matches"""
+        scores = None
+        for token in set(tokenize(query)):
+            term = self.terms.get(token)
+            if term is None:
+                continue
+            start, end = int(self.offsets[term]), int(self.offsets[term + 1])
+            docs = self.docs[start:end]
+            tf = self.tfs[start:end].astype("float32")
+            df = end - start
+            idf = math.log(1 + (self.n - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.doclen[docs] / self.avgdl)
+            if scores is None:
+                scores = np.zeros(self.n, dtype="float32")
+            # Each doc appears once per term's postings, so plain fancy-index add is safe
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + norm)
+        if scores is None:
+            return []
+        hits = np.flatnonzero(scores)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return [(int(i), float(scores[i])) for i in hits]
+
+    def nbytes(self):
+        return self.offsets.nbytes + self.docs.nbytes + self.tfs.nbytes + self.doclen.nbytes
+
+
+def rrf_fuse(rankings, k=60):
+    """Reciprocal-rank fusion of id lists (each best first) into one list, best first"""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=lambda doc_id: -scores[doc_id])
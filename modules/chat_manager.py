@@ -1,12 +1,63 @@
 # modules/chat_manager.py
-from modules.rag import RAGRetriever
-from modules.utils import call_llm_api
-from modules.phq_gad import PHQ9_QUESTIONS, GAD7_QUESTIONS, OPTIONS
+import asyncio
+import time
+import uuid
+from modules.rag import get_shared_retriever
+from modules.batcher import get_shared_batcher
+from modules.utils import call_llm_api, stream_llm_api
+from modules.llm_client import LLMError
+from modules.context import pack_context, count_tokens
+from modules.memory import ConversationMemory
+from modules.intent import get_shared_router
+from modules.metrics import span, observe_stage, record_tokens, record_turn
+from modules.session_store import MessageLog, get_shared_session_store
+from modules.analytics import allowed_cohort, get_shared_analytics
+import config
+from modules.phq_gad import PHQ9_QUESTIONS, GAD7_QUESTIONS, OPTIONS, risk_level
+
+# Shown when the LLM is overloaded or unreachable, instead of hanging the session
+BUSY_REPLY = "I'm having a little trouble responding right now. Could you give me a moment and try again?"
+
+# What the context used to cost every turn: the top 2 chunks cut to 1000 chars
+BASELINE_CONTEXT_TOKENS = 2 * count_tokens("x" * 1000)
+
+# Valid questionnaire answers (0-3)
+ANSWER_SCORES = frozenset(score for _, score in OPTIONS)
+
+# Questionnaire progress and counters a session store persists
+STATE_FIELDS = (
+    "current_test_name", "test_index", "test_scores", "exchange_count", "prompted_for_test",
+    "test_declined_count", "chats_since_decline", "phq9_completed", "gad7_completed",
+    "phq9_risk", "gad7_risk", "post_phq_exchanges", "cohort",
+)
+
+def _prompt_tokens(llm_messages):
+    return sum(count_tokens(m["content"]) for m in llm_messages)
 
 class ChatManager:
-    def __init__(self):
-        self.messages = []
-        self.rag = RAGRetriever()
+    # Thousands of these can be alive in one API process
+    __slots__ = (
+        "session_id", "store", "analytics", "messages", "memory", "router", "rag", "current_test",
+        "last_reply", "last_context_stats", "context_stats",
+    ) + STATE_FIELDS
+
+    def __init__(self, rag=None, session_id=None, store=None, cohort=None, analytics=None):
+        # With a session store (SESSION_DB_PATH) state survives restarts and only
+        # the newest messages stay in memory; an existing session_id resumes.
+        # store=False keeps this session in memory even when one is configured.
+        self.store = get_shared_session_store() if store is None else (store or None)
+        self.session_id = session_id or uuid.uuid4().hex
+        # Completed questionnaires go to the shared analytics store (ANALYTICS_PATH);
+        # analytics=False keeps replays and benchmarks out of the real figures
+        self.analytics = get_shared_analytics() if analytics is None else (analytics or None)
+        # What the LLM sees of the conversation: rolling summary + recent window
+        self.memory = ConversationMemory()
+        # Answers greetings/thanks/crisis messages without the LLM (shared, for its stats)
+        self.router = get_shared_router()
+        # Retrieval engine is shared process-wide; only conversation state is per session.
+        # None means the shared one, looked up on the first retrieval so a new
+        # session never waits for the model and index to load (see modules/warmup.py)
+        self.rag = rag
         self.current_test = None
         self.current_test_name = None
         self.test_index = 0
@@ -20,33 +71,62 @@ class ChatManager:
         self.phq9_risk = None
         self.gad7_risk = None
         self.post_phq_exchanges = 0
+        # Aggregate-only label (e.g. faculty or year) questionnaire results are filed
+        # under; labels not in ANALYTICS_COHORTS fall back to the default cohort
+        self.cohort = allowed_cohort(cohort) or config.ANALYTICS_DEFAULT_COHORT
+        # (reply, show_buttons, test_type) of the last generate_reply_stream call
+        self.last_reply = None
+        # Knowledge-base context cost, for the last turn and summed over the session
+        self.last_context_stats = None
+        self.context_stats = {"turns": 0, "context_tokens": 0, "tokens_saved": 0}
+
+        saved = self.store.load_state(self.session_id) if self.store is not None else None
+        if saved is None:
+            self.messages = MessageLog(self.session_id, self.store)
+        else:
+            state, count = saved
+            for name in STATE_FIELDS:
+                # Sessions saved before a field existed keep its default
+                setattr(self, name, state.get(name, getattr(self, name)))
+            if self.current_test_name is not None:
+                self.current_test = PHQ9_QUESTIONS if self.current_test_name == "PHQ9" else GAD7_QUESTIONS
+            self.messages = MessageLog(self.session_id, self.store, count=count)
+            self.memory.restore(state["memory"], self.messages.tail())
+
+    def _retriever(self):
+        # By default queries go through the batcher, which coalesces concurrent sessions
+        if self.rag is None:
+            self.rag = get_shared_batcher() if config.BATCH_ENABLED else get_shared_retriever()
+        return self.rag
+
+    def _persist(self):
+        # Queued, not written: the store commits in the background
+        if self.store is not None:
+            state = {name: getattr(self, name) for name in STATE_FIELDS}
+            state["memory"] = self.memory.snapshot()
+            self.store.save_state(self.session_id, state)
 
     def add_user_message(self, text):
-        self.messages.append({"role": "user", "content": text})
+        self.messages.append("user", text)
+        self.memory.add("user", text)
+        self._persist()
 
     def add_bot_message(self, text):
-        self.messages.append({"role": "assistant", "content": text})
+        self.messages.append("assistant", text)
+        self.memory.add("assistant", text)
+        self._persist()
 
     def get_messages(self):
-        return self.messages
+        """The most recent messages (all of them when there is no session store)"""
+        return self.messages.tail()
+
+    def get_older_messages(self, limit):
+        """Up to limit messages from before get_messages(), read from the session store"""
+        return self.messages.older(limit)
 
     def is_greeting(self, text):
-        # More specific greeting detection - only catch actual greetings at start of conversation
-        greetings = ["hi", "hello", "hey", "good morning", "good afternoon", "good evening"]
-        text_lower = text.lower().strip()
-        
-        # Only consider it a greeting if:
-        # 1. The text starts with a greeting word, OR
-        # 2. The text is just a greeting word, OR  
-        # 3. The text is a greeting + basic question like "hi how are you"
-        for greeting in greetings:
-            if (text_lower.startswith(greeting + " ") or 
-                text_lower == greeting or
-                text_lower.startswith(greeting + ",") or
-                (greeting in text_lower and len(text_lower.split()) <= 4 and 
-                 any(word in text_lower for word in ["how", "are", "you", "doing"]))):
-                return True
-        return False
+        # Only short greetings ("hi", "hey, how are you?") count; "hi, I feel low" does not
+        return self.router.classify(text) == "greeting"
 
     def should_prompt_for_test(self):
         # Don't prompt if already in test or showing buttons
@@ -68,27 +148,143 @@ class ChatManager:
         return False, None
 
     def generate_reply(self, user_input):
+        started = time.perf_counter()
+        canned_reply, llm_messages, should_prompt, test_type = self._prepare_reply(user_input)
+        if canned_reply is not None:
+            observe_stage("turn", time.perf_counter() - started)
+            return canned_reply, False, "PHQ9"
+
+        llm_started = time.perf_counter()
+        try:
+            reply_text = call_llm_api(messages=llm_messages)
+            # Without streaming the first token arrives with the last one
+            observe_stage("llm_total", time.perf_counter() - llm_started)
+            record_tokens(_prompt_tokens(llm_messages), count_tokens(reply_text))
+        except LLMError:
+            reply_text = BUSY_REPLY
+        result = self._finish_reply(reply_text, should_prompt, test_type)
+        observe_stage("turn", time.perf_counter() - started)
+        return result
+
+    def generate_reply_stream(self, user_input):
+        """Like generate_reply, but yields the reply text in chunks as the LLM produces it.
+
+        Once the generator is exhausted, self.last_reply holds the same
+        (reply, show_buttons, test_type) tuple generate_reply would return; the
+        test-prompt check runs on the full accumulated text. Closed early (the
+        reader went away), it records the part of the reply already yielded.
+        """
+        self.last_reply = None
+        started = time.perf_counter()
+        canned_reply, llm_messages, should_prompt, test_type = self._prepare_reply(user_input)
+        if canned_reply is not None:
+            self.last_reply = (canned_reply, False, "PHQ9")
+            observe_stage("turn", time.perf_counter() - started)
+            yield canned_reply
+            return
+
+        yield "🧠 "
+        parts = []
+        llm_started = time.perf_counter()
+        try:
+            for chunk in stream_llm_api(messages=llm_messages):
+                if not parts:
+                    observe_stage("llm_ttft", time.perf_counter() - llm_started)
+                parts.append(chunk)
+                yield chunk
+        except LLMError:
+            # Keep whatever already reached the user; only fall back if nothing did
+            if not parts:
+                parts.append(BUSY_REPLY)
+                yield BUSY_REPLY
+        except GeneratorExit:
+            if parts:
+                self.last_reply = self._finish_reply("".join(parts), should_prompt, test_type)
+            raise
+        else:
+            observe_stage("llm_total", time.perf_counter() - llm_started)
+            record_tokens(_prompt_tokens(llm_messages), count_tokens("".join(parts)))
+        self.last_reply = self._finish_reply("".join(parts), should_prompt, test_type)
+        # Includes the time the caller spent rendering the chunks
+        observe_stage("turn", time.perf_counter() - started)
+
+    async def generate_reply_stream_async(self, user_input, llm):
+        """generate_reply_stream for asyncio servers.
+
+        Routing and retrieval (blocking, but short) run in a worker thread;
+        the LLM call awaits llm, an AsyncLLMClient, on the event loop, so a
+        turn waiting on the model holds no thread.
+        """
+        self.last_reply = None
+        started = time.perf_counter()
+        canned_reply, llm_messages, should_prompt, test_type = await asyncio.to_thread(self._prepare_reply, user_input)
+        if canned_reply is not None:
+            self.last_reply = (canned_reply, False, "PHQ9")
+            observe_stage("turn", time.perf_counter() - started)
+            yield canned_reply
+            return
+
+        yield "🧠 "
+        parts = []
+        llm_started = time.perf_counter()
+        chunks = llm.stream(llm_messages)
+        try:
+            async for chunk in chunks:
+                if not parts:
+                    observe_stage("llm_ttft", time.perf_counter() - llm_started)
+                parts.append(chunk)
+                yield chunk
+        except LLMError:
+            if not parts:
+                parts.append(BUSY_REPLY)
+                yield BUSY_REPLY
+        except GeneratorExit:
+            if parts:
+                self.last_reply = self._finish_reply("".join(parts), should_prompt, test_type)
+            raise
+        else:
+            observe_stage("llm_total", time.perf_counter() - llm_started)
+            record_tokens(_prompt_tokens(llm_messages), count_tokens("".join(parts)))
+        finally:
+            # Async generators are not closed when dropped; free the LLM slot now
+            await chunks.aclose()
+        self.last_reply = self._finish_reply("".join(parts), should_prompt, test_type)
+        observe_stage("turn", time.perf_counter() - started)
+
+    def _prepare_reply(self, user_input):
+        """Update exchange counters and build the LLM prompt for user_input.
+
+        Returns (canned_reply, llm_messages, should_prompt, test_type); for a
+        turn the intent router answers itself (greeting, thanks, goodbye,
+        crisis) the canned reply is already recorded and llm_messages is None.
+        """
+        with span("intent"):
+            route = self.router.route(user_input)
+        record_turn(route.intent)
+
         # Count non-greeting exchanges
-        if not self.is_greeting(user_input):
+        if route.intent != "greeting":
             self.exchange_count += 1
             if self.test_declined_count > 0:
                 self.chats_since_decline += 1
             if self.phq9_completed and not self.gad7_completed:
                 self.post_phq_exchanges += 1
 
-        # Handle greetings
-        if self.is_greeting(user_input):
-            reply = "🧠 Hi there! I'm here to support you. How are you feeling today?"
-            self.add_bot_message(reply)
-            return reply, False, "PHQ9"
+        # Trivial turns and crisis messages never wait on the network
+        if not route.needs_llm:
+            self.add_bot_message(route.reply)
+            return route.reply, None, False, "PHQ9"
 
-        # Get context from RAG
-        top_docs = self.rag.retrieve(user_input, top_k=2)
-        context_text = "\n".join([doc['content'][:1000] for doc in top_docs]) if top_docs else ""
+        # Get context from RAG: only relevant, de-duplicated hits, packed into a token budget
+        # (query_embedding and faiss_search are timed inside the retriever)
+        with span("retrieval"):
+            top_docs = self._retriever().retrieve(user_input, top_k=4) if route.needs_retrieval else []
+        assembly_started = time.perf_counter()
+        context_text, context_tokens = pack_context(top_docs, config.RAG_CONTEXT_TOKENS)
+        self._record_context_stats(len(top_docs), context_tokens)
 
-        # Get last 5 conversations (10 messages total - 5 user + 5 bot)
-        recent_messages = self.get_messages()[-10:]  # Last 10 messages = 5 conversations
-        chat_history = "\n".join([f"{msg['role'].capitalize()}: {msg['content']}" for msg in recent_messages])
+        # Rolling summary + token-bounded recent window, questionnaire chatter filtered out
+        chat_history = self.memory.render(current_input=user_input)
 
         # Check if we should prompt for test
         should_prompt_result = self.should_prompt_for_test()
@@ -133,9 +329,18 @@ class ChatManager:
                 "content": f"Chat History:\n{chat_history}\n\nCurrent Input: {user_input}\n\nContext: {context_text}"
             }
         ]
+        observe_stage("prompt_assembly", time.perf_counter() - assembly_started)
+        return None, llm_messages, should_prompt, test_type
 
-        reply_text = call_llm_api(messages=llm_messages)
-        
+    def _record_context_stats(self, hits, context_tokens):
+        saved = BASELINE_CONTEXT_TOKENS - context_tokens
+        self.last_context_stats = {"hits": hits, "context_tokens": context_tokens, "tokens_saved": saved}
+        self.context_stats["turns"] += 1
+        self.context_stats["context_tokens"] += context_tokens
+        self.context_stats["tokens_saved"] += saved
+
+    def _finish_reply(self, reply_text, should_prompt, test_type):
+        """Detect the questionnaire offer in the full reply text and record the reply"""
         # Check if we should show test buttons
         show_buttons = should_prompt and (
             "Would you like to take" in reply_text or 
@@ -159,6 +364,7 @@ class ChatManager:
         elif test_type == "GAD7":
             # If they decline GAD-7, reset the post-PHQ counter and mark as "declined"
             self.post_phq_exchanges = 0
+        self._persist()
     
     def start_test(self, test_name="PHQ9"):
         """Start the questionnaire"""
@@ -167,6 +373,7 @@ class ChatManager:
         self.test_index = 0
         self.test_scores = []
         self.prompted_for_test = False
+        self._persist()
         return self.get_next_question()
 
     def get_next_question(self):
@@ -177,36 +384,40 @@ class ChatManager:
     def record_answer(self, score):
         if not self.current_test or self.test_index >= len(self.current_test):
             return None
+        # Checked before any state changes, so a bad answer leaves the question open
         try:
-            self.test_scores.append(int(score))
-            self.test_index += 1
-            if self.test_index >= len(self.current_test):
-                return self.calculate_risk()
-            return self.get_next_question()
+            score = int(score)
         except (ValueError, TypeError):
             return None
+        if score not in ANSWER_SCORES:
+            return None
+        self.test_scores.append(score)
+        self.test_index += 1
+        if self.test_index >= len(self.current_test):
+            result = self.calculate_risk()
+        else:
+            result = self.get_next_question()
+        self._persist()
+        return result
 
     def calculate_risk(self):
         total = sum(self.test_scores)
         completed_test_name = self.current_test_name
-        
+        risk = risk_level(completed_test_name, total)
+
+        # Anonymous: only the answers, the time and the cohort are recorded.
+        # Analytics never get in the way of showing the user their result
+        if self.analytics is not None:
+            try:
+                self.analytics.append(completed_test_name, self.test_scores, self.cohort)
+            except Exception as exc:
+                print(f"Questionnaire analytics: could not record a {completed_test_name} result: {exc}")
+
         if self.current_test_name == "PHQ9":
-            if total < 5:
-                risk = "low"
-            elif total < 15:
-                risk = "moderate"
-            else:
-                risk = "high"
             self.phq9_completed = True
             self.phq9_risk = risk
             self.post_phq_exchanges = 0  # Reset counter for GAD-7 prompt
         else:  # GAD7
-            if total < 5:
-                risk = "low"
-            elif total < 10:
-                risk = "moderate"
-            else:
-                risk = "high"
             self.gad7_completed = True
             self.gad7_risk = risk
         
@@ -0,0 +1,118 @@
+# modules/chunk_store.py
+import json
+import mmap
+import os
+
+import numpy as np
+
+# One fixed-size row per chunk; the text itself lives in the .bin blob
+ROW_DTYPE = np.dtype([("offset", "<u8"), ("length", "<u4"), ("name_id", "<u4"), ("page", "<u4")])
+
+
+def _paths(prefix):
+    return prefix + ".bin", prefix + ".rows.npy", prefix + ".names.json"
+
+
+class ChunkStore:
+    """Read-only, memory-mapped store of chunk text and metadata.
+
+    On disk a store is three files next to each other:
+      <prefix>.bin         every chunk's UTF-8 text, concatenated
+      <prefix>.rows.npy    (offset, length, name_id, page) per chunk
+      <prefix>.names.json  table of source file names
+    plus, when near-duplicates were collapsed at build time,
+      <prefix>.sources.json  chunk id -> [[name, page], ...] of the dropped copies
+    The blob and rows are mmap'd, so opening is O(1), text is only decoded
+    for the ids asked for, and worker processes share the same page cache.
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        blob_path, rows_path, names_path = _paths(prefix)
+        with open(names_path, "r", encoding="utf-8") as f:
+            self.names = json.load(f)
+        self.rows = np.load(rows_path, mmap_mode="r")
+        self.sources = {}
+        if os.path.exists(prefix + ".sources.json"):
+            with open(prefix + ".sources.json", "r", encoding="utf-8") as f:
+                self.sources = {int(i): [tuple(s) for s in v] for i, v in json.load(f).items()}
+        self._file = open(blob_path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        # mmap refuses empty files
+        self._blob = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    @staticmethod
+    def exists(prefix):
+        return all(os.path.exists(p) for p in _paths(prefix))
+
+    @staticmethod
+    def write(prefix, docs, sources=None):
+        """Write docs ({"name", "content", "page"} dicts, any iterable) as a store.
+
+        sources maps chunk ids to the (name, page) of duplicates collapsed
+        into them, so results can cite every document a passage came from.
+
+        Text is streamed to the blob one chunk at a time. Each file is written
+        to a temp name and renamed into place, so readers that already have
+        the old store open keep a consistent view.
+        """
+        blob_path, rows_path, names_path = _paths(prefix)
+        os.makedirs(os.path.dirname(prefix) or ".", exist_ok=True)
+        names, name_ids, rows = [], {}, []
+        offset = 0
+        with open(blob_path + ".tmp", "wb") as blob:
+            for doc in docs:
+                data = doc["content"].encode("utf-8")
+                blob.write(data)
+                name_id = name_ids.get(doc["name"])
+                if name_id is None:
+                    name_id = name_ids[doc["name"]] = len(names)
+                    names.append(doc["name"])
+                rows.append((offset, len(data), name_id, doc.get("page", 1)))
+                offset += len(data)
+        np.save(rows_path + ".tmp.npy", np.array(rows, dtype=ROW_DTYPE))
+        with open(names_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(names, f)
+        with open(prefix + ".sources.json.tmp", "w", encoding="utf-8") as f:
+            json.dump({str(i): [list(s) for s in v] for i, v in (sources or {}).items()}, f)
+        os.replace(prefix + ".sources.json.tmp", prefix + ".sources.json")
+        # The retriever writes its manifest only after this returns, so a
+        # store torn by a crash here is detected and rebuilt on the next start
+        os.replace(names_path + ".tmp", names_path)
+        os.replace(rows_path + ".tmp.npy", rows_path)
+        os.replace(blob_path + ".tmp", blob_path)
+        return len(rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, i):
+        offset, length, name_id, page = self.rows[i].tolist()
+        doc = {
+            "name": self.names[name_id],
+            "content": self._blob[offset:offset + length].decode("utf-8"),
+            "page": page,
+        }
+        also_in = self.sources.get(int(i))
+        if also_in:
+            doc["also_in"] = [{"name": name, "page": page} for name, page in also_in]
+        return doc
+
+    def get_many(self, ids):
+        """Decode only the chunks FAISS returned; invalid (-1) ids are skipped"""
+        return [self[i] for i in ids if 0 <= i < len(self.rows)]
+
+    def slice(self, start, end):
+        return [self[i] for i in range(start, end)]
+
+    def __iter__(self):
+        for i in range(len(self.rows)):
+            yield self[i]
+
+    def nbytes(self):
+        return len(self._blob) + self.rows.nbytes
+
+    def close(self):
+        if isinstance(self._blob, mmap.mmap):
+            self._blob.close()
+        self._file.close()
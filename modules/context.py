@@ -0,0 +1,101 @@
+# modules/context.py
+import re
+
+import numpy as np
+
+# Rough OpenAI-style estimate: ~4 characters per token for English text
+CHARS_PER_TOKEN = 4
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def count_tokens(text):
+    """Cheap token estimate, good enough for budgeting prompts"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def mmr_select(query_vec, cand_vecs, k, mmr_lambda=0.7, dup_threshold=0.95):
+    """Maximal-marginal-relevance pick of k candidate rows.
+
+    Candidates must be in relevance order. Each step takes the candidate with
+    the best trade-off between similarity to the query and dissimilarity to
+    what is already picked; candidates with cosine >= dup_threshold to a picked
+    one are dropped outright as near-duplicates. Returns candidate positions.
+    """
+    if len(cand_vecs) == 0:
+        return []
+    cands = np.asarray(cand_vecs, dtype="float32")
+    cands = cands / np.maximum(np.linalg.norm(cands, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_vec, dtype="float32").reshape(-1)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+    relevance = cands @ query
+    similarity = cands @ cands.T
+
+    selected = []
+    remaining = list(range(len(cands)))
+    while remaining and len(selected) < k:
+        if selected:
+            redundancy = similarity[np.ix_(remaining, selected)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining), dtype="float32")
+        scores = mmr_lambda * relevance[remaining] - (1 - mmr_lambda) * redundancy
+        best = remaining.pop(int(np.argmax(scores)))
+        if selected and similarity[best, selected].max() >= dup_threshold:
+            continue
+        selected.append(best)
+    return selected
+
+
+def dedup_ranked(cand_vecs, k, dup_threshold=0.95):
+    """Walk candidates in the given (already fused) order, keeping up to k that
+    are not near-duplicates (cosine >= dup_threshold) of one kept earlier.
+    Returns candidate positions."""
+    if len(cand_vecs) == 0:
+        return []
+    cands = np.asarray(cand_vecs, dtype="float32")
+    cands = cands / np.maximum(np.linalg.norm(cands, axis=1, keepdims=True), 1e-12)
+    selected = []
+    for pos in range(len(cands)):
+        if selected and float((cands[selected] @ cands[pos]).max()) >= dup_threshold:
+            continue
+        selected.append(pos)
+        if len(selected) == k:
+            break
+    return selected
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut text to max_tokens, at the last sentence end that fits if there is one"""
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    head = text[:limit]
+    ends = [m.start() for m in _SENTENCE_END.finditer(head)]
+    if ends:
+        return head[:ends[-1]]
+    return head.rsplit(" ", 1)[0]
+
+
+def pack_context(docs, token_budget, min_tokens=40):
+    """Fill token_budget with docs in relevance order.
+
+    Whole docs are taken while they fit; the first one that doesn't is cut at
+    a sentence boundary if at least min_tokens of budget are left. Returns
+    (context_text, tokens_used).
+    """
+    parts, used = [], 0
+    for doc in docs:
+        content = doc["content"]
+        tokens = count_tokens(content)
+        if used + tokens <= token_budget:
+            parts.append(content)
+            used += tokens
+            continue
+        remaining = token_budget - used
+        if remaining >= min_tokens:
+            content = truncate_to_tokens(content, remaining)
+            if content:
+                parts.append(content)
+                used += count_tokens(content)
+        break
+    return "\n".join(parts), used
@@ -0,0 +1,97 @@
+# modules/dedup.py
+import re
+import zlib
+
+import numpy as np
+
+from modules.context import count_tokens
+
+_WORD = re.compile(r"\w+")
+# Prime just above 2**32; (a * h + b) with a, h, b < 2**32 still fits in uint64
+_PRIME = np.uint64(4294967311)
+
+
+class MinHasher:
+    """MinHash signatures of word-shingle sets; equal rows estimate Jaccard similarity"""
+
+    def __init__(self, num_perm=128, shingle=5, seed=1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle = shingle
+        self._a = rng.integers(1, 2 ** 32, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 2 ** 32, num_perm, dtype=np.uint64)
+
+    def signature(self, text):
+        words = _WORD.findall(text.lower())
+        n = self.shingle
+        shingles = {" ".join(words[i:i + n]) for i in range(max(1, len(words) - n + 1))}
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+        return ((np.outer(self._a, hashes) + self._b[:, None]) % _PRIME).min(axis=1).astype(np.uint32)
+
+
+class NearDuplicateIndex:
+    """LSH over MinHash signatures for collapsing near-identical chunks at build time.
+
+    Signatures are split into `bands` bands; chunks sharing any band are
+    candidates, confirmed when the estimated Jaccard similarity of their
+    shingle sets is >= threshold. With 128 permutations in 16 bands the
+    S-curve sits around 0.7, below the 0.85 default threshold, so true
+    near-duplicates are very unlikely to be missed.
+
+    The first chunk of a group is kept; later ones are dropped and recorded as
+    extra sources of the kept chunk. Only verbatim-ish copies match: the
+    shipped corpus, which paraphrases rather than copies, has none, so the
+    stage is off unless DEDUP_THRESHOLD is set.
+    """
+
+    def __init__(self, threshold=0.85, num_perm=128, bands=16):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._buckets = [{} for _ in range(bands)]
+        self._signatures = {}
+        self.owners = {}  # kept chunk id -> source file name
+        self.sources = {}  # kept chunk id -> [(name, page), ...] of dropped duplicates
+        self.dropped = 0
+        self.dropped_tokens = 0
+        # source file -> {"dropped", "dropped_tokens", "dup_of": files of the kept chunks}
+        self.by_file = {}
+
+    def _band_keys(self, signature):
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def add(self, chunk_id, text, owner):
+        """Register a kept chunk so later chunks can match it"""
+        self._insert(chunk_id, self.hasher.signature(text), owner)
+
+    def _insert(self, chunk_id, signature, owner):
+        for bucket, key in zip(self._buckets, self._band_keys(signature)):
+            bucket.setdefault(key, chunk_id)
+        self._signatures[chunk_id] = signature
+        self.owners[chunk_id] = owner
+
+    def check(self, chunk_id, doc):
+        """Id of the kept chunk doc duplicates (recording doc as its source), or
+        None after registering doc itself under chunk_id"""
+        signature = self.hasher.signature(doc["content"])
+        seen = set()
+        for bucket, key in zip(self._buckets, self._band_keys(signature)):
+            candidate = bucket.get(key)
+            if candidate is None or candidate in seen:
+                continue
+            seen.add(candidate)
+            if float(np.mean(self._signatures[candidate] == signature)) >= self.threshold:
+                tokens = count_tokens(doc["content"])
+                self.sources.setdefault(candidate, []).append((doc["name"], doc.get("page", 1)))
+                self.dropped += 1
+                self.dropped_tokens += tokens
+                stats = self.by_file.setdefault(doc["name"], {"dropped": 0, "dropped_tokens": 0, "dup_of": set()})
+                stats["dropped"] += 1
+                stats["dropped_tokens"] += tokens
+                stats["dup_of"].add(self.owners[candidate])
+                return candidate
+        self._insert(chunk_id, signature, doc["name"])
+        return None
@@ -0,0 +1,166 @@
+# modules/embeddings.py
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import config
+
+EMBED_BACKENDS = ("fp32", "int8")
+
+
+class Embedder:
+    """CPU sentence embedder with a selectable inference backend.
+
+    backend "fp32" is plain SentenceTransformer inference; "int8" applies
+    PyTorch dynamic quantization to every Linear layer, which roughly halves
+    per-query latency on CPU for MiniLM at a tiny cosine drift (see
+    parity_report). num_threads pins torch's intra-op threads; processes > 1
+    lets encode_bulk spread index builds over worker processes.
+    """
+
+    def __init__(
+        self,
+        model_name="all-MiniLM-L6-v2",
+        backend=config.EMBED_BACKEND,
+        num_threads=config.EMBED_THREADS,
+        batch_size=config.EMBED_BATCH_SIZE,
+        processes=config.EMBED_PROCESSES
+    ):
+        if backend not in EMBED_BACKENDS:
+            raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {EMBED_BACKENDS}")
+        # torch and sentence_transformers take seconds to import; only pay that
+        # when a model is actually loaded, not whenever the app imports this module
+        import torch
+        from sentence_transformers import SentenceTransformer
+        self.model_name = model_name
+        self.backend = backend
+        self.num_threads = num_threads
+        self.batch_size = batch_size
+        self.processes = processes
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self.model = SentenceTransformer(model_name, device="cpu")
+        if backend == "int8":
+            self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model.eval()
+
+    @property
+    def dim(self):
+        return self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts, batch_size=None):
+        """Embed texts in this process, returning a float32 (n, dim) array"""
+        import torch
+        with torch.inference_mode():
+            embeddings = self.model.encode(
+                list(texts),
+                batch_size=batch_size or self.batch_size,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            )
+        # Ensure 2D
+        if len(embeddings.shape) == 1:
+            embeddings = embeddings.reshape(1, -1)
+        return embeddings.astype("float32", copy=False)
+
+    @property
+    def bulk_batch_size(self):
+        """How many texts a bulk caller should hand encode_bulk at once"""
+        return self.batch_size * max(1, self.processes) * 4
+
+    def encode_bulk(self, texts):
+        """Embed many texts, across self.processes worker processes when > 1.
+
+        Each worker loads its own copy of the model with the same backend and
+        cpu_count // processes intra-op threads, so workers don't fight over
+        cores. Output order matches input order.
+        """
+        texts = list(texts)
+        if self.processes <= 1 or len(texts) <= self.batch_size:
+            return self.encode(texts)
+        executor = self._bulk_executor()
+        slices = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        return np.vstack(list(executor.map(_encode_in_worker, slices)))
+
+    def _bulk_executor(self):
+        executor = getattr(self, "_executor", None)
+        if executor is None:
+            threads = max(1, (os.cpu_count() or 1) // self.processes)
+            executor = ProcessPoolExecutor(
+                max_workers=self.processes,
+                initializer=_init_worker,
+                initargs=(self.model_name, self.backend, threads, self.batch_size),
+            )
+            self._executor = executor
+        return executor
+
+    def close(self):
+        """Shut down bulk-encoding workers, if any were started"""
+        executor = getattr(self, "_executor", None)
+        if executor is not None:
+            executor.shutdown()
+            self._executor = None
+
+
+_worker_embedder = None
+
+
+def _init_worker(model_name, backend, num_threads, batch_size):
+    global _worker_embedder
+    _worker_embedder = Embedder(model_name, backend, num_threads, batch_size, processes=1)
+
+
+def _encode_in_worker(texts):
+    return _worker_embedder.encode(texts)
+
+
+def parity_report(reference, candidate, texts):
+    """Compare two embedders on texts: cosine between their vectors per text.
+
+    Returns mean/p5/min cosine and the worst-case drift (1 - min cosine);
+    for retrieval, mean >= 0.99 means rankings are practically unchanged.
+    """
+    a = reference.encode(texts)
+    b = candidate.encode(texts)
+    a = a / np.maximum(np.linalg.norm(a, axis=1, keepdims=True), 1e-12)
+    b = b / np.maximum(np.linalg.norm(b, axis=1, keepdims=True), 1e-12)
+    cosine = (a * b).sum(axis=1)
+    return {
+        "texts": len(texts),
+        "reference": reference.backend,
+        "candidate": candidate.backend,
+        "mean_cosine": float(cosine.mean()),
+        "p5_cosine": float(np.percentile(cosine, 5)),
+        "min_cosine": float(cosine.min()),
+        "max_drift": float(1 - cosine.min()),
+    }
+
+
+def _sample_texts(store_path, limit):
+    from modules.chunk_store import ChunkStore
+    if store_path is None:
+        # Chunks of the version currently served
+        from modules.index_versions import VersionDir
+        versions = VersionDir(config.INDEX_DIR)
+        if versions.current() is None:
+            raise SystemExit(f"No index built in {config.INDEX_DIR} yet; pass --store")
+        store_path = versions.path(versions.current(), "chunks")
+    store = ChunkStore(store_path)
+    step = max(1, len(store) // limit)
+    texts = [store[i]["content"] for i in range(0, len(store), step)][:limit]
+    store.close()
+    return texts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check cosine drift of an embedding backend against fp32")
+    parser.add_argument("--backend", default="int8", choices=EMBED_BACKENDS)
+    parser.add_argument("--store", help="chunk store to sample texts from (default: the current index version)")
+    parser.add_argument("--samples", type=int, default=500)
+    args = parser.parse_args()
+    texts = _sample_texts(args.store, args.samples)
+    report = parity_report(Embedder(backend="fp32"), Embedder(backend=args.backend), texts)
+    for key, value in report.items():
+        print(f"{key:>12}: {value}")
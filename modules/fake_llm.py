@@ -0,0 +1,214 @@
+# modules/fake_llm.py
+"""Local fake of the Groq/OpenAI chat completions API for tests and benchmarks.
+
+Run it with `python -m modules.fake_llm --port 8089` and start the app with
+GROQ_BASE_URL=http://127.0.0.1:8089 to exercise the full pipeline, streaming
+included, without network access or an API key.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = (
+    "That sounds really hard, and it makes sense that you feel this way. "
+    "Try to be gentle with yourself and take things one small step at a time."
+)
+# Appended when the system prompt asks the bot to offer the questionnaires,
+# so the test-prompt detection path is exercised too
+TEST_OFFER = " Would you like to take the PHQ-9 and GAD-7 questionnaires now?"
+
+
+class FakeLLMServer:
+    """OpenAI-compatible /chat/completions server with tunable latency.
+
+    ttft: seconds before the first token (or the whole reply when not streaming)
+    token_delay: seconds between streamed tokens
+    reply: fixed reply text, or a callable taking the request messages
+    error_rate: fraction of requests answered with error_status instead
+    retry_after: Retry-After seconds sent with injected 429s
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, ttft=0.2, token_delay=0.01, reply=None,
+                 error_rate=0.0, error_status=429, retry_after=None, seed=None):
+        self.ttft = ttft
+        self.token_delay = token_delay
+        self.reply = reply
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.errors = 0
+        self._random = random.Random(seed)
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def make_reply(self, messages):
+        if callable(self.reply):
+            return self.reply(messages)
+        text = self.reply or DEFAULT_REPLY
+        system = next((m["content"] for m in messages if m.get("role") == "system"), "")
+        if "questionnaire" in system.lower():
+            text += TEST_OFFER
+        return text
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                with server._lock:
+                    server.requests += 1
+                    fail = server._random.random() < server.error_rate
+                    if fail:
+                        server.errors += 1
+                if fail:
+                    self._send_error_json(server.error_status)
+                    return
+                text = server.make_reply(body.get("messages", []))
+                model = body.get("model", "fake")
+                if body.get("stream"):
+                    self._stream(text, model)
+                else:
+                    time.sleep(server.ttft)
+                    self._send_json(_completion(text, model, body.get("messages", [])))
+
+            def _send_json(self, payload, status=200):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_error_json(self, status):
+                data = json.dumps({"error": {"message": "injected failure", "type": "fake_error"}}).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                if status == 429 and server.retry_after is not None:
+                    self.send_header("Retry-After", str(server.retry_after))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, text, model):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+                time.sleep(server.ttft)
+                for i, token in enumerate(_tokens(text)):
+                    if i:
+                        time.sleep(server.token_delay)
+                    self._event(_chunk(completion_id, model, {"content": token}))
+                self._event(_chunk(completion_id, model, {}, finish_reason="stop"))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+            def _event(self, payload):
+                self.wfile.write(b"data: " + json.dumps(payload).encode("utf-8") + b"\n\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def _tokens(text):
+    """Split text into word-sized pieces that concatenate back to text"""
+    pieces, start = [], 0
+    for i, ch in enumerate(text):
+        if ch == " " and i > start:
+            pieces.append(text[start:i])
+            start = i
+    pieces.append(text[start:])
+    return [piece for piece in pieces if piece]
+
+
+def _count_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def _completion(text, model, messages):
+    prompt_tokens = sum(_count_tokens(m.get("content", "")) for m in messages)
+    completion_tokens = _count_tokens(text)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": text},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def _chunk(completion_id, model, delta, finish_reason=None):
+    return {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--ttft", type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="seconds between tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=429)
+    args = parser.parse_args()
+    server = FakeLLMServer(args.host, args.port, ttft=args.ttft, token_delay=args.token_delay,
+                           error_rate=args.error_rate, error_status=args.error_status)
+    print(f"✅ Fake LLM server listening on {server.url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,113 @@
+# modules/index_backends.py
+import math
+
+import faiss
+import numpy as np
+
+BACKENDS = ("flat", "ivf_flat", "hnsw", "ivf_pq", "sq8")
+
+# FAISS warns below ~39 training points per centroid; below this many vectors
+# an approximate index is no faster than brute force anyway
+MIN_POINTS_PER_CENTROID = 39
+MIN_VECTORS_FOR_IVF = 2048
+# Cap on training points, so training time doesn't grow with the corpus
+MAX_TRAIN_POINTS_PER_CENTROID = 256
+
+
+def _nlist(n):
+    """IVF list count: ~4*sqrt(n), with enough points to train every centroid"""
+    return max(1, min(int(4 * math.sqrt(n)), n // MIN_POINTS_PER_CENTROID))
+
+
+def _pq_m(dim):
+    """Sub-quantizer count: largest divisor of dim giving >= 8 dims per sub-vector"""
+    for m in range(dim // 8, 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def auto_params(backend, n, dim):
+    """Choose index parameters from corpus size.
+
+    The returned dict is what gets persisted next to the index, so a reload
+    can restore the search-time settings FAISS does not store itself.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown index backend {backend!r}, expected one of {BACKENDS}")
+
+    if backend in ("ivf_flat", "ivf_pq") and n < MIN_VECTORS_FOR_IVF:
+        backend = "flat"
+
+    params = {"backend": backend, "dim": dim, "ntotal": n}
+    if backend in ("ivf_flat", "ivf_pq"):
+        nlist = _nlist(n)
+        params["nlist"] = nlist
+        # Probing ~1/16 of the lists keeps recall@10 high for MiniLM-sized vectors
+        params["nprobe"] = min(nlist, max(8, nlist // 16))
+    if backend == "ivf_pq":
+        params["m"] = _pq_m(dim)
+        # 8-bit codes need 256 centroids per sub-quantizer, each with enough points
+        params["nbits"] = max(4, min(8, int(math.log2(max(n // MIN_POINTS_PER_CENTROID, 16)))))
+    if backend == "hnsw":
+        params["M"] = 32
+        params["ef_construction"] = 80
+        params["ef_search"] = 64
+    return params
+
+
+def _make_index(params):
+    dim = params["dim"]
+    backend = params["backend"]
+    if backend == "flat":
+        return faiss.IndexFlatL2(dim)
+    if backend == "ivf_flat":
+        return faiss.IndexIVFFlat(faiss.IndexFlatL2(dim), dim, params["nlist"])
+    if backend == "ivf_pq":
+        return faiss.IndexIVFPQ(faiss.IndexFlatL2(dim), dim, params["nlist"], params["m"], params["nbits"])
+    if backend == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, params["M"])
+        index.hnsw.efConstruction = params["ef_construction"]
+        return index
+    if backend == "sq8":
+        return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit)
+    raise ValueError(f"Unknown index backend {backend!r}")
+
+
+def _training_sample(vectors, params, seed=0):
+    if "nlist" in params:
+        limit = params["nlist"] * MAX_TRAIN_POINTS_PER_CENTROID
+    elif "nbits" in params:
+        limit = (1 << params["nbits"]) * MAX_TRAIN_POINTS_PER_CENTROID
+    else:
+        return vectors
+    if len(vectors) <= limit:
+        return vectors
+    rows = np.random.default_rng(seed).choice(len(vectors), limit, replace=False)
+    return vectors[np.sort(rows)]
+
+
+def build_index(vectors, backend="flat", params=None):
+    """Build and fill an index of the given backend, returning (index, params)"""
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    n, dim = vectors.shape
+    params = params or auto_params(backend, n, dim)
+    index = _make_index(params)
+    if not index.is_trained:
+        index.train(_training_sample(vectors, params))
+    index.add(vectors)
+    apply_search_params(index, params)
+    return index, params
+
+
+def apply_search_params(index, params):
+    """Restore search-time knobs (nprobe / efSearch) on a loaded index"""
+    if "nprobe" in params:
+        faiss.extract_index_ivf(index).nprobe = params["nprobe"]
+    if "ef_search" in params:
+        index.hnsw.efSearch = params["ef_search"]
+
+
+def index_nbytes(index):
+    """Serialized size of an index in bytes"""
+    return int(faiss.serialize_index(index).nbytes)
@@ -0,0 +1,103 @@
+# modules/index_manifest.py
+import hashlib
+import json
+import os
+
+MANIFEST_VERSION = 1
+
+
+def file_sha256(path, block_size=1 << 20):
+    """Content hash of a file, read in blocks so large files are never held in memory"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def hash_corpus(docs_path, suffix=".txt"):
+    """Map every corpus file name in docs_path to its content hash"""
+    hashes = {}
+    if not os.path.isdir(docs_path):
+        return hashes
+    for fname in sorted(os.listdir(docs_path)):
+        if fname.endswith(suffix):
+            hashes[fname] = file_sha256(os.path.join(docs_path, fname))
+    return hashes
+
+
+def corpus_fingerprint(docs_path, suffix=".txt"):
+    """Cheap change detector for polling: (name, size, mtime) of every corpus file"""
+    if not os.path.isdir(docs_path):
+        return ()
+    entries = []
+    for entry in os.scandir(docs_path):
+        if entry.name.endswith(suffix):
+            st = entry.stat()
+            entries.append((entry.name, st.st_size, st.st_mtime_ns))
+    return tuple(sorted(entries))
+
+
+def load_manifest(path):
+    """Load a build manifest, or None if it is missing, unreadable or from another version"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def save_manifest(path, manifest):
+    """Write the manifest atomically so a crash never leaves a half-written file"""
+    manifest = dict(manifest, version=MANIFEST_VERSION)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def diff_corpus(manifest, hashes, params):
+    """Compare the current corpus against a manifest.
+
+    Returns (added, changed, removed, unchanged) lists of file names. When there
+    is no usable manifest, or the build parameters differ, every file counts as
+    added so the whole index is rebuilt.
+    """
+    if manifest is None or manifest.get("params") != params:
+        return sorted(hashes), [], [], []
+
+    old_files = manifest.get("files", {})
+    added, changed, unchanged = [], [], []
+    for fname, digest in hashes.items():
+        if fname not in old_files:
+            added.append(fname)
+        elif old_files[fname]["sha256"] != digest:
+            changed.append(fname)
+        else:
+            unchanged.append(fname)
+    removed = sorted(set(old_files) - set(hashes))
+    return sorted(added), sorted(changed), removed, sorted(unchanged)
+
+
+def invalidate_dependents(manifest, stale, unchanged):
+    """Move unchanged files whose collapsed duplicates pointed into a stale file back to changed.
+
+    A file's near-duplicate chunks are dropped in favour of a kept copy in
+    another file ("dup_of" in its manifest entry). If that file is added,
+    changed or removed, the dropped chunks may have lost their copy, so the
+    dependent file must be chunked again. Returns (unchanged, moved).
+    """
+    files = manifest.get("files", {})
+    stale = set(stale)
+    unchanged, moved = list(unchanged), []
+    while True:
+        dependents = [f for f in unchanged if stale & set(files[f].get("dedup", {}).get("dup_of", []))]
+        if not dependents:
+            return unchanged, sorted(moved)
+        for fname in dependents:
+            unchanged.remove(fname)
+            moved.append(fname)
+            stale.add(fname)
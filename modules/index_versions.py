@@ -0,0 +1,132 @@
+# modules/index_versions.py
+import os
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # not POSIX: builds are not coordinated between processes
+    fcntl = None
+
+CURRENT = "CURRENT"
+STAGING_PREFIX = ".staging-"
+# Staging directories this old are leftovers of a crashed build
+STALE_STAGING_SECONDS = 3600
+
+
+@contextmanager
+def file_lock(path):
+    """Exclusive lock on path across processes (a no-op where flock is unavailable)"""
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def link_or_copy(src, dst):
+    """Hard-link an immutable file into a new version, copying across filesystems"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+class VersionDir:
+    """Immutable, numbered index builds under one root directory.
+
+    On disk:
+      <root>/v000007/      one complete build (FAISS index, chunk store, BM25, vectors, manifest)
+      <root>/CURRENT       name of the version to serve
+      <root>/.staging-*    builds in progress
+      <root>/.build.lock   serializes builds between worker processes
+    A build is written to a staging directory and renamed to its version
+    name, so a version directory is either complete or absent, and CURRENT
+    is replaced atomically after it. Versions are never modified once
+    published; anything that changes the build makes a new one.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, version, name=""):
+        return os.path.join(self.root, version, name)
+
+    def current(self):
+        """Name of the version to serve, or None before the first build"""
+        try:
+            with open(os.path.join(self.root, CURRENT), "r", encoding="utf-8") as f:
+                version = f.read().strip()
+        except OSError:
+            return None
+        return version if version and os.path.isdir(self.path(version)) else None
+
+    def versions(self):
+        """Published version names, oldest first"""
+        return sorted(name for name in os.listdir(self.root) if name[:1] == "v" and name[1:].isdigit())
+
+    def stage(self):
+        """Fresh directory to write a build into before publish()"""
+        path = os.path.join(self.root, f"{STAGING_PREFIX}{os.getpid()}-{uuid.uuid4().hex[:8]}")
+        os.makedirs(path)
+        return path
+
+    def publish(self, staging):
+        """Rename a finished staging directory to the next version and make it current"""
+        while True:
+            versions = self.versions()
+            version = f"v{int(versions[-1][1:]) + 1 if versions else 1:06d}"
+            try:
+                os.rename(staging, self.path(version))
+                break
+            except OSError:
+                # Another process took this number first (only without a build lock)
+                if not os.path.isdir(self.path(version)):
+                    raise
+        tmp = os.path.join(self.root, f"{CURRENT}.tmp-{os.getpid()}")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(version)
+        os.replace(tmp, os.path.join(self.root, CURRENT))
+        return version
+
+    def discard(self, staging):
+        shutil.rmtree(staging, ignore_errors=True)
+
+    def build_lock(self):
+        """Cross-process build lock, so workers don't all build the same corpus change"""
+        return file_lock(os.path.join(self.root, ".build.lock"))
+
+    def reclaim(self, in_use=(), keep=2):
+        """Delete old versions: all but CURRENT, the `keep` newest and those in in_use.
+
+        Keeping the newest few covers other processes that read CURRENT just
+        before it moved. A process that still has a deleted version open or
+        mmap'd keeps reading it; the space is freed when it lets go.
+        Returns the names removed.
+        """
+        keep_names = set(in_use) | set(self.versions()[-keep:] if keep > 0 else [])
+        current = self.current()
+        if current is not None:
+            keep_names.add(current)
+        removed = []
+        for version in self.versions():
+            if version not in keep_names:
+                shutil.rmtree(self.path(version), ignore_errors=True)
+                removed.append(version)
+        now = time.time()
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                stale = name.startswith(STAGING_PREFIX) and now - os.path.getmtime(path) > STALE_STAGING_SECONDS
+            except OSError:
+                continue  # finished or discarded meanwhile
+            if stale:
+                shutil.rmtree(path, ignore_errors=True)
+        return removed
@@ -0,0 +1,207 @@
+# modules/intent.py
+import re
+import threading
+import unicodedata
+
+import numpy as np
+
+import config
+
+GREETING_REPLY = "🧠 Hi there! I'm here to support you. How are you feeling today?"
+THANKS_REPLY = "🧠 You're very welcome. I'm here whenever you want to talk — how are you feeling right now?"
+BYE_REPLY = "🧠 Take care of yourself. I'm here any time you want to talk again. 💙"
+CRISIS_REPLY = (
+    "🧠 I'm really sorry you're feeling this way, and I'm glad you told me. Your safety matters most right now.\n\n"
+    "• If you are in immediate danger or might act on these thoughts, please call your local emergency number "
+    "(112 in India) or go to the nearest emergency department.\n"
+    "• You can talk to someone right now, free and confidential: Tele-MANAS **14416** or **1-800-891-4416** "
+    "(24x7, India). Outside India, find a local helpline at https://findahelpline.com.\n"
+    "• Please reach out to your campus counselling centre, or someone you trust, and let them know how you feel.\n\n"
+    "You don't have to go through this alone. I'm here to keep talking with you too."
+)
+
+
+class Route:
+    """What to do with one user message"""
+    __slots__ = ("intent", "reply", "needs_llm", "needs_retrieval")
+
+    def __init__(self, intent, reply=None, needs_llm=True, needs_retrieval=True):
+        self.intent = intent
+        self.reply = reply
+        self.needs_llm = needs_llm
+        self.needs_retrieval = needs_retrieval
+
+
+def _phrases(words):
+    """One alternation, longest phrases first so 'good morning' beats 'good'; apostrophes are optional"""
+    return "|".join(re.escape(w).replace(r"\ ", r"\s+").replace("'", "'?")
+                    for w in sorted(words, key=len, reverse=True))
+
+
+# Curly and modifier apostrophes phone keyboards insert; NFKC leaves them alone
+_APOSTROPHES = str.maketrans({"\u2019": "'", "\u2018": "'", "\u02bc": "'", "\u2032": "'", "`": "'"})
+
+
+def normalize(text):
+    """NFKC plus straight apostrophes, so "don\u2019t" matches the same phrases as "don't" """
+    return unicodedata.normalize("NFKC", text).translate(_APOSTROPHES)
+
+
+_GREETINGS = ["hi", "hii", "hello", "hey", "heya", "hola", "namaste", "good morning", "good afternoon",
+              "good evening", "yo", "sup", "howdy"]
+_SMALL_TALK = ["how are you", "how r u", "how are you doing", "how r u doing", "how's it going", "what's up",
+               "there", "bot", "friend", "buddy"]
+_THANKS = ["thanks", "thank you", "thank u", "thx", "ty", "thanks a lot", "thank you so much", "thanks so much",
+           "much appreciated"]
+_BYE = ["bye", "goodbye", "good bye", "see you", "see ya", "see you later", "later", "good night", "gn",
+        "take care", "talk later", "ttyl", "that's all", "thats all"]
+_ACKS = ["ok", "okay", "okk", "k", "kk", "yes", "yeah", "yep", "yup", "sure", "alright", "all right", "cool",
+         "fine", "got it", "i see", "hmm", "hm", "right", "nice", "great", "maybe"]
+# Answers too, but never a prefix for thanks: "no thanks" is a refusal, not gratitude
+_NEGATIVES = ["no", "nope", "nah"]
+# Self-harm and suicide phrases. Matched anywhere in the normalized message, never fully
+# anchored; a missed crisis is far worse than a false alarm, so err on the wide side
+_CRISIS = ["kill myself", "killing myself", "suicide", "suicidal", "end my life", "ending my life", "end it all",
+           "want to die", "wanna die", "wish i was dead", "wish i were dead", "better off dead",
+           "hurt myself", "hurting myself", "harm myself", "self harm", "self-harm", "cut myself",
+           "cutting myself", "overdose", "no reason to live", "not worth living", "take my own life",
+           "don't want to live", "don't want to be alive", "don't want to be here anymore",
+           "don't want to exist", "want to be dead", "wanna be dead", "feel like dying", "feeling like dying",
+           "going to end it", "gonna end it", "want to end it", "wanna end it", "i'll end it", "end it tonight",
+           "no point in living", "no point living", "no point in going on", "can't go on",
+           "can't do this anymore", "unalive myself", "kms"]
+
+_TRAIL = r"[\s,.!?:;)(*~\-🙂😊🙏❤️💙]*"
+_GREETING_RE = re.compile(
+    rf"^\s*(?:{_phrases(_GREETINGS)})\b{_TRAIL}(?:(?:{_phrases(_SMALL_TALK)}){_TRAIL})*$", re.I
+)
+_THANKS_RE = re.compile(rf"^\s*(?:(?:{_phrases(_THANKS + _ACKS)}){_TRAIL})*(?:{_phrases(_THANKS)}){_TRAIL}$", re.I)
+_BYE_RE = re.compile(
+    rf"^\s*(?:(?:{_phrases(_THANKS + _ACKS + _NEGATIVES)}){_TRAIL})*(?:{_phrases(_BYE)})\b{_TRAIL}(?:(?:{_phrases(_BYE + _THANKS)}){_TRAIL})*$",
+    re.I,
+)
+_ACK_RE = re.compile(rf"^\s*(?:(?:{_phrases(_ACKS + _NEGATIVES)}){_TRAIL})+$", re.I)
+# "kms" is also kilometres: "ran 5 kms" is not a crisis
+_CRISIS_RE = re.compile(rf"\b(?:{_phrases(_CRISIS)})\b(?<!\d kms)(?<!\dkms)", re.I)
+
+# Prototype phrases for the optional embedding classifier
+_PROTOTYPES = {
+    "crisis": ["I want to kill myself", "I don't see the point in living anymore", "I am thinking about ending it",
+               "I keep thinking about hurting myself", "everyone would be better without me"],
+    "thanks": ["thank you so much", "thanks for listening", "I appreciate your help"],
+    "bye": ["bye, talk to you later", "I have to go now", "goodnight"],
+}
+
+
+class IntentRouter:
+    """Pre-LLM router that answers trivial turns and short-circuits crises.
+
+    Keyword matching uses precompiled regex alternations and runs in
+    microseconds. Order matters: crisis phrases win over everything, so a
+    message like "hi, I want to die" gets the static safety reply with no
+    network round trip. Greetings, thanks and goodbyes get template replies;
+    bare acknowledgements ("ok", "yes") still go to the LLM (they answer the
+    bot's last question) but skip retrieval.
+
+    With an encode function (texts -> vectors, e.g. RAGRetriever.embed),
+    short messages the keywords miss are also compared to intent prototypes
+    using the already-loaded MiniLM model.
+    """
+
+    def __init__(self, encode=None, threshold=config.INTENT_THRESHOLD, max_words=8):
+        self.encode = encode
+        self.threshold = threshold
+        self.max_words = max_words
+        self._prototypes = None
+        self._lock = threading.Lock()
+        self._counts = {}
+        self._turns = 0
+        self._llm_avoided = 0
+        self._retrieval_skipped = 0
+
+    def classify(self, text):
+        """Intent name for text: crisis, greeting, thanks, bye, ack or None"""
+        text = normalize(text)
+        if _CRISIS_RE.search(text):
+            return "crisis"
+        if _GREETING_RE.match(text):
+            return "greeting"
+        if _BYE_RE.match(text):
+            return "bye"
+        if _THANKS_RE.match(text):
+            return "thanks"
+        if _ACK_RE.match(text):
+            return "ack"
+        if self.encode is not None and len(text.split()) <= self.max_words:
+            return self._classify_embedding(text)
+        return None
+
+    def route(self, text):
+        intent = self.classify(text)
+        if intent == "crisis":
+            route = Route(intent, CRISIS_REPLY, needs_llm=False, needs_retrieval=False)
+        elif intent == "greeting":
+            route = Route(intent, GREETING_REPLY, needs_llm=False, needs_retrieval=False)
+        elif intent == "thanks":
+            route = Route(intent, THANKS_REPLY, needs_llm=False, needs_retrieval=False)
+        elif intent == "bye":
+            route = Route(intent, BYE_REPLY, needs_llm=False, needs_retrieval=False)
+        elif intent == "ack":
+            route = Route(intent, needs_retrieval=False)
+        else:
+            route = Route(None)
+        self._record(route)
+        return route
+
+    def _classify_embedding(self, text):
+        if self._prototypes is None:
+            names, texts = [], []
+            for name, phrases in _PROTOTYPES.items():
+                names.extend([name] * len(phrases))
+                texts.extend(phrases)
+            vectors = self.encode(texts)
+            self._prototypes = (names, vectors / np.linalg.norm(vectors, axis=1, keepdims=True))
+        names, vectors = self._prototypes
+        query = self.encode([text])[0]
+        scores = vectors @ (query / max(float(np.linalg.norm(query)), 1e-12))
+        best = int(np.argmax(scores))
+        return names[best] if scores[best] >= self.threshold else None
+
+    def _record(self, route):
+        with self._lock:
+            self._turns += 1
+            self._counts[route.intent] = self._counts.get(route.intent, 0) + 1
+            if not route.needs_llm:
+                self._llm_avoided += 1
+            if not route.needs_retrieval:
+                self._retrieval_skipped += 1
+
+    def stats(self):
+        with self._lock:
+            turns = self._turns
+            return {
+                "turns": turns,
+                "by_intent": {(k or "other"): v for k, v in self._counts.items()},
+                "llm_avoided": self._llm_avoided,
+                "llm_avoided_ratio": round(self._llm_avoided / turns, 4) if turns else 0.0,
+                "retrieval_skipped": self._retrieval_skipped,
+            }
+
+
+_shared_lock = threading.Lock()
+_shared_router = None
+
+
+def get_shared_router():
+    """Process-wide router, so intent stats cover every session"""
+    global _shared_router
+    with _shared_lock:
+        if _shared_router is None:
+            _shared_router = IntentRouter(_shared_encode if config.INTENT_CLASSIFIER else None)
+    return _shared_router
+
+
+def _shared_encode(texts):
+    from modules.rag import get_shared_retriever
+    # Looked up per call, so creating the router never waits for the model
+    return get_shared_retriever().embed(texts)
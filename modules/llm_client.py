@@ -0,0 +1,406 @@
+# modules/llm_client.py
+import asyncio
+import random
+import threading
+import time
+import weakref
+
+import groq
+import httpx
+
+import config
+
+DEFAULT_MODEL = "openai/gpt-oss-20b"
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+# What a call can raise: groq wraps errors while sending the request, but a
+# stream is read by httpx directly, so a timeout mid-stream arrives unwrapped
+CALL_ERRORS = (groq.APIError, httpx.HTTPError)
+
+
+# Clients serving user replies (not background=True), for user_calls_waiting()
+_user_clients = weakref.WeakSet()
+
+
+def user_calls_waiting():
+    """User-facing LLM calls queued for a slot right now, across every client in the process"""
+    return sum(client.counters.queued for client in list(_user_clients))
+
+
+class LLMError(Exception):
+    """The LLM call failed after all retries"""
+
+
+class LLMOverloadedError(LLMError):
+    """Request was shed because too many calls are already queued"""
+
+
+class LLMDeadlineExceeded(LLMError):
+    """Request could not complete before its deadline"""
+
+
+class _Counters:
+    """Call counters shared by the sync and async clients"""
+
+    FIELDS = ("calls", "queued", "in_flight", "succeeded", "retried", "failed", "shed")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        for name in self.FIELDS:
+            setattr(self, name, 0)
+
+    def add(self, name, delta=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + delta)
+
+    def snapshot(self):
+        with self._lock:
+            return {name: getattr(self, name) for name in self.FIELDS}
+
+
+def _is_retryable(exc):
+    if isinstance(exc, (groq.APITimeoutError, groq.APIConnectionError, httpx.TransportError)):
+        return True
+    return isinstance(exc, groq.APIStatusError) and exc.status_code in RETRY_STATUSES
+
+
+def _retry_after(exc):
+    """Seconds the server asked us to wait, if it said so"""
+    response = getattr(exc, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class _RetryPolicy:
+    def __init__(self, max_retries, backoff_base, backoff_cap, deadline, request_timeout):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.deadline = deadline
+        self.request_timeout = request_timeout
+
+    def attempt_timeout(self, expires):
+        remaining = expires - time.monotonic()
+        if remaining <= 0:
+            raise LLMDeadlineExceeded(f"LLM call exceeded its {self.deadline}s deadline")
+        return min(self.request_timeout, remaining)
+
+    def check_deadline(self, expires):
+        if time.monotonic() >= expires:
+            raise LLMDeadlineExceeded(f"LLM call exceeded its {self.deadline}s deadline")
+
+    def backoff(self, attempt, exc, expires):
+        """Delay before the next attempt, or None if we should give up"""
+        if attempt >= self.max_retries or not _is_retryable(exc):
+            return None
+        # Full jitter: spreads retries out so a 429 burst doesn't re-synchronize
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+        delay = max(delay, _retry_after(exc) or 0)
+        if time.monotonic() + delay >= expires:
+            return None
+        return delay
+
+
+def _extract_text(response):
+    return response.choices[0].message.content
+
+
+def _extract_delta(chunk):
+    if not chunk.choices:
+        return None
+    return chunk.choices[0].delta.content
+
+
+class LLMClient:
+    """Thread-safe Groq client shared by every session in the process.
+
+    - one pooled HTTP client (max_connections / max_keepalive)
+    - per-attempt timeout and an overall deadline per call
+    - jittered exponential retry on 429/5xx/connection errors
+    - at most max_in_flight concurrent calls; up to max_queue callers wait
+      (for at most queue_timeout seconds), anything beyond is shed with
+      LLMOverloadedError instead of piling up
+    - background=True for clients of background work (summaries), which
+      user_calls_waiting() doesn't count
+    """
+
+    def __init__(
+        self,
+        api_key=None,
+        base_url=None,
+        max_connections=config.LLM_MAX_CONNECTIONS,
+        max_keepalive=config.LLM_MAX_KEEPALIVE,
+        max_in_flight=config.LLM_MAX_IN_FLIGHT,
+        max_queue=config.LLM_MAX_QUEUE,
+        queue_timeout=config.LLM_QUEUE_TIMEOUT,
+        request_timeout=config.LLM_REQUEST_TIMEOUT,
+        deadline=config.LLM_DEADLINE,
+        max_retries=config.LLM_MAX_RETRIES,
+        backoff_base=0.5,
+        backoff_cap=8.0,
+        background=False,
+    ):
+        self.client = groq.Groq(
+            api_key=api_key or config.GROQ_API_KEY,
+            base_url=base_url or config.GROQ_BASE_URL,
+            max_retries=0,  # retries are ours, so they respect the deadline
+            http_client=httpx.Client(
+                limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive),
+                timeout=request_timeout,
+            ),
+        )
+        self.policy = _RetryPolicy(max_retries, backoff_base, backoff_cap, deadline, request_timeout)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.counters = _Counters()
+        if not background:
+            _user_clients.add(self)
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+
+    def stats(self):
+        return self.counters.snapshot()
+
+    def _acquire(self):
+        self.counters.add("calls")
+        if self._slots.acquire(blocking=False):
+            self.counters.add("in_flight")
+            return
+        if self.counters.queued >= self.max_queue:
+            self.counters.add("shed")
+            raise LLMOverloadedError("Too many LLM calls queued")
+        self.counters.add("queued")
+        try:
+            acquired = self._slots.acquire(timeout=self.queue_timeout)
+        finally:
+            self.counters.add("queued", -1)
+        if not acquired:
+            self.counters.add("shed")
+            raise LLMOverloadedError(f"Waited {self.queue_timeout}s for a free LLM slot")
+        self.counters.add("in_flight")
+
+    def _release(self):
+        self.counters.add("in_flight", -1)
+        self._slots.release()
+
+    def _with_retries(self, call, expires=None):
+        if expires is None:
+            expires = time.monotonic() + self.policy.deadline
+        attempt = 0
+        while True:
+            try:
+                return call(self.policy.attempt_timeout(expires))
+            except LLMDeadlineExceeded:
+                self.counters.add("failed")
+                raise
+            except CALL_ERRORS as exc:
+                delay = self.policy.backoff(attempt, exc, expires)
+                if delay is None:
+                    self.counters.add("failed")
+                    raise LLMError(str(exc) or type(exc).__name__) from exc
+                self.counters.add("retried")
+                attempt += 1
+                time.sleep(delay)
+
+    def complete(self, messages, model=DEFAULT_MODEL, **kwargs):
+        """Return the full reply text for messages"""
+        self._acquire()
+        try:
+            response = self._with_retries(lambda timeout: self.client.chat.completions.create(
+                messages=messages, model=model, timeout=timeout, **kwargs
+            ))
+            self.counters.add("succeeded")
+            return _extract_text(response)
+        finally:
+            self._release()
+
+    def stream(self, messages, model=DEFAULT_MODEL, **kwargs):
+        """Yield reply text pieces; the call only retries until the first piece arrives.
+
+        The deadline covers the whole reply: a stream still running when it
+        passes stops with LLMDeadlineExceeded after the pieces already yielded.
+        """
+        self._acquire()
+        try:
+            expires = time.monotonic() + self.policy.deadline
+
+            def open_stream(timeout):
+                stream = self.client.chat.completions.create(
+                    messages=messages, model=model, stream=True, timeout=timeout, **kwargs
+                )
+                iterator = iter(stream)
+                # Pull the first chunk inside the retry loop so 429s surface here
+                try:
+                    return stream, iterator, next(iterator, None)
+                except BaseException:
+                    stream.close()
+                    raise
+
+            stream, iterator, first = self._with_retries(open_stream, expires)
+            try:
+                if first is not None:
+                    delta = _extract_delta(first)
+                    if delta:
+                        yield delta
+                    for chunk in iterator:
+                        self.policy.check_deadline(expires)
+                        delta = _extract_delta(chunk)
+                        if delta:
+                            yield delta
+            except LLMDeadlineExceeded:
+                self.counters.add("failed")
+                raise
+            except CALL_ERRORS as exc:
+                self.counters.add("failed")
+                raise LLMError(str(exc) or type(exc).__name__) from exc
+            finally:
+                stream.close()
+            self.counters.add("succeeded")
+        finally:
+            self._release()
+
+
+class AsyncLLMClient:
+    """asyncio-native counterpart of LLMClient for async servers.
+
+    Use one instance per event loop; its semaphore and HTTP pool belong to
+    that loop.
+    """
+
+    def __init__(
+        self,
+        api_key=None,
+        base_url=None,
+        max_connections=config.LLM_MAX_CONNECTIONS,
+        max_keepalive=config.LLM_MAX_KEEPALIVE,
+        max_in_flight=config.LLM_MAX_IN_FLIGHT,
+        max_queue=config.LLM_MAX_QUEUE,
+        queue_timeout=config.LLM_QUEUE_TIMEOUT,
+        request_timeout=config.LLM_REQUEST_TIMEOUT,
+        deadline=config.LLM_DEADLINE,
+        max_retries=config.LLM_MAX_RETRIES,
+        backoff_base=0.5,
+        backoff_cap=8.0,
+        background=False,
+    ):
+        self.client = groq.AsyncGroq(
+            api_key=api_key or config.GROQ_API_KEY,
+            base_url=base_url or config.GROQ_BASE_URL,
+            max_retries=0,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive),
+                timeout=request_timeout,
+            ),
+        )
+        self.policy = _RetryPolicy(max_retries, backoff_base, backoff_cap, deadline, request_timeout)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.counters = _Counters()
+        if not background:
+            _user_clients.add(self)
+        self._slots = asyncio.Semaphore(max_in_flight)
+
+    def stats(self):
+        return self.counters.snapshot()
+
+    async def aclose(self):
+        await self.client.close()
+
+    async def _acquire(self):
+        self.counters.add("calls")
+        if not self._slots.locked():
+            await self._slots.acquire()
+            self.counters.add("in_flight")
+            return
+        if self.counters.queued >= self.max_queue:
+            self.counters.add("shed")
+            raise LLMOverloadedError("Too many LLM calls queued")
+        self.counters.add("queued")
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.counters.add("shed")
+            raise LLMOverloadedError(f"Waited {self.queue_timeout}s for a free LLM slot") from None
+        finally:
+            self.counters.add("queued", -1)
+        self.counters.add("in_flight")
+
+    def _release(self):
+        self.counters.add("in_flight", -1)
+        self._slots.release()
+
+    async def _with_retries(self, call, expires=None):
+        if expires is None:
+            expires = time.monotonic() + self.policy.deadline
+        attempt = 0
+        while True:
+            try:
+                return await call(self.policy.attempt_timeout(expires))
+            except LLMDeadlineExceeded:
+                self.counters.add("failed")
+                raise
+            except CALL_ERRORS as exc:
+                delay = self.policy.backoff(attempt, exc, expires)
+                if delay is None:
+                    self.counters.add("failed")
+                    raise LLMError(str(exc) or type(exc).__name__) from exc
+                self.counters.add("retried")
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    async def complete(self, messages, model=DEFAULT_MODEL, **kwargs):
+        await self._acquire()
+        try:
+            response = await self._with_retries(lambda timeout: self.client.chat.completions.create(
+                messages=messages, model=model, timeout=timeout, **kwargs
+            ))
+            self.counters.add("succeeded")
+            return _extract_text(response)
+        finally:
+            self._release()
+
+    async def stream(self, messages, model=DEFAULT_MODEL, **kwargs):
+        """Async LLMClient.stream; the deadline covers the whole reply here too"""
+        await self._acquire()
+        try:
+            expires = time.monotonic() + self.policy.deadline
+
+            async def open_stream(timeout):
+                stream = await self.client.chat.completions.create(
+                    messages=messages, model=model, stream=True, timeout=timeout, **kwargs
+                )
+                iterator = stream.__aiter__()
+                try:
+                    first = await iterator.__anext__()
+                except StopAsyncIteration:
+                    first = None
+                except BaseException:
+                    await stream.close()
+                    raise
+                return stream, iterator, first
+
+            stream, iterator, first = await self._with_retries(open_stream, expires)
+            try:
+                if first is not None:
+                    delta = _extract_delta(first)
+                    if delta:
+                        yield delta
+                    async for chunk in iterator:
+                        self.policy.check_deadline(expires)
+                        delta = _extract_delta(chunk)
+                        if delta:
+                            yield delta
+            except LLMDeadlineExceeded:
+                self.counters.add("failed")
+                raise
+            except CALL_ERRORS as exc:
+                self.counters.add("failed")
+                raise LLMError(str(exc) or type(exc).__name__) from exc
+            finally:
+                await stream.close()
+            self.counters.add("succeeded")
+        finally:
+            self._release()
@@ -0,0 +1,202 @@
+# modules/memory.py
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from modules.context import count_tokens, truncate_to_tokens
+
+# Questionnaire chatter: adds nothing to the conversation the LLM needs to see
+_BOILERPLATE = re.compile(
+    r"^\s*(?:\*?(?:PHQ-9|GAD-7) )?\*?Question \d+/\d+"
+    r"|^🧠 No problem! We can continue chatting"
+    r"|^🧠 That's okay! We can continue our conversation"
+    r"|^🧠 It looks like there was an issue"
+)
+# Questionnaire results are kept, but as one short fact each
+_RESULT = re.compile(r"(PHQ-9|GAD-7) Complete!\*.*?result: \*(\w+)\*(?:.*?Overall Risk Level: (\w+))?", re.S)
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a supportive chat between a student and a mental health companion. "
+    "Update the summary with the new messages. Keep what the student shared about their feelings, situation, "
+    "concerns and anything the companion already suggested. Write at most {words} words, third person, no preamble."
+)
+
+# Summaries are written off the hot path, shared by every conversation
+_executor = ThreadPoolExecutor(max_workers=config.MEMORY_SUMMARY_WORKERS, thread_name_prefix="memory-summary")
+
+
+def _default_summarize(messages):
+    from modules.llm_client import LLMOverloadedError, user_calls_waiting
+    from modules.utils import get_summary_client
+    # Low priority: while user replies wait for an LLM slot, summaries wait too
+    if user_calls_waiting():
+        raise LLMOverloadedError("User replies are queued; summary deferred")
+    return get_summary_client().complete(messages)
+
+
+class ConversationMemory:
+    """Prompt-side memory of one conversation: a rolling summary plus a recent window.
+
+    Messages are added as they happen. Questionnaire questions and button
+    replies are dropped; questionnaire results become one-line facts. The
+    newest messages are kept verbatim up to window_tokens (long bot replies
+    are clipped to reply_tokens); whatever falls out of the window is folded
+    into the summary by a background LLM call once batch_tokens of it have
+    piled up, so there is one summary call per few turns rather than one per
+    message. Until then those messages stay in the prompt verbatim, so it
+    stays under window_tokens + batch_tokens + summary_tokens no matter how
+    long the chat runs.
+    """
+
+    def __init__(
+        self,
+        summarize=None,
+        window_tokens=config.MEMORY_WINDOW_TOKENS,
+        summary_tokens=config.MEMORY_SUMMARY_TOKENS,
+        reply_tokens=config.MEMORY_REPLY_TOKENS,
+        batch_tokens=config.MEMORY_SUMMARY_BATCH_TOKENS,
+        max_pending=40
+    ):
+        self.summarize = summarize or _default_summarize
+        self.window_tokens = window_tokens
+        self.summary_tokens = summary_tokens
+        self.reply_tokens = reply_tokens
+        self.batch_tokens = batch_tokens
+        self.max_pending = max_pending
+        self.summary = ""
+        self.facts = []
+        self.window = []  # (role, content, tokens), oldest first
+        self._window_total = 0
+        self._pending = []  # (role, content, tokens) waiting to be summarized
+        self._pending_total = 0
+        self._summarizing = False
+        self._summarized = 0
+        self._lock = threading.Lock()
+
+    def add(self, role, content):
+        result = _RESULT.search(content)
+        if result:
+            test, risk, overall = result.groups()
+            fact = f"{test} screening result: {risk}" + (f"; overall risk: {overall}" if overall else "")
+            with self._lock:
+                self.facts.append(fact)
+            return
+        if _BOILERPLATE.search(content):
+            return
+
+        if role == "assistant":
+            content = truncate_to_tokens(content, self.reply_tokens)
+        tokens = count_tokens(content)
+        with self._lock:
+            self.window.append((role, content, tokens))
+            self._window_total += tokens
+            # Always keep the newest message, even if it alone exceeds the window
+            while self._window_total > self.window_tokens and len(self.window) > 1:
+                message = self.window.pop(0)
+                self._window_total -= message[2]
+                self._pending.append(message)
+                self._pending_total += message[2]
+            if len(self._pending) > self.max_pending:
+                self._drop_pending(len(self._pending) - self.max_pending)
+            start = self._pending_total >= self.batch_tokens and not self._summarizing
+            if start:
+                self._summarizing = True
+        if start:
+            _executor.submit(self._update_summary)
+
+    def _drop_pending(self, count):
+        self._pending_total -= sum(tokens for _, _, tokens in self._pending[:count])
+        del self._pending[:count]
+
+    def _update_summary(self):
+        while True:
+            with self._lock:
+                if self._pending_total < self.batch_tokens:
+                    self._summarizing = False
+                    return
+                batch, self._pending, self._pending_total = self._pending, [], 0
+                summary = self.summary
+            transcript = "\n".join(f"{role.capitalize()}: {content}" for role, content, _ in batch)
+            words = max(20, self.summary_tokens * 3 // 4)
+            messages = [
+                {"role": "system", "content": SUMMARY_PROMPT.format(words=words)},
+                {"role": "user", "content": f"Current summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"},
+            ]
+            try:
+                new_summary = truncate_to_tokens(self.summarize(messages).strip(), self.summary_tokens)
+            except Exception:
+                # LLMError, deferred for user traffic, or anything else from the
+                # summarizer: put the batch back and let the next message retry
+                with self._lock:
+                    self._pending = batch + self._pending
+                    self._pending_total += sum(tokens for _, _, tokens in batch)
+                    if len(self._pending) > self.max_pending:
+                        self._drop_pending(len(self._pending) - self.max_pending)
+                    self._summarizing = False
+                return
+            with self._lock:
+                self.summary = new_summary
+                self._summarized += len(batch)
+
+    def render(self, current_input=None):
+        """Chat history text for the prompt.
+
+        If the newest message is the user's current_input it is left out,
+        since the prompt carries it separately.
+        """
+        with self._lock:
+            # Fallen out of the window but not summarized yet: still verbatim
+            window = self._pending + self.window
+            summary, facts = self.summary, list(self.facts)
+        if current_input is not None and window and window[-1][0] == "user" and window[-1][1] == current_input:
+            window = window[:-1]
+
+        parts = []
+        if summary:
+            parts.append(f"Summary of earlier conversation: {summary}")
+        if facts:
+            parts.append("Known results: " + "; ".join(facts))
+        parts.extend(f"{role.capitalize()}: {content}" for role, content, _ in window)
+        return "\n".join(parts)
+
+    def snapshot(self):
+        """What a session store must keep to rebuild this memory later"""
+        with self._lock:
+            return {"summary": self.summary, "facts": list(self.facts)}
+
+    def restore(self, snapshot, messages):
+        """Rebuild from snapshot() plus the newest messages, without summarizing again.
+
+        The window is refilled newest first from messages; anything older is
+        assumed to be in the saved summary already.
+        """
+        window, total = [], 0
+        for message in reversed(messages):
+            role, content = message["role"], message["content"]
+            if _RESULT.search(content) or _BOILERPLATE.search(content):
+                continue
+            if role == "assistant":
+                content = truncate_to_tokens(content, self.reply_tokens)
+            tokens = count_tokens(content)
+            if window and total + tokens > self.window_tokens:
+                break
+            window.append((role, content, tokens))
+            total += tokens
+        with self._lock:
+            self.summary = snapshot.get("summary", "")
+            self.facts = list(snapshot.get("facts", []))
+            self.window = window[::-1]
+            self._window_total = total
+            self._pending, self._pending_total = [], 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "window_messages": len(self.window),
+                "window_tokens": self._window_total,
+                "summary_tokens": count_tokens(self.summary),
+                "summarized_messages": self._summarized,
+                "pending_messages": len(self._pending),
+                "pending_tokens": self._pending_total,
+            }
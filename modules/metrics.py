@@ -0,0 +1,267 @@
+# modules/metrics.py
+import bisect
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import config
+
+# Stage latency buckets, seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Prompt / completion size buckets, tokens
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+
+class Histogram:
+    """Cumulative-bucket histogram, Prometheus style"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding quantile q (what Prometheus would estimate)"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            seen += n
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+class Registry:
+    """Process-wide metrics: labelled histograms and counters, plus collectors
+    that report gauges from other components (LLM client, batcher, caches)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}  # name -> (help, buckets, {labels: Histogram})
+        self._counters = {}  # name -> (help, {labels: value})
+        self._collectors = {}
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        with self._lock:
+            self._histograms.setdefault(name, (help_text, buckets, {}))
+
+    def counter(self, name, help_text):
+        with self._lock:
+            self._counters.setdefault(name, (help_text, {}))
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            _, buckets, series = self._histograms[name]
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = Histogram(buckets)
+            hist.observe(value)
+
+    def inc(self, name, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters[name][1]
+            series[key] = series.get(key, 0) + value
+
+    def register_collector(self, key, collect):
+        """collect() returns [(name, labels_dict, value), ...] gauges, read at scrape time.
+
+        Registering the same key again replaces the collector, so callers that
+        run repeatedly (Streamlit reruns) don't pile up duplicates.
+        """
+        with self._lock:
+            self._collectors[key] = collect
+
+    def snapshot(self, name):
+        """{labels: (count, sum, p50, p95, p99)} for one histogram"""
+        with self._lock:
+            series = self._histograms[name][2]
+            return {
+                key: (h.count, h.sum, h.quantile(0.5), h.quantile(0.95), h.quantile(0.99))
+                for key, h in series.items()
+            }
+
+    def render_prometheus(self):
+        lines = []
+        with self._lock:
+            for name, (help_text, buckets, series) in sorted(self._histograms.items()):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, hist in sorted(series.items()):
+                    cumulative = 0
+                    for bound, n in zip(buckets + (float("inf"),), hist.counts):
+                        cumulative += n
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{name}_bucket{_labels(key + (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(key)} {hist.sum}")
+                    lines.append(f"{name}_count{_labels(key)} {hist.count}")
+            for name, (help_text, series) in sorted(self._counters.items()):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_labels(key)} {value}")
+            collectors = list(self._collectors.values())
+
+        gauges = {}
+        for collect in collectors:
+            try:
+                for name, labels, value in collect():
+                    gauges.setdefault(name, []).append((tuple(sorted(labels.items())), value))
+            except Exception:
+                continue  # a broken collector must not break the scrape
+        for name, series in sorted(gauges.items()):
+            lines.append(f"# TYPE {name} gauge")
+            for key, value in series:
+                lines.append(f"{name}{_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(key):
+    if not key:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in key)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(key, escaped)) + "}"
+
+
+REGISTRY = Registry()
+REGISTRY.histogram("pfa_stage_seconds", "Latency of each stage of a chat turn")
+REGISTRY.histogram("pfa_tokens", "Estimated tokens per LLM call", TOKEN_BUCKETS)
+REGISTRY.counter("pfa_tokens_total", "Estimated tokens sent to / received from the LLM")
+REGISTRY.counter("pfa_turns_total", "Chat turns handled, by intent route")
+
+
+class _Span:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        REGISTRY.observe("pfa_stage_seconds", time.perf_counter() - self.start, stage=self.stage)
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(stage):
+    """Time a block as one observation of pfa_stage_seconds{stage=...}.
+
+    With METRICS_SAMPLE_RATE < 1 only that fraction of spans is recorded; the
+    rest cost one random() call.
+    """
+    if config.METRICS_SAMPLE_RATE < 1.0 and random.random() >= config.METRICS_SAMPLE_RATE:
+        return _NO_SPAN
+    return _Span(stage)
+
+
+def observe_stage(stage, seconds):
+    """Record a duration measured by the caller (e.g. time to first token)"""
+    if config.METRICS_SAMPLE_RATE < 1.0 and random.random() >= config.METRICS_SAMPLE_RATE:
+        return
+    REGISTRY.observe("pfa_stage_seconds", seconds, stage=stage)
+
+
+def timed_render(chunks, stage="render"):
+    """Pass chunks through to a UI, recording only the time spent rendering them.
+
+    Time spent waiting for the next chunk (retrieval, the LLM) is the
+    producer's and is subtracted, so the stage is the UI's own cost.
+    """
+    started = time.perf_counter()
+    waiting = 0.0
+    chunks = iter(chunks)
+    done = object()
+    while True:
+        asked = time.perf_counter()
+        chunk = next(chunks, done)
+        waiting += time.perf_counter() - asked
+        if chunk is done:
+            break
+        yield chunk
+    observe_stage(stage, time.perf_counter() - started - waiting)
+
+
+def record_tokens(prompt_tokens, completion_tokens):
+    REGISTRY.observe("pfa_tokens", prompt_tokens, kind="prompt")
+    REGISTRY.observe("pfa_tokens", completion_tokens, kind="completion")
+    REGISTRY.inc("pfa_tokens_total", prompt_tokens, kind="prompt")
+    REGISTRY.inc("pfa_tokens_total", completion_tokens, kind="completion")
+
+
+def record_turn(intent):
+    REGISTRY.inc("pfa_turns_total", intent=intent or "llm")
+
+
+def stats_collector(prefix, stats):
+    """Collector exposing the numeric fields of a component's stats() dict as gauges"""
+    def collect():
+        return [
+            (f"{prefix}_{key}", {}, value)
+            for key, value in stats().items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool)
+        ]
+    return collect
+
+
+_server_lock = threading.Lock()
+_server = None
+
+
+def start_metrics_server(port=config.METRICS_PORT, host=config.METRICS_HOST):
+    """Serve /metrics in Prometheus text format from a daemon thread (once per process).
+
+    Off unless METRICS_PORT is set; listens on localhost unless METRICS_HOST says otherwise.
+    """
+    global _server
+    with _server_lock:
+        if _server is not None or not port:
+            return _server
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = REGISTRY.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        try:
+            _server = ThreadingHTTPServer((host, port), Handler)
+        except OSError:
+            # Another worker on this host already serves the port
+            return None
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+        print(f"✅ Metrics available on http://{host}:{port}/metrics")
+        return _server
@@ -1,4 +1,5 @@
 # modules/phq_gad.py
+import bisect
 
 PHQ9_QUESTIONS = [
     "Over the last 2 weeks, how often have you had little interest or pleasure in doing things?",
@@ -28,3 +29,22 @@ OPTIONS = [
     ("😔 More than half the days", 2),
     ("😢 Nearly every day", 3)
 ]
+
+# Total-score cut-offs of the app's low / moderate / high risk levels
+RISK_LEVELS = ("low", "moderate", "high")
+RISK_CUTOFFS = {"PHQ9": (5, 15), "GAD7": (5, 10)}
+
+# Standard severity bands of the total score (PHQ-9: Kroenke et al. 2001; GAD-7: Spitzer et al. 2006)
+SEVERITY_BANDS = {
+    "PHQ9": ("minimal", "mild", "moderate", "moderately severe", "severe"),
+    "GAD7": ("minimal", "mild", "moderate", "severe"),
+}
+SEVERITY_CUTOFFS = {"PHQ9": (5, 10, 15, 20), "GAD7": (5, 10, 15)}
+
+# PHQ-9 item 9 asks about thoughts of self-harm; any answer above "Not at all" needs follow-up
+SELF_HARM_ITEM = 8
+
+
+def risk_level(test_name, total):
+    """The app's risk level for a questionnaire total"""
+    return RISK_LEVELS[bisect.bisect_right(RISK_CUTOFFS[test_name], total)]
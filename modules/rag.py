@@ -1,86 +1,805 @@
 # modules/rag.py
 import os
-import faiss
-import pickle
-from sentence_transformers import SentenceTransformer
+import re
+import threading
+import time
 import numpy as np
+from modules.index_manifest import (
+    hash_corpus, corpus_fingerprint, load_manifest, save_manifest, diff_corpus, invalidate_dependents
+)
+from modules.index_versions import VersionDir, link_or_copy
+from modules.rag_loader import PAGE_SEPARATOR
+from modules.chunk_store import ChunkStore
+from modules.context import mmr_select, dedup_ranked
+from modules.bm25 import BM25Index, rrf_fuse
+from modules.dedup import NearDuplicateIndex
+from modules.embeddings import Embedder
+from modules.retrieval_cache import RetrievalCache, index_version
+from modules.metrics import span
+import config
+
+# faiss (and torch, via modules.embeddings) are imported where first used, so
+# importing this module, and with it the app, doesn't load them
+
+
+def resident_memory_bytes():
+    """Current resident set size of this process in bytes (0 if unknown)"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # ru_maxrss is KiB on Linux and bytes on macOS; it is a peak, not current
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if peak > 1 << 32 else peak * 1024
+    except (ImportError, ValueError):
+        return 0
+
+
+def iter_text_pages(file_path, block_size=1 << 16):
+    """Stream (page_no, text) pieces from an extracted .txt file.
+
+    Pages are separated by form feeds; files without them are one page. The
+    file is read in blocks, so a page may arrive as several pieces.
+    """
+    page_no = 1
+    with open(file_path, "r", encoding="utf-8") as f:
+        for block in iter(lambda: f.read(block_size), ""):
+            pieces = block.split(PAGE_SEPARATOR)
+            for i, piece in enumerate(pieces):
+                if i:
+                    page_no += 1
+                if piece:
+                    yield page_no, piece
+
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+
+
+def _page_at(marks, offset):
+    page = marks[0][1]
+    for start, page_no in marks:
+        if start > offset:
+            break
+        page = page_no
+    return page
+
+
+def _split_long(sentence, max_len):
+    """Split a sentence longer than max_len at word boundaries"""
+    while len(sentence) > max_len:
+        cut = sentence.rfind(" ", 0, max_len + 1)
+        if cut <= 0:
+            cut = max_len
+        yield sentence[:cut]
+        sentence = sentence[cut:].lstrip()
+    if sentence:
+        yield sentence
+
+
+def iter_sentences(pages, max_len):
+    """Yield (sentence, page_no) from a stream of (page_no, text) pieces.
+
+    Whitespace inside a sentence is collapsed (extracted PDF text is full of
+    hard line breaks). Sentences longer than max_len are split at word
+    boundaries, and text with no sentence end in sight is flushed once it
+    reaches a few max_len, so the buffer stays bounded.
+    """
+    buf = ""
+    marks = []  # (offset into buf, page_no) where each piece starts
+    for page_no, text in pages:
+        if not text:
+            continue
+        marks.append((len(buf), page_no))
+        buf += text
+        last = 0
+        for m in _SENTENCE_END.finditer(buf):
+            sentence = " ".join(buf[last:m.start()].split())
+            if sentence:
+                page = _page_at(marks, last)
+                for piece in _split_long(sentence, max_len):
+                    yield piece, page
+            last = m.end()
+        if len(buf) - last > 4 * max_len:
+            cut = buf.rfind(" ", last)
+            if cut > last:
+                page = _page_at(marks, last)
+                for piece in _split_long(" ".join(buf[last:cut].split()), max_len):
+                    yield piece, page
+                last = cut
+        if last:
+            start_page = _page_at(marks, last)
+            buf = buf[last:]
+            marks = [(0, start_page)] + [(offset - last, p) for offset, p in marks if offset > last]
+    sentence = " ".join(buf.split())
+    if sentence:
+        for piece in _split_long(sentence, max_len):
+            yield piece, marks[0][1]
+
+
+def chunk_pages(pages, chunk_size, overlap=0):
+    """Group a stream of (page_no, text) into (chunk, page_no) of at most chunk_size chars.
+
+    Chunks end on sentence boundaries. Each chunk repeats up to `overlap`
+    chars of trailing sentences from the previous one, so an idea split across
+    a boundary is still retrievable whole. page_no is the page the chunk
+    starts on. Only one chunk's worth of sentences is buffered at a time.
+    """
+    current = []  # (sentence, page_no) of the chunk being built
+    length = 0
+    for sentence, page_no in iter_sentences(pages, chunk_size):
+        if current and length + 1 + len(sentence) > chunk_size:
+            yield " ".join(s for s, _ in current), current[0][1]
+            carry, carried = [], 0
+            for s, p in reversed(current):
+                if carried + len(s) > overlap:
+                    break
+                carry.insert(0, (s, p))
+                carried += len(s) + 1
+            if carried + len(sentence) > chunk_size:
+                carry = []
+            current = carry
+            length = sum(len(s) for s, _ in carry) + max(len(carry) - 1, 0)
+        length += len(sentence) + (1 if current else 0)
+        current.append((sentence, page_no))
+    if current:
+        yield " ".join(s for s, _ in current), current[0][1]
+
+
+def read_index(path, use_mmap=True):
+    """Load a FAISS index, memory-mapped where the index type supports it.
+
+    mmap'd indexes share their pages between worker processes instead of each
+    holding a private copy.
+    """
+    import faiss
+    if use_mmap:
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+        try:
+            return faiss.read_index(path, flags)
+        except RuntimeError:
+            pass  # this index type can't be mapped; fall back to a private copy
+    return faiss.read_index(path)
+
+
+def write_index(index, path):
+    """Write via a temp file + rename, so processes that mmap'd the old file are unaffected"""
+    import faiss
+    tmp_path = path + ".tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def save_vectors(vectors, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, vectors)
+    os.replace(tmp_path, path)
+
+
+# File names inside a version directory (see modules/index_versions.py)
+INDEX_FILE = "embeddings.faiss"
+STORE_PREFIX = "chunks"
+BM25_PREFIX = "chunks.bm25"
+VECTORS_FILE = "embeddings.npy"
+MANIFEST_FILE = "manifest.json"
+
+
+class IndexSnapshot:
+    """One loaded index version: FAISS index, chunk store, BM25 and vectors.
+
+    Retrieval pins the snapshot it starts on (acquire/release), so a hot
+    reload never changes the data under a call in flight. A retired
+    snapshot is closed when its last caller releases it, and on_closed is
+    called with its version so the directory can be reclaimed.
+    """
+
+    def __init__(self, version, path, manifest, index=None, mmap_index=True, on_closed=None):
+        self.version = version
+        self.manifest = manifest
+        self.index_params = manifest.get("index") or {"backend": "flat", "requested": "flat"}
+        self.dedup_report = manifest.get("dedup")
+        # Fingerprint of the build; the query cache only answers for this one
+        self.cache_version = index_version(manifest)
+        if index is None:
+            from modules.index_backends import apply_search_params
+            index = read_index(os.path.join(path, INDEX_FILE), mmap_index)
+            apply_search_params(index, self.index_params)
+        self.index = index
+        self.store = ChunkStore(os.path.join(path, STORE_PREFIX))
+        self.bm25 = BM25Index(os.path.join(path, BM25_PREFIX))
+        self.vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+        self._on_closed = on_closed
+        self._refs = 0
+        self._retired = False
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            self._refs += 1
+        return self
+
+    def release(self):
+        with self._lock:
+            self._refs -= 1
+            close = self._retired and self._refs == 0
+        if close:
+            self._close()
+
+    def retire(self):
+        """Stop serving: close now if idle, else when the last caller releases"""
+        with self._lock:
+            self._retired = True
+            close = self._refs == 0
+        if close:
+            self._close()
+
+    def _close(self):
+        self.store.close()
+        self.index = self.bm25 = self.vectors = None
+        if self._on_closed is not None:
+            self._on_closed(self.version)
+
+
+def _served(name):
+    """Read-only view of an attribute of the snapshot currently served"""
+    return property(lambda self: getattr(self._current, name, None))
+
 
 class RAGRetriever:
     def __init__(
         self,
         docs_path="data/documents_txt/",
-        index_path="data/embeddings.faiss",
-        embed_path="data/docs.pkl",
-        chunk_size=1000  # max chars per chunk
+        index_dir=config.INDEX_DIR,  # versioned builds, see modules/index_versions.py
+        chunk_size=1000,  # max chars per chunk
+        chunk_overlap=config.CHUNK_OVERLAP,  # chars of trailing sentences repeated in the next chunk
+        model_name="all-MiniLM-L6-v2",
+        index_backend=config.INDEX_BACKEND,
+        mmap_index=config.INDEX_MMAP,
+        embedder=None,
+        cache=None,
+        hybrid=config.RAG_HYBRID,
+        lexical_fast_words=config.RAG_LEXICAL_FAST_WORDS,
+        dedup_threshold=config.DEDUP_THRESHOLD,
+        keep_versions=config.INDEX_KEEP_VERSIONS
     ):
-        self.docs = []
-        self.texts = []
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
-        self.index_path = index_path
-        self.embed_path = embed_path
-        self.index = None
+        # With DEDUP_THRESHOLD set, near-identical chunks are embedded once (modules/dedup.py)
+        self.dedup_threshold = dedup_threshold
+        # BM25 over the same chunks, fused with the dense hits (hybrid) and/or
+        # answering short keyword queries alone (lexical_fast_words > 0)
+        self.hybrid = hybrid
+        self.lexical_fast_words = lexical_fast_words
+        self.model_name = model_name
+        # Seconds spent per start-up phase, reported by modules/warmup.py
+        self.load_timings = {}
+        start = time.perf_counter()
+        # Backend, threads, batch size and build processes come from config
+        self.embedder = embedder if embedder is not None else Embedder(model_name)
+        self.load_timings["model"] = round(time.perf_counter() - start, 3)
+        self.docs_path = docs_path
+        self.versions = VersionDir(index_dir)
+        self.keep_versions = keep_versions
+        self.mmap_index = mmap_index
+        self.index_backend = index_backend
         self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        # One model/index is shared by every session in the process, so all
+        # access to them goes through this lock
+        self._lock = threading.Lock()
+        # The served snapshot is swapped under _swap_lock; versions still
+        # open (served or pinned by calls in flight) are never reclaimed
+        self._current = None
+        self._swap_lock = threading.Lock()
+        self._open_versions = set()
+        self._fingerprint = None
+        self._watcher = None
+
+        if cache is None and config.RAG_CACHE_ENABLED:
+            cache = RetrievalCache()
+        self.cache = cache
+
+        start = time.perf_counter()
+        self.refresh()
+        self.load_timings["index"] = round(time.perf_counter() - start, 3)
+
+    version = _served("version")
+    index = _served("index")
+    index_params = _served("index_params")
+    store = _served("store")
+    bm25 = _served("bm25")
+    vectors = _served("vectors")
+    dedup_report = _served("dedup_report")
+
+    def _build_params(self):
+        """Everything besides file contents that changes the embeddings"""
+        return {
+            "model": self.model_name,
+            "embed_backend": self.embedder.backend,
+            "chunker": "sentences-v1",
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+            "dedup_threshold": self.dedup_threshold,
+        }
+
+    def refresh(self):
+        """Serve the newest build of the corpus, building a new version first if files changed.
+
+        Called at startup and by the watcher. A new version is loaded next to
+        the served one and swapped in atomically; calls in flight finish on
+        the old one. Returns True if the served version changed.
+        """
+        self._fingerprint = corpus_fingerprint(self.docs_path)
+        with self.versions.build_lock():
+            snapshot = self._load_or_build()
+        return self._swap(snapshot)
+
+    def start_watcher(self, interval=config.INDEX_WATCH_INTERVAL):
+        """Poll the corpus and the version directory every interval seconds (0 = off).
+
+        Corpus edits are built into a new version, and versions published by
+        other worker processes are picked up, on a daemon thread while the
+        current version keeps serving, so there is no restart.
+        """
+        if interval <= 0 or self._watcher is not None:
+            return
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), name="index-watcher", daemon=True)
+        self._watcher.start()
 
-        # Load cached FAISS index + docs if available
-        if os.path.exists(index_path) and os.path.exists(embed_path):
-            self.index = faiss.read_index(index_path)
-            with open(embed_path, "rb") as f:
-                self.docs = pickle.load(f)
-                self.texts = [doc["content"] for doc in self.docs]
-            print("✅ Loaded cached FAISS index and embeddings")
-        else:
-            self._load_docs(docs_path)
-            # Save index and docs for future runs
-            os.makedirs(os.path.dirname(embed_path), exist_ok=True)
-            faiss.write_index(self.index, index_path)
-            with open(embed_path, "wb") as f:
-                pickle.dump(self.docs, f)
-            print("✅ Created new FAISS index and saved embeddings")
-
-    def _chunk_text(self, text):
-        """Split text into chunks of max chunk_size characters"""
-        chunks = []
-        start = 0
-        while start < len(text):
-            chunks.append(text[start:start + self.chunk_size])
-            start += self.chunk_size
-        return chunks
-
-    def _load_docs(self, path):
-        if not os.path.exists(path):
-            raise ValueError(f"Document path does not exist: {path}")
-
-        for fname in os.listdir(path):
-            if fname.endswith(".txt"):
-                file_path = os.path.join(path, fname)
-                with open(file_path, "r", encoding="utf-8") as f:
-                    content = f.read()
-                if content.strip():
-                    # Split into chunks
-                    for chunk in self._chunk_text(content):
-                        self.docs.append({"name": fname, "content": chunk})
-                        self.texts.append(chunk)
-
-        if not self.texts:
+    def _watch(self, interval):
+        while True:
+            time.sleep(interval)
+            if (corpus_fingerprint(self.docs_path) == self._fingerprint
+                    and self.versions.current() in (None, self.version)):
+                continue
+            try:
+                if self.refresh():
+                    print(f"✅ Now serving index {self.version}")
+            except Exception as exc:
+                # Keep serving what we have; the next corpus change retries
+                print(f"Index refresh failed, still serving {self.version}: {exc}")
+
+    def _acquire(self):
+        with self._swap_lock:
+            return self._current.acquire()
+
+    def _swap(self, snapshot):
+        with self._swap_lock:
+            old, self._current = self._current, snapshot
+        if old is snapshot:
+            return False
+        if self.cache is not None:
+            self.cache.set_version(snapshot.cache_version)
+        if old is not None:
+            old.retire()
+        return True
+
+    def _open(self, version, manifest, index=None):
+        if self._current is not None and self._current.version == version:
+            return self._current
+        snapshot = IndexSnapshot(version, self.versions.path(version), manifest, index, self.mmap_index,
+                                 on_closed=self._closed)
+        with self._swap_lock:
+            self._open_versions.add(version)
+        if index is None:
+            print(f"✅ Loaded FAISS index {version} ({snapshot.index_params['backend']}) and embeddings")
+        return snapshot
+
+    def _closed(self, version):
+        """Reclaim version directories nothing in this process uses any more, off the request path"""
+        with self._swap_lock:
+            self._open_versions.discard(version)
+            in_use = set(self._open_versions)
+        threading.Thread(target=self.versions.reclaim, args=(in_use, self.keep_versions),
+                         name="index-reclaim", daemon=True).start()
+
+    def _load_or_build(self):
+        """Open the current version where its manifest proves it is still valid, else build one.
+
+        Only files that were added or changed since the current version are
+        re-embedded; vectors of unchanged files are taken from its saved
+        embedding matrix. Changing the model or chunker parameters makes every
+        file count as added, i.e. a full rebuild.
+        """
+        params = self._build_params()
+        hashes = hash_corpus(self.docs_path)
+        current = self.versions.current()
+        manifest = load_manifest(self.versions.path(current, MANIFEST_FILE)) if current else None
+
+        if not hashes:
+            if manifest is not None:
+                # No corpus on this machine: serve the last build as-is
+                return self._open(current, manifest)
+            raise ValueError(f"No valid text files found in {self.docs_path} to create embeddings!")
+
+        added, changed, removed, unchanged = diff_corpus(manifest, hashes, params)
+        if not (added or changed or removed):
+            if manifest.get("index", {}).get("requested") != self.index_backend:
+                return self._reindex(current, manifest)
+            return self._open(current, manifest)
+        if manifest is not None and unchanged:
+            # Files whose duplicates were collapsed into a file that changed are redone too
+            unchanged, moved = invalidate_dependents(manifest, added + changed + removed, unchanged)
+            changed = sorted(changed + moved)
+
+        old_store, old_vectors = None, None
+        if unchanged:
+            old_store = ChunkStore(self.versions.path(current, STORE_PREFIX))
+            old_vectors = np.load(self.versions.path(current, VECTORS_FILE), mmap_mode="r")
+
+        # Files are deduplicated in name order; the first copy of a passage is kept
+        dedup = NearDuplicateIndex(self.dedup_threshold) if self.dedup_threshold else None
+        docs, parts, files, sources = [], [], {}, {}
+        for fname in sorted(hashes):
+            if fname in unchanged:
+                start, end = manifest["files"][fname]["rows"]
+                file_docs = old_store.slice(start, end)
+                file_vectors = old_vectors[start:end]
+                file_dedup = manifest["files"][fname].get("dedup")
+                # Provenance from other unchanged files is still valid (the cascade above guarantees it)
+                for old_id in range(start, end):
+                    kept = [s for s in old_store.sources.get(old_id, []) if s[0] in unchanged]
+                    if kept:
+                        sources[len(docs) + old_id - start] = kept
+                if dedup is not None:
+                    for j, doc in enumerate(file_docs):
+                        dedup.add(len(docs) + j, doc["content"], fname)
+            else:
+                file_docs, file_vectors = self._embed_file(self.docs_path, fname, dedup, base=len(docs))
+                stats = dedup.by_file.get(fname) if dedup is not None else None
+                file_dedup = dict(stats, dup_of=sorted(stats["dup_of"])) if stats else None
+            files[fname] = {"sha256": hashes[fname], "rows": [len(docs), len(docs) + len(file_docs)]}
+            if file_dedup:
+                files[fname]["dedup"] = file_dedup
+            docs.extend(file_docs)
+            if len(file_docs):
+                parts.append(file_vectors)
+        if dedup is not None:
+            for kept_id, extra in dedup.sources.items():
+                sources.setdefault(kept_id, []).extend(extra)
+
+        if not docs:
             raise ValueError("No valid text files found to create embeddings!")
 
-        # Create embeddings
-        embeddings = self.model.encode(self.texts, convert_to_numpy=True)
+        vectors = np.ascontiguousarray(np.vstack(parts), dtype="float32")
+        # Bulk-encoding worker processes are only needed while building
+        self.embedder.close()
+        if old_store is not None:
+            old_store.close()
+        index, index_params = self._build_index(vectors)
+        dedup_report = self._dedup_report(files, len(docs), vectors.shape[1])
+
+        # Everything goes to a staging directory that becomes the new version
+        # in one rename, so no reader ever sees a partial build
+        staging = self.versions.stage()
+        try:
+            write_index(index, os.path.join(staging, INDEX_FILE))
+            ChunkStore.write(os.path.join(staging, STORE_PREFIX), docs, sources)
+            BM25Index.write(os.path.join(staging, BM25_PREFIX), docs)
+            save_vectors(vectors, os.path.join(staging, VECTORS_FILE))
+            save_manifest(os.path.join(staging, MANIFEST_FILE), {
+                "params": params, "files": files, "index": index_params, "dedup": dedup_report
+            })
+        except BaseException:
+            self.versions.discard(staging)
+            raise
+        version = self.versions.publish(staging)
+        print(
+            f"✅ Built FAISS index {version} ({index_params['backend']}): {len(added)} added, {len(changed)} changed, "
+            f"{len(removed)} removed, {len(unchanged)} reused ({len(docs)} chunks)"
+        )
+        if dedup_report["dropped_chunks"]:
+            r = dedup_report
+            print(
+                f"✅ Collapsed {r['dropped_chunks']} near-duplicate chunks ({r['shrink_ratio']:.1%} of the corpus): "
+                f"{r['vector_bytes_saved'] / 1e6:.1f} MB of vectors and ~{r['tokens_saved']} tokens not embedded"
+            )
+        # Serve the built index as-is; store and vectors are mapped from the new version
+        return self._open(version, load_manifest(self.versions.path(version, MANIFEST_FILE)), index)
+
+    def _reindex(self, current, manifest):
+        """New version with only the FAISS index rebuilt for another backend, no re-embedding"""
+        index, index_params = self._build_index(np.load(self.versions.path(current, VECTORS_FILE)))
+        staging = self.versions.stage()
+        try:
+            # Versions are immutable, so the unchanged files can be shared
+            for name in os.listdir(self.versions.path(current)):
+                if name not in (INDEX_FILE, MANIFEST_FILE):
+                    link_or_copy(self.versions.path(current, name), os.path.join(staging, name))
+            write_index(index, os.path.join(staging, INDEX_FILE))
+            save_manifest(os.path.join(staging, MANIFEST_FILE), dict(manifest, index=index_params))
+        except BaseException:
+            self.versions.discard(staging)
+            raise
+        version = self.versions.publish(staging)
+        print(f"✅ Rebuilt FAISS index as {version} ({index_params['backend']}) from saved embeddings")
+        return self._open(version, load_manifest(self.versions.path(version, MANIFEST_FILE)), index)
+
+    @staticmethod
+    def _dedup_report(files, kept, dim):
+        dropped = sum(f.get("dedup", {}).get("dropped", 0) for f in files.values())
+        tokens = sum(f.get("dedup", {}).get("dropped_tokens", 0) for f in files.values())
+        return {
+            "kept_chunks": kept,
+            "dropped_chunks": dropped,
+            "shrink_ratio": round(dropped / (kept + dropped), 4) if kept + dropped else 0.0,
+            "vector_bytes_saved": dropped * dim * 4,
+            "tokens_saved": tokens,
+        }
+
+    def _build_index(self, vectors):
+        """Build the configured index backend over vectors; parameters are chosen from corpus size"""
+        from modules.index_backends import build_index
+        index, params = build_index(vectors, self.index_backend)
+        # Remember what was asked for: small corpora fall back to flat
+        return index, dict(params, requested=self.index_backend)
+
+    def _embed_file(self, path, fname, dedup=None, base=0):
+        """Chunk and embed one corpus file, returning (docs, vectors)"""
+        return self._embed_pages(fname, iter_text_pages(os.path.join(path, fname)), dedup, base)
+
+    def _embed_pages(self, fname, pages, dedup=None, base=0):
+        """Chunk and embed a stream of (page_no, text), returning (docs, vectors).
+
+        Chunks are encoded in bulk batches as they come off the chunker (spread
+        over worker processes when EMBED_PROCESSES > 1), so only the docs and
+        vectors are kept, never the whole text. With a NearDuplicateIndex,
+        chunks that repeat an earlier one are dropped before embedding; base is
+        the chunk id the first kept chunk of this file will get.
+        """
+        docs, parts, batch = [], [], []
+        for chunk, page_no in chunk_pages(pages, self.chunk_size, self.chunk_overlap):
+            if not chunk.strip():
+                continue
+            doc = {"name": fname, "content": chunk, "page": page_no}
+            if dedup is not None and dedup.check(base + len(docs) + len(batch), doc) is not None:
+                continue
+            batch.append(doc)
+            if len(batch) >= self.embedder.bulk_batch_size:
+                parts.append(self._encode_docs(batch))
+                docs.extend(batch)
+                batch = []
+        if batch:
+            parts.append(self._encode_docs(batch))
+            docs.extend(batch)
+        if not docs:
+            return [], None
+        return docs, np.vstack(parts)
+
+    def _encode_docs(self, docs):
+        texts = [doc["content"] for doc in docs]
+        if self._current is None or self.embedder.processes > 1:
+            return self.embedder.encode_bulk(texts)
+        # Rebuilding while serving: share the in-process model with queries
+        # one batch at a time, so a query waits for at most one batch
+        step = self.embedder.batch_size
+        parts = []
+        for i in range(0, len(texts), step):
+            with self._lock:
+                parts.append(self.embedder.encode(texts[i:i + step]))
+        return np.vstack(parts)
+
+    def warm_up(self, query="How can I sleep better before exams?"):
+        """Run one throwaway encode and search, returning the seconds each took.
+
+        The first forward pass and the first search over a freshly mapped
+        index pay one-time allocation and page-fault costs; doing them here
+        keeps them off the first real query. Bypasses the cache and metrics.
+        """
+        snap = self._acquire()
+        try:
+            start = time.perf_counter()
+            q_emb = self.embed([query])
+            encoded = time.perf_counter()
+            with self._lock:
+                snap.index.search(q_emb, 4)
+            snap.bm25.search(query, 4)
+            searched = time.perf_counter()
+        finally:
+            snap.release()
+        timings = {"warmup_encode": round(encoded - start, 3), "warmup_search": round(searched - encoded, 3)}
+        self.load_timings.update(timings)
+        return timings
+
+    def embed(self, texts):
+        """Embed texts with the shared model (serialized like every other model call)"""
+        with self._lock:
+            return self.embedder.encode(texts)
+
+    def retrieve(
+        self,
+        query,
+        top_k=2,
+        max_distance=config.RAG_MAX_DISTANCE,
+        mmr_lambda=config.RAG_MMR_LAMBDA,
+        dup_threshold=config.RAG_DUP_THRESHOLD
+    ):
+        """Retrieve up to top_k relevant chunks for a query.
+
+        Hits further than max_distance (squared L2 on normalized embeddings,
+        i.e. 2 - 2*cosine) are dropped, so small talk gets no context at all.
+        The survivors are re-ranked with MMR and near-duplicates (cosine >=
+        dup_threshold) removed. Each result carries its "distance".
+        """
+        return self.retrieve_batch([query], top_k, max_distance, mmr_lambda, dup_threshold)[0]
+
+    def retrieve_batch(
+        self,
+        queries,
+        top_k=2,
+        max_distance=config.RAG_MAX_DISTANCE,
+        mmr_lambda=config.RAG_MMR_LAMBDA,
+        dup_threshold=config.RAG_DUP_THRESHOLD
+    ):
+        """retrieve() for many queries: one encode pass and one matrix search.
 
-        # Ensure 2D
-        if len(embeddings.shape) == 1:
-            embeddings = embeddings.reshape(1, -1)
+        Queries found in the cache skip both; only the misses are embedded
+        and searched. Short keyword queries whose every term is in the BM25
+        vocabulary skip them too when lexical_fast_words is set. The whole
+        call runs against one index version, even if a reload swaps it.
+        """
+        snap = self._acquire()
+        try:
+            return self._retrieve_batch(snap, queries, top_k, max_distance, mmr_lambda, dup_threshold)
+        finally:
+            snap.release()
 
-        dim = embeddings.shape[1]
-        self.index = faiss.IndexFlatL2(dim)
-        self.index.add(embeddings)
+    def _retrieve_batch(self, snap, queries, top_k, max_distance, mmr_lambda, dup_threshold):
+        if not snap.index or not snap.store:
+            return [[] for _ in queries]
 
-    def retrieve(self, query, top_k=2):
-        """Retrieve top_k relevant chunks for a query"""
-        if not self.index or not self.docs:
-            return []
+        fetch_k = top_k * 4 if mmr_lambda is not None else top_k
+        lexical = [self._lexical_only(snap, q) for q in queries]
+        found = [
+            self.cache.get(q, fetch_k, snap.cache_version) if self.cache is not None and not lex else None
+            for q, lex in zip(queries, lexical)
+        ]
+        misses = [row for row, hit in enumerate(found) if hit is None and not lexical[row]]
+        if misses:
+            with self._lock:
+                with span("query_embedding"):
+                    q_embs = self.embedder.encode([queries[row] for row in misses])
+                with span("faiss_search"):
+                    D, I = snap.index.search(q_embs, fetch_k)
+            for i, row in enumerate(misses):
+                found[row] = (q_embs[i], I[i], D[i])
+                if self.cache is not None:
+                    self.cache.put(queries[row], fetch_k, q_embs[i], I[i], D[i], snap.cache_version)
 
-        q_emb = self.model.encode([query], convert_to_numpy=True)
-        D, I = self.index.search(q_emb, top_k)
-        results = [self.docs[i] for i in I[0] if i < len(self.docs)]
+        results = []
+        for query, lex, hit in zip(queries, lexical, found):
+            if lex:
+                with span("bm25_search"):
+                    ids = [i for i, _ in snap.bm25.search(query, fetch_k)]
+                results.append(self._decode(snap, self._dedup(snap, ids, top_k, dup_threshold)))
+            elif self.hybrid:
+                results.append(self._fused_hits(snap, query, *hit, top_k, fetch_k, max_distance, mmr_lambda,
+                                                dup_threshold))
+            else:
+                results.append(self._select_hits(snap, hit[0], hit[2], hit[1], top_k, max_distance, mmr_lambda,
+                                                 dup_threshold))
         return results
+
+    def _lexical_only(self, snap, query):
+        return (
+            self.lexical_fast_words > 0
+            and len(query.split()) <= self.lexical_fast_words and snap.bm25.covers(query)
+        )
+
+    def _fused_hits(self, snap, query, q_emb, ids, distances, top_k, fetch_k, max_distance, mmr_lambda,
+                    dup_threshold):
+        """Reciprocal-rank fusion of the dense and BM25 hits, both after the distance cutoff.
+
+        Fusion decides relevance, so candidates are only de-duplicated, not
+        MMR re-ranked by cosine. Without any lexical match within
+        max_distance this is exactly the dense path.
+        """
+        with span("bm25_search"):
+            lexical = [i for i, _ in snap.bm25.search(query, fetch_k)]
+        if lexical:
+            # BM25 hits have no FAISS distance; take it from the saved vectors so
+            # a keyword overlap ("thanks, bye") can't bring in an unrelated chunk
+            vecs = np.asarray(snap.vectors[lexical], dtype="float32")
+            lexical_distances = ((vecs - np.asarray(q_emb, dtype="float32")) ** 2).sum(axis=1).tolist()
+            found = {i: d for i, d in zip(lexical, lexical_distances) if max_distance is None or d <= max_distance}
+            lexical = [i for i in lexical if i in found]
+        if not lexical:
+            return self._select_hits(snap, q_emb, distances, ids, top_k, max_distance, mmr_lambda, dup_threshold)
+        dense = []
+        for i, d in zip(ids.tolist(), distances.tolist()):
+            if i >= 0 and (max_distance is None or d <= max_distance):
+                dense.append(i)
+                found[i] = d
+        picked = self._dedup(snap, rrf_fuse([dense, lexical], config.RAG_RRF_K), top_k, dup_threshold)
+        return self._decode(snap, picked, [found[i] for i in picked])
+
+    def _dedup(self, snap, ids, top_k, dup_threshold):
+        if len(ids) <= 1:
+            return ids[:top_k]
+        return [ids[p] for p in dedup_ranked(snap.vectors[ids], top_k, dup_threshold)]
+
+    def _decode(self, snap, ids, distances=None):
+        """Chunk dicts for ids, each with its "distance" (None for lexical-only results).
+
+        Only the hits are decoded from the store, as fresh dicts per caller.
+        """
+        results = snap.store.get_many(ids)
+        for doc, distance in zip(results, distances or [None] * len(results)):
+            doc["distance"] = distance
+        return results
+
+    def _select_hits(self, snap, q_emb, distances, ids, top_k, max_distance, mmr_lambda, dup_threshold):
+        hits = [
+            (i, d) for i, d in zip(ids.tolist(), distances.tolist())
+            if i >= 0 and (max_distance is None or d <= max_distance)
+        ]
+        if mmr_lambda is not None and len(hits) > 1:
+            picked = mmr_select(q_emb, snap.vectors[[i for i, _ in hits]], top_k, mmr_lambda, dup_threshold)
+            hits = [hits[p] for p in picked]
+        hits = hits[:top_k]
+        return self._decode(snap, [i for i, _ in hits], [d for _, d in hits])
+
+    def memory_stats(self):
+        """Report process RSS and the size of what this retriever holds"""
+        snap = self._acquire()
+        try:
+            return {
+                "rss_bytes": resident_memory_bytes(),
+                "index_version": snap.version,
+                "index_vectors": snap.index.ntotal,
+                "index_backend": snap.index_params["backend"],
+                "chunks": len(snap.store),
+                "store_bytes": snap.store.nbytes(),
+                "bm25_bytes": snap.bm25.nbytes(),
+                "dedup": snap.dedup_report,
+                "cache": self.cache.stats() if self.cache is not None else None,
+            }
+        finally:
+            snap.release()
+
+
+# ---------------------------
+# Process-wide shared retriever
+# ---------------------------
+_shared_lock = threading.Lock()
+_shared_retrievers = {}
+
+
+def get_shared_retriever(**kwargs):
+    """Return the process-wide RAGRetriever for these settings, loading it once.
+
+    Every ChatManager (i.e. every Streamlit session) should use this instead of
+    constructing its own RAGRetriever, so the model, FAISS index and docs are
+    held in memory once per process.
+    """
+    key = tuple(sorted(kwargs.items()))
+    with _shared_lock:
+        retriever = _shared_retrievers.get(key)
+        if retriever is None:
+            retriever = RAGRetriever(**kwargs)
+            # Corpus edits are picked up in the background, no restart needed
+            retriever.start_watcher()
+            _shared_retrievers[key] = retriever
+    return retriever
+
+
+def collect_metrics():
+    """Memory and cache gauges of the shared retrievers for REGISTRY.register_collector.
+
+    Reports nothing until a retriever is loaded, so scraping never triggers the load.
+    """
+    with _shared_lock:
+        retrievers = list(_shared_retrievers.values())
+    gauges = []
+    for retriever in retrievers:
+        stats = retriever.memory_stats()
+        labels = {"version": stats["index_version"], "backend": stats["index_backend"]}
+        gauges += [(f"pfa_rag_{key}", labels, stats[key])
+                   for key in ("index_vectors", "chunks", "store_bytes", "bm25_bytes")]
+        for key, value in (stats["cache"] or {}).items():
+            gauges.append((f"pfa_rag_cache_{key}", labels, value))
+    if retrievers:
+        gauges.append(("pfa_process_rss_bytes", {}, resident_memory_bytes()))
+    return gauges
@@ -1,20 +1,108 @@
 # modules/rag_loader.py
-import fitz
 import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
-def pdfs_to_txt(pdf_folder="data/documents/", txt_folder="data/documents_txt/"):
+# Pages are written to the .txt files separated by form feeds so the chunker
+# can keep page numbers as chunk metadata
+PAGE_SEPARATOR = "\f"
+
+
+def _extract_pages(pdf_path, start, stop):
+    """Worker: extract text of pages [start, stop) of one PDF as (page_no, text)"""
+    import fitz
+    with fitz.open(pdf_path) as doc:
+        return [(page_no + 1, doc[page_no].get_text()) for page_no in range(start, stop)]
+
+
+def _page_count(pdf_path):
+    import fitz
+    with fitz.open(pdf_path) as doc:
+        return doc.page_count
+
+
+def _page_tasks(pdf_path, pages_per_task, page_count=None):
+    count = _page_count(pdf_path) if page_count is None else page_count
+    return [(pdf_path, start, min(start + pages_per_task, count)) for start in range(0, count, pages_per_task)]
+
+
+def _run_ordered(executor, tasks, window):
+    """Yield (task, pages) in task order, keeping at most `window` tasks in flight"""
+    pending = deque()
+    tasks = iter(tasks)
+    for task in tasks:
+        pending.append((task, executor.submit(_extract_pages, *task)))
+        if len(pending) >= window:
+            break
+    while pending:
+        task, future = pending.popleft()
+        next_task = next(tasks, None)
+        if next_task is not None:
+            pending.append((next_task, executor.submit(_extract_pages, *next_task)))
+        yield task, future.result()
+
+
+def is_up_to_date(pdf_path, txt_path):
+    """True if txt_path was extracted after pdf_path last changed"""
+    return os.path.exists(txt_path) and os.path.getmtime(txt_path) >= os.path.getmtime(pdf_path)
+
+
+def pdfs_to_txt(pdf_folder="data/documents/", txt_folder="data/documents_txt/",
+                workers=None, pages_per_task=8, force=False):
+    """Extract every PDF in pdf_folder to a .txt file in txt_folder.
+
+    Pages of all stale PDFs are extracted in parallel across `workers`
+    processes and written out in order as they arrive, one form feed between
+    pages. PDFs whose .txt is newer than the PDF are skipped unless `force`.
+    Each .txt is written to a temp file and renamed, so readers never see a
+    partial file.
+    """
     os.makedirs(txt_folder, exist_ok=True)
-    for fname in os.listdir(pdf_folder):
+    stale = []
+    for fname in sorted(os.listdir(pdf_folder)):
         if fname.endswith(".pdf"):
             pdf_path = os.path.join(pdf_folder, fname)
-            doc = fitz.open(pdf_path)
-            text = ""
-            for page in doc:
-                text += page.get_text()
-            txt_name = fname.replace(".pdf", ".txt")
-            with open(os.path.join(txt_folder, txt_name), "w", encoding="utf-8") as f:
-                f.write(text)
-    print(f"✅ Converted all PDFs from {pdf_folder} to TXT in {txt_folder}")
+            txt_path = os.path.join(txt_folder, fname[:-len(".pdf")] + ".txt")
+            if force or not is_up_to_date(pdf_path, txt_path):
+                stale.append((pdf_path, txt_path))
+
+    if not stale:
+        print(f"✅ All PDFs in {pdf_folder} are already extracted")
+        return []
+
+    page_counts = {}
+
+    def tasks():
+        # Generated lazily so page counts are read as extraction proceeds
+        for pdf_path, txt_path in stale:
+            page_counts[pdf_path] = _page_count(pdf_path)
+            if page_counts[pdf_path] == 0:
+                open(txt_path, "w", encoding="utf-8").close()
+            yield from _page_tasks(pdf_path, pages_per_task, page_counts[pdf_path])
+
+    outputs = dict(stale)
+    files = {}
+    window = 2 * (workers or os.cpu_count() or 1)
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for (pdf_path, start, stop), pages in _run_ordered(executor, tasks(), window):
+                out = files.get(pdf_path)
+                if out is None:
+                    out = files[pdf_path] = open(outputs[pdf_path] + ".tmp", "w", encoding="utf-8")
+                for page_no, text in pages:
+                    if page_no > 1:
+                        out.write(PAGE_SEPARATOR)
+                    out.write(text.replace(PAGE_SEPARATOR, "\n"))
+                if stop == page_counts[pdf_path]:
+                    out.close()
+                    os.replace(outputs[pdf_path] + ".tmp", outputs[pdf_path])
+                    del files[pdf_path]
+    finally:
+        for out in files.values():
+            out.close()
+
+    print(f"✅ Converted {len(stale)} PDFs from {pdf_folder} to TXT in {txt_folder}")
+    return [txt_path for _, txt_path in stale]
 
 # Optional: call the function directly for testing
 if __name__ == "__main__":
@@ -0,0 +1,248 @@
+# modules/replay.py
+"""Offline replay of recorded or synthetic conversations through ChatManager.
+
+    python -m modules.replay conversations.jsonl -o results.jsonl
+    python -m modules.replay conversations.jsonl -o results.parquet --concurrency 32
+
+Input is JSONL, one conversation per line:
+    {"id": "c1", "turns": ["hi", "I can't sleep before exams", {"test": "PHQ9", "answers": [1, 2, 0, ...]}]}
+Lines without "turns" are replayed as a single turn from their "message",
+"text" or "body" field (with "title" prepended when present), so a file like
+requests.jsonl works as-is; ids come from "id", "conversation_id" or
+"request_id", else the line number.
+
+Retrieval for every user turn is done up front: one batched encode and one
+matrix FAISS search per --retrieval-batch queries. Conversations then replay
+concurrently (turns within one stay in order), with LLM calls bounded by the
+shared client. Output is one row per turn, written as conversations finish;
+rerunning the same command skips the conversations already in the output.
+A conversation whose LLM call failed (the user would have seen the "busy"
+fallback) is not written, so the rerun replays it; the run reports how
+many failed and exits with status 1.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.chat_manager import BUSY_REPLY, ChatManager
+from modules.rag import get_shared_retriever
+
+
+def load_conversations(path):
+    conversations = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            conv_id = record.get("id") or record.get("conversation_id") or record.get("request_id") or str(line_no)
+            turns = record.get("turns")
+            if turns is None:
+                text = record.get("message") or record.get("text") or record.get("body") or ""
+                if record.get("title"):
+                    text = f"{record['title']}\n\n{text}"
+                turns = [text]
+            conversations.append((str(conv_id), turns))
+    return conversations
+
+
+class PrecomputedRetrieval:
+    """ChatManager rag stand-in that serves hits computed in one batched pass"""
+
+    def __init__(self, retriever, queries, top_k=4, batch_size=1024):
+        self.retriever = retriever
+        self.top_k = top_k
+        self.hits = {}
+        unique = list(dict.fromkeys(queries))
+        for start in range(0, len(unique), batch_size):
+            batch = unique[start:start + batch_size]
+            for query, docs in zip(batch, retriever.retrieve_batch(batch, top_k=top_k)):
+                self.hits[query] = docs
+
+    def retrieve(self, query, top_k=2, **options):
+        docs = self.hits.get(query) if top_k == self.top_k and not options else None
+        if docs is None:
+            return self.retriever.retrieve(query, top_k=top_k, **options)
+        return [dict(doc) for doc in docs]
+
+
+class TurnFailed(Exception):
+    """The LLM was unavailable for a turn, so the conversation's rows are not a real replay"""
+
+
+def replay_conversation(conv_id, turns, rag):
+    """Rows for one conversation, run through a fresh in-memory ChatManager.
+
+    Raises TurnFailed at the first turn that got the busy fallback instead of a reply.
+    """
+    chat = ChatManager(rag=rag, store=False, analytics=False)
+    rows = []
+    for turn, step in enumerate(turns):
+        start = time.perf_counter()
+        row = {"conversation_id": conv_id, "turn": turn, "turns_total": len(turns)}
+        if isinstance(step, dict) and "test" in step:
+            question = chat.start_test(step["test"])
+            for answer in step.get("answers", []):
+                if question is None or isinstance(question, tuple):
+                    break
+                question = chat.record_answer(answer)
+            risk = question[0] if isinstance(question, tuple) else None
+            row.update(kind="test", input=step["test"], reply=risk, intent=None, show_test_prompt=False,
+                       test_type=step["test"], context_hits=0, context_tokens=0)
+        else:
+            text = step["say"] if isinstance(step, dict) else step
+            chat.last_context_stats = None
+            chat.add_user_message(text)
+            reply, show_buttons, test_type = chat.generate_reply(text)
+            if reply == f"🧠 {BUSY_REPLY}":
+                raise TurnFailed(f"{conv_id}: LLM unavailable at turn {turn}")
+            stats = chat.last_context_stats or {"hits": 0, "context_tokens": 0}
+            row.update(kind="say", input=text, reply=reply, intent=chat.router.classify(text),
+                       show_test_prompt=bool(show_buttons), test_type=test_type,
+                       context_hits=stats["hits"], context_tokens=stats["context_tokens"])
+        row["latency_s"] = round(time.perf_counter() - start, 4)
+        rows.append(row)
+    return rows
+
+
+class JsonlSink:
+    """Appends rows as JSON lines; a conversation counts as done once all its rows are in"""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = self._recover()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _recover(self):
+        if not os.path.exists(self.path):
+            return set()
+        rows, counts, totals = [], {}, {}
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line from a crash
+                conv_id = row["conversation_id"]
+                rows.append((conv_id, line if line.endswith("\n") else line + "\n"))
+                counts[conv_id] = counts.get(conv_id, 0) + 1
+                totals[conv_id] = row["turns_total"]
+        done = {c for c, n in counts.items() if n == totals[c]}
+        # Drop rows of half-written conversations, they are replayed again
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(line for conv_id, line in rows if conv_id in done)
+        os.replace(tmp, self.path)
+        return done
+
+    def write(self, rows):
+        self._file.write("".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetSink:
+    """Writes rows to part files in a directory, each committed by an atomic rename"""
+
+    def __init__(self, path, rows_per_part=5000):
+        import pyarrow.parquet as pq  # optional; only needed for Parquet output
+        self._pq = pq
+        self.path = path
+        self.rows_per_part = rows_per_part
+        self._rows = []
+        os.makedirs(path, exist_ok=True)
+        self._parts = sorted(p for p in os.listdir(path) if p.endswith(".parquet"))
+        self.done = set()
+        for part in self._parts:
+            table = pq.read_table(os.path.join(path, part), columns=["conversation_id"])
+            self.done.update(table.column("conversation_id").to_pylist())
+
+    def write(self, rows):
+        self._rows.extend(rows)
+        if len(self._rows) >= self.rows_per_part:
+            self._flush()
+
+    def _flush(self):
+        if not self._rows:
+            return
+        import pyarrow as pa
+        name = f"part-{len(self._parts):05d}.parquet"
+        tmp = os.path.join(self.path, name + ".tmp")
+        self._pq.write_table(pa.Table.from_pylist(self._rows), tmp)
+        os.replace(tmp, os.path.join(self.path, name))
+        self._parts.append(name)
+        self._rows = []
+
+    def close(self):
+        self._flush()
+
+
+def run(conversations, sink, concurrency=16, retrieval_batch=1024):
+    todo = [(c, t) for c, t in conversations if c not in sink.done]
+    if not todo:
+        print("✅ Nothing to replay, every conversation is already in the output")
+        return 0, 0
+
+    start = time.perf_counter()
+    queries = [
+        step["say"] if isinstance(step, dict) else step
+        for _, turns in todo for step in turns
+        if not (isinstance(step, dict) and "test" in step)
+    ]
+    rag = PrecomputedRetrieval(get_shared_retriever(), queries, batch_size=retrieval_batch)
+    print(f"✅ Retrieved context for {len(rag.hits)} unique queries in {time.perf_counter() - start:.1f}s")
+
+    lock = threading.Lock()
+    finished = 0
+    failed = []
+
+    def replay(conv_id, turns):
+        nonlocal finished
+        try:
+            rows = replay_conversation(conv_id, turns, rag)
+        except TurnFailed:
+            # Not written, so not marked done: the next run retries it
+            with lock:
+                failed.append(conv_id)
+            return
+        with lock:
+            sink.write(rows)
+            finished += 1
+            if finished % 100 == 0:
+                print(f"… {finished}/{len(todo)} conversations")
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(replay, c, t) for c, t in todo]:
+            future.result()
+    print(f"✅ Replayed {finished} conversations in {time.perf_counter() - start:.1f}s")
+    if failed:
+        print(f"{len(failed)} conversations hit an LLM failure and were not written; rerun to retry them: "
+              f"{', '.join(sorted(failed)[:10])}{' …' if len(failed) > 10 else ''}")
+    return finished, len(failed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL file of conversations")
+    parser.add_argument("-o", "--output", required=True, help=".jsonl file, or .parquet directory of part files")
+    parser.add_argument("--concurrency", type=int, default=16, help="conversations replayed at once")
+    parser.add_argument("--retrieval-batch", type=int, default=1024, help="queries per batched embed/search")
+    args = parser.parse_args()
+
+    sink = ParquetSink(args.output) if args.output.endswith(".parquet") else JsonlSink(args.output)
+    try:
+        _, failed = run(load_conversations(args.input), sink, args.concurrency, args.retrieval_batch)
+    finally:
+        sink.close()
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
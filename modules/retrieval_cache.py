@@ -0,0 +1,235 @@
+# modules/retrieval_cache.py
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import config
+
+# Per-entry bookkeeping on top of the arrays (key, tuple, OrderedDict node)
+ENTRY_OVERHEAD_BYTES = 256
+
+_PUNCT_EDGES = re.compile(r"^[\W_]+|[\W_]+$")
+
+
+def normalize_query(query):
+    """Cache key text: case, surrounding punctuation and spacing don't change the answer"""
+    return _PUNCT_EDGES.sub("", " ".join(query.lower().split()))
+
+
+class CacheEntry:
+    __slots__ = ("embedding", "ids", "distances", "expires", "nbytes")
+
+    def __init__(self, embedding, ids, distances, expires):
+        self.embedding = embedding
+        self.ids = ids
+        self.distances = distances
+        self.expires = expires
+        self.nbytes = embedding.nbytes + ids.nbytes + distances.nbytes + ENTRY_OVERHEAD_BYTES
+
+
+class RetrievalCache:
+    """Bounded LRU + TTL cache of query embeddings and raw FAISS hits.
+
+    Keys are (normalized query, fetch_k). Entries belong to one index
+    version; set_version() with a new version drops everything, so a rebuilt
+    index never serves stale ids. With disk_path set, a SQLite (WAL) file acts
+    as a second tier that survives restarts and is shared by every worker
+    process on the machine; writes to it are committed in batches, so entries
+    reach other processes a little after they are cached here.
+    """
+
+    def __init__(self, max_bytes=config.RAG_CACHE_MAX_BYTES, ttl=config.RAG_CACHE_TTL,
+                 disk_path=config.RAG_CACHE_DISK_PATH):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.version = None
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counts = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+        self._disk = _DiskTier(disk_path) if disk_path else None
+
+    def set_version(self, version):
+        """Bind the cache to an index version, dropping entries from any other"""
+        with self._lock:
+            if version == self.version:
+                return
+            self.version = version
+            self._entries.clear()
+            self._bytes = 0
+            self._counts["invalidations"] += 1
+        if self._disk is not None:
+            self._disk.purge_other_versions(version)
+
+    def get(self, query, fetch_k, version=None):
+        """(embedding, ids, distances) for a cached query, or None.
+
+        With version given, entries only answer while the cache is bound to
+        that index version, so a call still running on an index that was just
+        swapped out never gets ids from the new one (and vice versa).
+        """
+        key = (normalize_query(query), fetch_k)
+        now = time.time()
+        with self._lock:
+            if version is not None and version != self.version:
+                self._counts["misses"] += 1
+                return None
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.expires > now:
+                    self._entries.move_to_end(key)
+                    self._counts["hits"] += 1
+                    return entry.embedding, entry.ids, entry.distances
+                self._remove(key)
+                self._counts["expirations"] += 1
+            version = self.version
+
+        if self._disk is not None:
+            found = self._disk.get(version, key, now)
+            if found is not None:
+                embedding, ids, distances, expires = found
+                self._insert(key, CacheEntry(embedding, ids, distances, expires), version)
+                with self._lock:
+                    self._counts["disk_hits"] += 1
+                return embedding, ids, distances
+
+        with self._lock:
+            self._counts["misses"] += 1
+        return None
+
+    def put(self, query, fetch_k, embedding, ids, distances, version=None):
+        """Cache a search result; with version given, dropped unless the cache is bound to it"""
+        key = (normalize_query(query), fetch_k)
+        entry = CacheEntry(
+            np.array(embedding, dtype="float32"),
+            np.array(ids, dtype="int64"),
+            np.array(distances, dtype="float32"),
+            time.time() + self.ttl,
+        )
+        if not self._insert(key, entry, version):
+            return
+        if self._disk is not None:
+            self._disk.put(version or self.version, key, entry)
+
+    def _insert(self, key, entry, version=None):
+        with self._lock:
+            if version is not None and version != self.version:
+                return False
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += entry.nbytes
+            while self._bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._counts["evictions"] += 1
+        return True
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.nbytes
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counts, entries=len(self._entries), bytes=self._bytes, max_bytes=self.max_bytes)
+        lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+class _DiskTier:
+    """SQLite-backed cache tier; safe to share between processes.
+
+    Puts are buffered and committed together once batch_size are waiting, or
+    by the first put flush_interval seconds after the last commit, so a burst
+    of misses takes the write lock once instead of once per query. Unflushed puts lost at exit are only
+    future misses.
+    """
+
+    def __init__(self, path, batch_size=32, flush_interval=1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS retrieval_cache ("
+            " version TEXT, query TEXT, fetch_k INTEGER, embedding BLOB, ids BLOB, distances BLOB, expires REAL,"
+            " PRIMARY KEY (version, query, fetch_k))"
+        )
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, version, key, now):
+        try:
+            row = self._conn().execute(
+                "SELECT embedding, ids, distances, expires FROM retrieval_cache"
+                " WHERE version = ? AND query = ? AND fetch_k = ? AND expires > ?",
+                (version, key[0], key[1], now),
+            ).fetchone()
+        except sqlite3.Error:
+            return None  # the disk tier is best-effort; fall back to a miss
+        if row is None:
+            return None
+        embedding, ids, distances, expires = row
+        return (
+            np.frombuffer(embedding, dtype="float32").copy(),
+            np.frombuffer(ids, dtype="int64").copy(),
+            np.frombuffer(distances, dtype="float32").copy(),
+            expires,
+        )
+
+    def put(self, version, key, entry):
+        row = (version, key[0], key[1], entry.embedding.tobytes(), entry.ids.tobytes(),
+               entry.distances.tobytes(), entry.expires)
+        with self._pending_lock:
+            self._pending.append(row)
+            due = (len(self._pending) >= self.batch_size
+                   or time.monotonic() - self._last_flush >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._pending_lock:
+            rows, self._pending = self._pending, []
+            self._last_flush = time.monotonic()
+        if not rows:
+            return
+        conn = self._conn()
+        try:
+            conn.executemany("INSERT OR REPLACE INTO retrieval_cache VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()  # best-effort: dropped rows are just misses later
+
+    def purge_other_versions(self, version):
+        with self._pending_lock:
+            self._pending = [row for row in self._pending if row[0] == version]
+        conn = self._conn()
+        try:
+            conn.execute("DELETE FROM retrieval_cache WHERE version IS NOT ? OR expires <= ?", (version, time.time()))
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+
+
+def index_version(manifest):
+    """Stable fingerprint of a build manifest, used as the cache version"""
+    return hashlib.sha256(json.dumps(manifest, sort_keys=True).encode("utf-8")).hexdigest()[:16]
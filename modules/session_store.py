@@ -0,0 +1,200 @@
+# modules/session_store.py
+import atexit
+import json
+import sqlite3
+import threading
+import time
+from collections import deque
+
+import config
+
+
+class SessionStore:
+    """Durable chat sessions in SQLite (WAL), written behind the request path.
+
+    Messages and state snapshots are queued in memory and committed by a
+    background thread in one transaction per batch, every flush_interval
+    seconds or as soon as batch_size writes are waiting. State snapshots of the
+    same session coalesce, so only the newest is written. Reads flush first,
+    so a process always sees its own writes; WAL lets other processes on the
+    host read while this one writes, which is what lets another replica pick
+    up a conversation after a restart or failover.
+    """
+
+    def __init__(self, path, flush_interval=config.SESSION_FLUSH_INTERVAL, batch_size=256):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._local = threading.local()
+        self._messages = []  # (session_id, seq, role, content)
+        self._states = {}  # session_id -> state json
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._closed = False
+        conn = self._conn()
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY, state TEXT NOT NULL, updated REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS messages ("
+            " session_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL,"
+            " PRIMARY KEY (session_id, seq)) WITHOUT ROWID;"
+        )
+        conn.commit()
+        self._thread = threading.Thread(target=self._run, name="session-store", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def append_message(self, session_id, seq, role, content):
+        with self._cond:
+            self._messages.append((session_id, seq, role, content))
+            if len(self._messages) + len(self._states) >= self.batch_size:
+                self._cond.notify()
+
+    def save_state(self, session_id, state):
+        data = json.dumps(state, separators=(",", ":"))
+        with self._cond:
+            self._states[session_id] = data
+            if len(self._messages) + len(self._states) >= self.batch_size:
+                self._cond.notify()
+
+    def exists(self, session_id):
+        self.flush()
+        row = self._conn().execute("SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row is not None
+
+    def load_state(self, session_id):
+        """(state dict, message count) or None for an unknown session"""
+        self.flush()
+        conn = self._conn()
+        row = conn.execute("SELECT state FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        if row is None:
+            return None
+        count = conn.execute("SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)).fetchone()[0]
+        return json.loads(row[0]), count
+
+    def load_messages(self, session_id, start, end):
+        """Messages with start <= seq < end, oldest first"""
+        self.flush()
+        rows = self._conn().execute(
+            "SELECT role, content FROM messages WHERE session_id = ? AND seq >= ? AND seq < ? ORDER BY seq",
+            (session_id, start, end),
+        ).fetchall()
+        return [{"role": role, "content": content} for role, content in rows]
+
+    def delete(self, session_id):
+        """Drop the session and its messages; False if it was not stored"""
+        self.flush()
+        with self._write_lock:
+            conn = self._conn()
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            found = conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,)).rowcount > 0
+            conn.commit()
+        return found
+
+    def flush(self):
+        """Commit everything queued so far"""
+        # Batches are taken under the write lock so they commit in queue
+        # order; an older state snapshot can never overwrite a newer one
+        with self._write_lock:
+            with self._cond:
+                messages, self._messages = self._messages, []
+                states, self._states = self._states, {}
+            if not messages and not states:
+                return
+            now = time.time()
+            conn = self._conn()
+            try:
+                conn.executemany("INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?)", messages)
+                conn.executemany(
+                    "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+                    [(session_id, data, now) for session_id, data in states.items()],
+                )
+                conn.commit()
+            except sqlite3.Error:
+                conn.rollback()
+                # Requeue, keeping any newer state queued meanwhile
+                with self._cond:
+                    self._messages = messages + self._messages
+                    self._states = dict(states, **self._states)
+                raise
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed:
+                    self._cond.wait(self.flush_interval)
+                closed = self._closed
+            try:
+                self.flush()
+            except sqlite3.Error:
+                pass  # kept queued; the next round retries
+            if closed:
+                return
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+
+class MessageLog:
+    """One conversation's messages: the newest `hot` in memory, the rest in the store.
+
+    Without a store every message stays in memory, as before.
+    """
+
+    def __init__(self, session_id=None, store=None, hot=config.SESSION_HOT_MESSAGES, count=0):
+        self.session_id = session_id
+        self.store = store
+        self.count = count
+        keep = hot if store is not None else None
+        self._tail = deque(maxlen=keep)
+        if store is not None and count:
+            self._tail.extend(store.load_messages(session_id, max(0, count - hot), count))
+
+    def __len__(self):
+        return self.count
+
+    def append(self, role, content):
+        self._tail.append({"role": role, "content": content})
+        if self.store is not None:
+            self.store.append_message(self.session_id, self.count, role, content)
+        self.count += 1
+
+    def tail(self):
+        """The in-memory (most recent) messages"""
+        return list(self._tail)
+
+    def older(self, limit):
+        """Up to `limit` messages just before the in-memory tail, paged in from the store"""
+        first_hot = self.count - len(self._tail)
+        if self.store is None or first_hot <= 0 or limit <= 0:
+            return []
+        return self.store.load_messages(self.session_id, max(0, first_hot - limit), first_hot)
+
+
+_shared_lock = threading.Lock()
+_shared_store = None
+
+
+def get_shared_session_store():
+    """Process-wide store at SESSION_DB_PATH, or None when sessions are memory-only"""
+    global _shared_store
+    if not config.SESSION_DB_PATH:
+        return None
+    with _shared_lock:
+        if _shared_store is None:
+            _shared_store = SessionStore(config.SESSION_DB_PATH)
+    return _shared_store
@@ -1,20 +1,45 @@
-from groq import Groq
-import os
+import threading
+
 import config
+from modules.llm_client import LLMClient, DEFAULT_MODEL
+
+# One pooled, concurrency-limited client shared by every session, created on
+# first use rather than when the app imports this module
+_client = None
+_client_lock = threading.Lock()
+
+
+_summary_client = None
+
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient()
+    return _client
 
-# Initialize Groq client once
-client = Groq(api_key=config.GROQ_API_KEY)
 
-def call_llm_api(messages, model="openai/gpt-oss-20b"):
-    print("Calling Groq LLM API...")
+def get_summary_client():
+    """Client for background conversation summaries, with its own small in-flight limit,
+    so summaries never take (or queue for) the slots user replies need"""
+    global _summary_client
+    with _client_lock:
+        if _summary_client is None:
+            _summary_client = LLMClient(max_in_flight=config.MEMORY_SUMMARY_WORKERS, max_queue=0, background=True)
+    return _summary_client
+
+
+def call_llm_api(messages, model=DEFAULT_MODEL):
     """
     messages: list of dicts like [{"role": "user", "content": "Hello"}]
     model: Groq LLM model
     """
-    # Groq API expects the same chat format
-    response = client.chat.completions.create(
-        messages=messages,
-        model=model
-    )
-    # Extract the assistant reply
-    return response.choices[0].message.content
+    return get_client().complete(messages, model=model)
+
+
+def stream_llm_api(messages, model=DEFAULT_MODEL):
+    """
+    Same as call_llm_api, but yields the reply text in pieces as Groq streams it.
+    """
+    yield from get_client().stream(messages, model=model)
@@ -0,0 +1,125 @@
+# modules/warmup.py
+"""Background start-up: heavy imports, model and index loading, and a warm-up query.
+
+    python -m modules.warmup           # cold-start breakdown on this machine
+    python -m modules.warmup --json
+
+The app and the API server call start() at boot and are interactive right
+away; is_ready() / wait_ready() tell them when the shared retriever is
+loaded and warm, so the first real query isn't the slow one. status() has
+the import-time and load-time breakdown, also exported as
+pfa_startup_seconds{stage, name} and pfa_ready on /metrics.
+"""
+import argparse
+import importlib
+import json
+import threading
+import time
+
+import config
+from modules.metrics import REGISTRY
+
+# Deferred everywhere else until first use; imported here off the request path
+HEAVY_MODULES = ("torch", "sentence_transformers", "faiss")
+
+_lock = threading.Lock()
+_thread = None
+_done = threading.Event()
+_status = {"ready": False, "error": None, "import_s": {}, "load_s": {}, "total_s": None}
+
+
+def start():
+    """Start warming up on a daemon thread, once per process; returns immediately"""
+    global _thread
+    with _lock:
+        if _thread is None:
+            REGISTRY.register_collector("startup", _collect)
+            _thread = threading.Thread(target=_run, name="warmup", daemon=True)
+            _thread.start()
+    return _thread
+
+
+def is_ready():
+    return _status["ready"]
+
+
+def wait_ready(timeout=None):
+    """Block until warm-up finished (or timeout); True if it succeeded"""
+    _done.wait(timeout)
+    return _status["ready"]
+
+
+def status():
+    return {
+        "ready": _status["ready"],
+        "error": _status["error"],
+        "import_s": dict(_status["import_s"]),
+        "load_s": dict(_status["load_s"]),
+        "total_s": _status["total_s"],
+    }
+
+
+def _timed(stage, name, fn):
+    start = time.perf_counter()
+    result = fn()
+    _status[stage][name] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def _run():
+    started = time.perf_counter()
+    try:
+        for name in HEAVY_MODULES:
+            _timed("import_s", name, lambda: importlib.import_module(name))
+
+        from modules.rag import get_shared_retriever
+        retriever = get_shared_retriever()
+        _status["load_s"].update(retriever.load_timings)  # model and index
+        _status["load_s"].update(retriever.warm_up())
+        if config.INTENT_CLASSIFIER:
+            from modules.intent import get_shared_router
+            # First classification embeds the intent prototypes
+            _timed("load_s", "intent_prototypes", lambda: get_shared_router().classify("hi there"))
+        from modules.utils import get_client
+        _timed("load_s", "llm_client", get_client)
+        _status["ready"] = True
+    except Exception as exc:
+        # Whatever failed is loaded again by the first request that needs it
+        _status["error"] = repr(exc)
+        print(f"Warm-up failed, the first request will load what is missing: {exc}")
+    finally:
+        _status["total_s"] = round(time.perf_counter() - started, 3)
+        _done.set()
+    if _status["ready"]:
+        print(f"✅ Warm-up done in {_status['total_s']}s: imports {_status['import_s']}, load {_status['load_s']}")
+
+
+def _collect():
+    gauges = [("pfa_ready", {}, int(_status["ready"]))]
+    for stage in ("import_s", "load_s"):
+        for name, seconds in list(_status[stage].items()):
+            gauges.append(("pfa_startup_seconds", {"stage": stage[:-2], "name": name}, seconds))
+    return gauges
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--json", action="store_true", help="print the breakdown as JSON")
+    args = parser.parse_args()
+
+    # What importing the app costs before anything heavy is loaded
+    _timed("import_s", "modules.chat_manager", lambda: importlib.import_module("modules.chat_manager"))
+    start()
+    wait_ready()
+    report = status()
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    for stage in ("import_s", "load_s"):
+        for name, seconds in report[stage].items():
+            print(f"{stage[:-2]:>6}  {name:<24} {seconds:>8.3f} s")
+    print(f"{'total':>6}  {'(background thread)':<24} {report['total_s']:>8.3f} s  ready={report['ready']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# tests/test_api_server.py
+import asyncio
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+import api_server
+from modules.session_store import SessionStore
+
+
+def _run(registry, scenario):
+    async def main():
+        async with TestClient(TestServer(api_server.make_app(registry))) as client:
+            return await scenario(client)
+    return asyncio.run(main())
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SessionStore(str(tmp_path / "sessions.db"), flush_interval=0.01)
+    yield store
+    store.close()
+
+
+def test_make_app_keeps_an_empty_registry():
+    registry = api_server.SessionRegistry(store=False)
+    assert len(registry) == 0
+    assert api_server.make_app(registry)[api_server.SESSIONS] is registry
+
+
+def test_sessions_resume_from_the_store(store):
+    registry = api_server.SessionRegistry(store=store)
+
+    async def scenario(client):
+        created = await client.post("/sessions")
+        session_id = (await created.json())["session_id"]
+        await client.post(f"/sessions/{session_id}/questionnaire/start", json={"test": "GAD7"})
+        answered = await client.post(f"/sessions/{session_id}/questionnaire/answer", json={"score": 2})
+        assert answered.status == 200
+
+        # Unloaded from memory, e.g. by the TTL: the next request reads it back
+        registry._sessions.clear()
+        messages = await client.get(f"/sessions/{session_id}/messages")
+        assert messages.status == 200
+        assert registry._sessions[session_id].chat.test_scores == [2]
+
+        assert (await client.delete(f"/sessions/{session_id}")).status == 200
+        registry._sessions.clear()
+        assert (await client.get(f"/sessions/{session_id}/risk")).status == 404
+        assert (await client.delete(f"/sessions/{session_id}")).status == 404
+        assert not store.exists(session_id)
+
+    _run(registry, scenario)
+
+
+def test_unknown_cohort_is_rejected():
+    async def scenario(client):
+        assert (await client.post("/sessions", json={"cohort": "x" * 5000})).status == 400
+        assert (await client.post("/sessions", json={"cohort": 7})).status == 400
+        assert (await client.post("/sessions")).status == 201
+
+    _run(api_server.SessionRegistry(store=False), scenario)
+
+
+def test_metrics_route_is_opt_in():
+    async def scenario(client):
+        return (await client.get("/metrics")).status
+
+    assert _run(api_server.SessionRegistry(store=False), scenario) == 404
+
+    async def main():
+        app = api_server.make_app(api_server.SessionRegistry(store=False), metrics_route=True)
+        async with TestClient(TestServer(app)) as client:
+            return await scenario(client)
+    assert asyncio.run(main()) == 200
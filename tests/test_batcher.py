@@ -0,0 +1,52 @@
+# tests/test_batcher.py
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from modules import batcher
+from modules.batcher import QueryBatcher
+
+
+class Interrupted(BaseException):
+    pass
+
+
+class EchoRetriever:
+    def __init__(self):
+        self.fail = False
+
+    def retrieve_batch(self, queries, top_k=2):
+        if self.fail:
+            raise Interrupted()
+        return [[{"text": query, "top_k": top_k}] for query in queries]
+
+
+def test_queries_are_served_in_batches():
+    qb = QueryBatcher(EchoRetriever(), max_batch=8, max_wait_ms=5)
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(lambda i: qb.retrieve(f"q{i}", top_k=3), range(64)))
+    assert [r[0]["text"] for r in results] == [f"q{i}" for i in range(64)]
+    stats = qb.stats()
+    assert stats["queries"] == 64 and stats["batches"] <= 64
+
+
+def test_a_base_exception_fails_the_batch_but_not_the_worker():
+    retriever = EchoRetriever()
+    qb = QueryBatcher(retriever)
+    retriever.fail = True
+    with pytest.raises(Interrupted):
+        qb.retrieve("first")
+    retriever.fail = False
+    assert qb.retrieve("second")[0]["text"] == "second"
+
+
+def test_collector_reports_the_shared_batcher(monkeypatch):
+    monkeypatch.setattr(batcher, "_shared_batcher", None)
+    assert batcher.collect_metrics() == []
+    qb = QueryBatcher(EchoRetriever())
+    qb.retrieve("hello")
+    monkeypatch.setattr(batcher, "_shared_batcher", qb)
+    gauges = {(name, tuple(labels.items())): value for name, labels, value in batcher.collect_metrics()}
+    assert gauges[("pfa_batcher_queries", ())] == 1
+    assert gauges[("pfa_batcher_batches_by_size", (("size_le", "1"),))] == 1
+    assert ("pfa_batcher_queue_delay_ms", (("quantile", "p95"),)) in gauges
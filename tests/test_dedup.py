@@ -0,0 +1,42 @@
+# tests/test_dedup.py
+import random
+
+from modules.dedup import NearDuplicateIndex
+
+WORDS = ("sleep stress exam breathing friend counsellor routine worry panic calm support campus night "
+         "morning walk talk listen safe help feeling body mind rest").split()
+
+
+def _passage(seed, length=200):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(length))
+
+
+def _doc(name, content, page=1):
+    return {"name": name, "content": content, "page": page}
+
+
+def test_near_duplicates_collapse_with_provenance():
+    original = _passage(0)
+    words = original.split()
+    words[100] = "different"  # one edited word, as in a re-issued PDF
+    copy = " ".join(words)
+
+    dedup = NearDuplicateIndex(threshold=0.85)
+    assert dedup.check(0, _doc("who_pfa.txt", original)) is None
+    assert dedup.check(1, _doc("other.txt", _passage(1))) is None
+    assert dedup.check(2, _doc("pfa_schools_field_guide.txt", copy, page=4)) == 0
+    assert dedup.sources == {0: [("pfa_schools_field_guide.txt", 4)]}
+    assert dedup.dropped == 1 and dedup.dropped_tokens > 0
+    assert dedup.by_file["pfa_schools_field_guide.txt"]["dup_of"] == {"who_pfa.txt"}
+
+
+def test_overlapping_but_distinct_chunks_are_kept():
+    # Half shared, like neighbouring chunks or a paraphrased guide: Jaccard well below the threshold
+    first, second = _passage(2), _passage(3)
+    mixed = " ".join(first.split()[:100] + second.split()[:100])
+
+    dedup = NearDuplicateIndex(threshold=0.85)
+    assert dedup.check(0, _doc("a.txt", first)) is None
+    assert dedup.check(1, _doc("b.txt", mixed)) is None
+    assert dedup.dropped == 0
@@ -0,0 +1,55 @@
+# tests/test_hybrid_retrieval.py
+from types import SimpleNamespace
+
+import numpy as np
+
+from modules.bm25 import BM25Index
+from modules.chunk_store import ChunkStore
+from modules.rag import RAGRetriever
+
+DOCS = [
+    "Thanks for reaching out, bye for now and take care of your sleep.",
+    "Breathing exercises help with exam anxiety and panic.",
+    "Sleep hygiene: keep a regular bedtime and avoid screens.",
+]
+
+
+def _snapshot(tmp_path):
+    docs = [{"name": f"doc{i}.txt", "content": text, "page": 1} for i, text in enumerate(DOCS)]
+    ChunkStore.write(str(tmp_path / "chunks"), docs)
+    BM25Index.write(str(tmp_path / "chunks.bm25"), docs)
+    # One unit axis per chunk: the query below sits next to chunk 1 only
+    return SimpleNamespace(
+        vectors=np.eye(3, dtype="float32"),
+        bm25=BM25Index(str(tmp_path / "chunks.bm25")),
+        store=ChunkStore(str(tmp_path / "chunks")),
+    )
+
+
+def _retriever():
+    retriever = RAGRetriever.__new__(RAGRetriever)
+    retriever.hybrid = True
+    return retriever
+
+
+def test_fused_lexical_hits_respect_max_distance(tmp_path):
+    snap = _snapshot(tmp_path)
+    q_emb = np.array([0.0, 1.0, 0.0], dtype="float32")
+    ids, distances = np.array([1, 0, 2]), np.array([0.0, 2.0, 2.0], dtype="float32")
+
+    # "thanks bye" matches chunk 0 lexically, but chunk 0 is 2.0 away in embedding space
+    hits = _retriever()._fused_hits(snap, "thanks bye", q_emb, ids, distances, top_k=3, fetch_k=3,
+                                    max_distance=1.3, mmr_lambda=None, dup_threshold=0.95)
+    assert [hit["content"] for hit in hits] == [DOCS[1]]
+    assert all(hit["distance"] <= 1.3 for hit in hits)
+
+
+def test_fused_without_cutoff_keeps_lexical_hits(tmp_path):
+    snap = _snapshot(tmp_path)
+    q_emb = np.array([0.0, 1.0, 0.0], dtype="float32")
+    ids, distances = np.array([1, 0, 2]), np.array([0.0, 2.0, 2.0], dtype="float32")
+
+    hits = _retriever()._fused_hits(snap, "thanks bye", q_emb, ids, distances, top_k=3, fetch_k=3,
+                                    max_distance=None, mmr_lambda=None, dup_threshold=0.95)
+    assert DOCS[0] in [hit["content"] for hit in hits]
+    assert all(hit["distance"] is not None for hit in hits)
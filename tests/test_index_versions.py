@@ -0,0 +1,158 @@
+# tests/test_index_versions.py
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from modules.index_manifest import load_manifest
+from modules.index_versions import CURRENT, VersionDir
+from modules.rag import RAGRetriever
+
+DIM = 16
+CORPUS = {
+    "exams.txt": "Exam stress is common among students. Regular sleep and short breaks help a lot.",
+    "sleep.txt": "Keep a regular bedtime. Avoid screens for an hour before sleeping.",
+    "panic.txt": "Slow breathing for a few minutes calms a racing heart before presentations.",
+}
+
+
+class StubEmbedder:
+    """Deterministic bag-of-words vectors, so builds need no model"""
+    backend = "fp32"
+    processes = 1
+    batch_size = 64
+    bulk_batch_size = 256
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, batch_size=None):
+        self.encoded.extend(texts)
+        vectors = np.zeros((len(texts), DIM), dtype="float32")
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[row, hashlib.md5(word.encode("utf-8")).digest()[0] % DIM] += 1
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-6)
+
+    def encode_bulk(self, texts):
+        return self.encode(texts)
+
+    def close(self):
+        pass
+
+
+def _write_corpus(path, files):
+    os.makedirs(path, exist_ok=True)
+    for name in os.listdir(path):
+        if name not in files:
+            os.remove(os.path.join(path, name))
+    for name, text in files.items():
+        with open(os.path.join(path, name), "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+def _retriever(tmp_path, embedder=None, index="index", **kwargs):
+    return RAGRetriever(docs_path=str(tmp_path / "docs"), index_dir=str(tmp_path / index),
+                        embedder=embedder or StubEmbedder(), **kwargs)
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def docs(tmp_path):
+    _write_corpus(str(tmp_path / "docs"), CORPUS)
+    return tmp_path / "docs"
+
+
+def test_publish_numbers_versions_and_flips_current(tmp_path):
+    versions = VersionDir(str(tmp_path / "index"))
+    assert versions.current() is None
+    first = versions.publish(versions.stage())
+    second = versions.publish(versions.stage())
+    assert (first, second) == ("v000001", "v000002")
+    assert versions.current() == second and versions.versions() == [first, second]
+    # CURRENT is replaced by rename: no temp files or staging dirs are left behind
+    assert sorted(os.listdir(tmp_path / "index")) == [CURRENT, first, second]
+
+
+def test_corpus_change_publishes_a_second_version(tmp_path, docs):
+    retriever = _retriever(tmp_path)
+    assert retriever.version == "v000001"
+    assert not retriever.refresh()
+
+    _write_corpus(str(docs), dict(CORPUS, **{"focus.txt": "Break study tasks into small steps."}))
+    assert retriever.refresh()
+    assert retriever.version == "v000002" and retriever.versions.current() == "v000002"
+    assert "focus.txt" in {doc["name"] for doc in retriever.store}
+    # A new process starts on what CURRENT names
+    assert _retriever(tmp_path).version == "v000002"
+
+
+def test_held_snapshot_survives_a_swap_and_its_version_is_kept(tmp_path, docs):
+    retriever = _retriever(tmp_path, keep_versions=0)
+    held = retriever._acquire()
+    old_docs = list(held.store)
+
+    _write_corpus(str(docs), {"sleep.txt": CORPUS["sleep.txt"]})
+    assert retriever.refresh()
+    assert retriever.version == "v000002"
+    # The call in flight still reads the version it started on
+    assert held.index is not None and list(held.store) == old_docs
+    assert held.index.search(held.vectors[:1].copy(), 1)[1][0][0] == 0
+    # keep_versions=0 reclaims everything old, except what is still open
+    retriever.versions.reclaim(in_use={held.version}, keep=0)
+    assert os.path.isdir(retriever.versions.path("v000001"))
+
+    held.release()
+    assert held.index is None
+    assert _wait_for(lambda: retriever.versions.versions() == ["v000002"])
+
+
+def test_concurrent_builds_publish_one_version(tmp_path, docs):
+    embedders = [StubEmbedder(), StubEmbedder()]
+    retrievers = [None, None]
+
+    def start(i):
+        retrievers[i] = _retriever(tmp_path, embedders[i])
+
+    threads = [threading.Thread(target=start, args=(i,)) for i in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # The build lock lets one builder through; the other finds its version current
+    assert VersionDir(str(tmp_path / "index")).versions() == ["v000001"]
+    assert [r.version for r in retrievers] == ["v000001", "v000001"]
+    assert sorted(bool(e.encoded) for e in embedders) == [False, True]
+
+
+def test_incremental_build_matches_a_full_rebuild(tmp_path, docs):
+    embedder = StubEmbedder()
+    incremental = _retriever(tmp_path, embedder)
+    edited = {
+        "exams.txt": CORPUS["exams.txt"] + " Talk to a counsellor if it lasts.",  # changed
+        "sleep.txt": CORPUS["sleep.txt"],  # unchanged
+        "focus.txt": "Break study tasks into small steps to beat procrastination.",  # added
+    }  # panic.txt removed
+    _write_corpus(str(docs), edited)
+    embedder.encoded.clear()
+    assert incremental.refresh()
+    # Only the added and changed files were embedded again
+    assert not any(CORPUS["sleep.txt"] in text for text in embedder.encoded)
+
+    full = _retriever(tmp_path, index="full")
+    assert list(incremental.store) == list(full.store)
+    np.testing.assert_array_equal(np.asarray(incremental.vectors), np.asarray(full.vectors))
+    manifest_files = [r.versions.path(r.version, "manifest.json") for r in (incremental, full)]
+    assert load_manifest(manifest_files[0])["files"] == load_manifest(manifest_files[1])["files"]
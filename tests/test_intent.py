@@ -0,0 +1,60 @@
+# tests/test_intent.py
+import pytest
+
+from modules.intent import CRISIS_REPLY, THANKS_REPLY, IntentRouter
+
+
+@pytest.fixture
+def router():
+    return IntentRouter()
+
+
+@pytest.mark.parametrize("text", [
+    "I don’t want to live anymore",
+    "I don't want to live anymore",
+    "i dont want to live anymore",
+    "I‘m going to end it",
+    "I'm going to end it",
+    "im gonna end it all",
+    "i feel like dying",
+    "kms",
+    "honestly kms lol",
+    "ｋｍｓ",
+    "hi, I want to die",
+    "thanks, but I keep thinking about hurting myself",
+    "there's no point in living",
+    "I can’t go on like this",
+])
+def test_crisis_phrases(router, text):
+    route = router.route(text)
+    assert route.intent == "crisis"
+    assert route.reply == CRISIS_REPLY
+    assert not route.needs_llm
+
+
+@pytest.mark.parametrize("text", [
+    "I ran 5 kms today",
+    "how do I deal with exam stress?",
+    "my friend ended the call",
+])
+def test_not_crisis(router, text):
+    assert router.classify(text) != "crisis"
+
+
+def test_no_thanks_is_not_gratitude(router):
+    route = router.route("no thanks")
+    assert route.intent is None
+    assert route.reply != THANKS_REPLY
+
+
+@pytest.mark.parametrize("text, intent", [
+    ("thanks!", "thanks"),
+    ("ok thank you", "thanks"),
+    ("no", "ack"),
+    ("nope", "ack"),
+    ("no thanks, bye", "bye"),
+    ("hello there", "greeting"),
+    ("hey, what’s up", "greeting"),
+])
+def test_template_intents(router, text, intent):
+    assert router.classify(text) == intent
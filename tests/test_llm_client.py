@@ -0,0 +1,130 @@
+# tests/test_llm_client.py
+import asyncio
+import random
+import threading
+
+import pytest
+
+from modules.fake_llm import DEFAULT_REPLY, FakeLLMServer
+from modules.llm_client import AsyncLLMClient, LLMClient, LLMDeadlineExceeded, LLMError, LLMOverloadedError
+
+MESSAGES = [{"role": "user", "content": "I feel stressed about exams"}]
+FAST = dict(api_key="test", backoff_base=0.01, backoff_cap=0.05)
+
+
+def _first_failures(count):
+    """A seed whose first count requests fail at error_rate=0.5 and the next one succeeds"""
+    for seed in range(1000):
+        rng = random.Random(seed)
+        if all(rng.random() < 0.5 for _ in range(count)) and rng.random() >= 0.5:
+            return seed
+
+
+@pytest.fixture
+def server():
+    with FakeLLMServer(ttft=0.01, token_delay=0.001) as server:
+        yield server
+
+
+def test_complete_and_stream(server):
+    client = LLMClient(base_url=server.url, **FAST)
+    assert client.complete(MESSAGES) == DEFAULT_REPLY
+    pieces = list(client.stream(MESSAGES))
+    assert len(pieces) > 1
+    assert "".join(pieces) == DEFAULT_REPLY
+    stats = client.stats()
+    assert stats["succeeded"] == 2 and stats["failed"] == 0 and stats["in_flight"] == 0
+
+
+def test_retries_transient_errors(server):
+    server.error_rate, server.error_status = 0.5, 503
+    server._random = random.Random(_first_failures(2))
+    client = LLMClient(base_url=server.url, max_retries=3, **FAST)
+    assert "".join(client.stream(MESSAGES)) == DEFAULT_REPLY
+    assert server.requests == 3
+    assert client.stats()["retried"] == 2 and client.stats()["succeeded"] == 1
+
+
+def test_gives_up_after_max_retries(server):
+    server.error_rate = 1.0
+    client = LLMClient(base_url=server.url, max_retries=2, **FAST)
+    with pytest.raises(LLMError):
+        client.complete(MESSAGES)
+    assert server.requests == 3
+    assert client.stats()["retried"] == 2 and client.stats()["failed"] == 1
+
+
+def test_client_errors_are_not_retried(server):
+    server.error_rate, server.error_status = 1.0, 400
+    client = LLMClient(base_url=server.url, max_retries=3, **FAST)
+    with pytest.raises(LLMError):
+        client.complete(MESSAGES)
+    assert server.requests == 1
+
+
+def test_sheds_beyond_the_queue(server):
+    server.ttft = 0.5
+    client = LLMClient(base_url=server.url, max_in_flight=1, max_queue=0, **FAST)
+    busy = threading.Thread(target=client.complete, args=(MESSAGES,))
+    busy.start()
+    while client.stats()["in_flight"] == 0:
+        pass
+    with pytest.raises(LLMOverloadedError):
+        client.complete(MESSAGES)
+    busy.join()
+    assert client.stats()["shed"] == 1 and client.stats()["succeeded"] == 1
+
+
+def test_mid_stream_timeout_is_an_llm_error(server):
+    server.token_delay = 1.0
+    client = LLMClient(base_url=server.url, request_timeout=0.3, max_retries=0, **FAST)
+    pieces = []
+    with pytest.raises(LLMError):
+        for piece in client.stream(MESSAGES):
+            pieces.append(piece)
+    assert len(pieces) == 1
+    assert client.stats()["failed"] == 1 and client.stats()["in_flight"] == 0
+
+
+def test_async_client(server):
+    async def main():
+        client = AsyncLLMClient(base_url=server.url, max_retries=3, **FAST)
+        try:
+            assert await client.complete(MESSAGES) == DEFAULT_REPLY
+            assert "".join([piece async for piece in client.stream(MESSAGES)]) == DEFAULT_REPLY
+
+            server.token_delay = 1.0
+            slow = AsyncLLMClient(base_url=server.url, request_timeout=0.3, max_retries=0, **FAST)
+            with pytest.raises(LLMError):
+                async for _ in slow.stream(MESSAGES):
+                    pass
+            assert slow.stats()["failed"] == 1 and slow.stats()["in_flight"] == 0
+            await slow.aclose()
+        finally:
+            await client.aclose()
+
+    asyncio.run(main())
+
+
+def test_deadline_covers_the_whole_stream(server):
+    server.token_delay = 0.05
+    client = LLMClient(base_url=server.url, deadline=0.3, **FAST)
+    pieces = []
+    with pytest.raises(LLMDeadlineExceeded):
+        for piece in client.stream(MESSAGES):
+            pieces.append(piece)
+    assert 0 < len(pieces) < len(DEFAULT_REPLY.split())
+    assert client.stats()["failed"] == 1 and client.stats()["in_flight"] == 0
+
+    async def main():
+        client = AsyncLLMClient(base_url=server.url, deadline=0.3, **FAST)
+        try:
+            with pytest.raises(LLMDeadlineExceeded):
+                async for _ in client.stream(MESSAGES):
+                    pass
+            return client.stats()
+        finally:
+            await client.aclose()
+
+    stats = asyncio.run(main())
+    assert stats["failed"] == 1 and stats["in_flight"] == 0
@@ -0,0 +1,61 @@
+# tests/test_memory.py
+import time
+
+from modules.llm_client import LLMClient
+from modules.memory import ConversationMemory
+
+
+def _settle(mem):
+    deadline = time.monotonic() + 5
+    while mem._summarizing and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def _message(i):
+    return f"message {i}: " + "I have been worrying about exams and not sleeping well " * 4
+
+
+def test_summaries_are_batched():
+    calls = []
+
+    def summarize(messages):
+        calls.append(messages)
+        return "The student is stressed about exams."
+
+    mem = ConversationMemory(summarize=summarize, window_tokens=200, batch_tokens=150)
+    for i in range(40):
+        mem.add("user" if i % 2 == 0 else "assistant", _message(i))
+        _settle(mem)
+    evicted = mem.stats()["summarized_messages"] + mem.stats()["pending_messages"]
+    assert evicted > 30
+    # One call per ~150 evicted tokens, not one per evicted message
+    assert 0 < len(calls) <= evicted // 2
+    assert mem.stats()["pending_tokens"] < 150
+
+
+def test_pending_messages_stay_in_the_prompt():
+    mem = ConversationMemory(summarize=lambda messages: "unused", window_tokens=60, batch_tokens=10_000)
+    for i in range(4):
+        mem.add("user", _message(i))
+    text = mem.render()
+    assert all(f"message {i}:" in text for i in range(4))
+    assert mem.stats()["summarized_messages"] == 0
+
+
+def test_summaries_wait_while_user_replies_are_queued(monkeypatch):
+    user_client = LLMClient(api_key="test", max_in_flight=1)
+    user_client.counters.add("queued")  # a user reply is waiting for a slot
+    summary_calls = []
+    monkeypatch.setattr("modules.utils.get_summary_client",
+                        lambda: type("Client", (), {"complete": lambda self, m: summary_calls.append(m) or "s"})())
+
+    mem = ConversationMemory(window_tokens=60, batch_tokens=50)
+    for i in range(4):
+        mem.add("user", _message(i))
+        _settle(mem)
+    assert summary_calls == [] and mem.stats()["pending_messages"] > 0
+
+    user_client.counters.add("queued", -1)
+    mem.add("user", _message(4))
+    _settle(mem)
+    assert summary_calls and mem.summary == "s"
@@ -0,0 +1,47 @@
+# tests/test_metrics.py
+import time
+
+from modules import metrics, rag
+from modules.metrics import REGISTRY, timed_render
+
+
+def _render_count():
+    series = REGISTRY.snapshot("pfa_stage_seconds")
+    return series.get((("stage", "test_render"),), (0, 0.0))
+
+
+def test_timed_render_excludes_waiting_for_chunks():
+    def slow_producer():
+        for piece in ("a", "b", "c"):
+            time.sleep(0.05)
+            yield piece
+
+    before_count, before_sum = _render_count()[:2]
+    rendered = []
+    for chunk in timed_render(slow_producer(), "test_render"):
+        time.sleep(0.01)  # the "UI"
+        rendered.append(chunk)
+    count, total = _render_count()[:2]
+    assert rendered == ["a", "b", "c"]
+    assert count == before_count + 1
+    assert 0.02 <= total - before_sum < 0.1
+
+
+def test_metrics_server_is_off_without_a_port(monkeypatch):
+    monkeypatch.setattr(metrics, "_server", None)
+    assert metrics.start_metrics_server(port=0) is None
+
+
+def test_rag_collector_reports_loaded_retrievers_only(monkeypatch):
+    class Loaded:
+        def memory_stats(self):
+            return {"index_version": "v1", "index_backend": "flat", "index_vectors": 10, "chunks": 10,
+                    "store_bytes": 100, "bm25_bytes": 50, "cache": {"hits": 3, "hit_rate": 0.5}}
+
+    monkeypatch.setattr(rag, "_shared_retrievers", {})
+    assert rag.collect_metrics() == []
+    monkeypatch.setattr(rag, "_shared_retrievers", {(): Loaded()})
+    gauges = {name: (labels, value) for name, labels, value in rag.collect_metrics()}
+    assert gauges["pfa_rag_index_vectors"] == ({"version": "v1", "backend": "flat"}, 10)
+    assert gauges["pfa_rag_cache_hit_rate"][1] == 0.5
+    assert gauges["pfa_process_rss_bytes"][1] > 0
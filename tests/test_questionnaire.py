@@ -0,0 +1,71 @@
+# tests/test_questionnaire.py
+import pytest
+
+import config
+from modules.analytics import QuestionnaireStore, allowed_cohort
+from modules.chat_manager import ChatManager
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = QuestionnaireStore(str(tmp_path), flush_interval=0, min_count=0, allowed_cohorts=("engineering",))
+    yield store
+    store.close()
+
+
+def _complete(chat, test, answers):
+    chat.start_test(test)
+    result = None
+    for answer in answers:
+        result = chat.record_answer(answer)
+    return result
+
+
+def test_completed_questionnaire_is_recorded(store):
+    chat = ChatManager(store=False, analytics=store)
+    assert _complete(chat, "GAD7", [2] * 7) == ("high", "GAD7")
+    store.flush()
+    rows = store.scan()
+    assert rows["total"].tolist() == [14]
+    assert store.cohorts == [config.ANALYTICS_DEFAULT_COHORT]
+
+
+def test_analytics_off(store):
+    chat = ChatManager(store=False, analytics=False)
+    assert chat.analytics is None
+    _complete(chat, "GAD7", [0] * 7)
+    store.flush()
+    assert len(store.scan()["total"]) == 0
+
+
+@pytest.mark.parametrize("score", [4, -1, "x", None])
+def test_out_of_range_answer_leaves_state_alone(score):
+    chat = ChatManager(store=False, analytics=False)
+    first = chat.start_test("PHQ9")
+    assert chat.record_answer(score) is None
+    assert chat.test_index == 0 and chat.test_scores == []
+    assert chat.get_next_question() == first
+    assert _complete(chat, "PHQ9", [0] * 9) == ("low", "PHQ9")
+
+
+def test_analytics_errors_do_not_break_the_questionnaire():
+    class Broken:
+        def append(self, *args):
+            raise OSError("disk full")
+
+    chat = ChatManager(store=False, analytics=Broken())
+    assert _complete(chat, "PHQ9", [3] * 9) == ("high", "PHQ9")
+    assert chat.phq9_completed and chat.current_test is None
+
+
+def test_unknown_cohorts_fall_back_to_the_default(store):
+    assert ChatManager(store=False, analytics=False, cohort="x" * 10000).cohort == config.ANALYTICS_DEFAULT_COHORT
+    assert allowed_cohort("engineering", ("engineering",)) == "engineering"
+    assert allowed_cohort("", None) is None
+
+    store.append("GAD7", [1] * 7, "made-up")
+    store.append("GAD7", [1] * 7, "engineering")
+    store.flush()
+    store.append_many("GAD7", [[0] * 7] * 3, ["junk-1", "junk-2", "engineering"])
+    assert sorted(store.cohorts) == sorted(["engineering", config.ANALYTICS_DEFAULT_COHORT])
+    assert int(store.cube[..., 0].sum()) == 5
@@ -0,0 +1,49 @@
+# tests/test_replay.py
+import json
+
+import pytest
+
+from modules import replay, utils
+from modules.fake_llm import FakeLLMServer
+from modules.llm_client import LLMClient
+
+
+class NoContext:
+    def retrieve(self, query, top_k=4, **options):
+        return []
+
+    def retrieve_batch(self, queries, top_k=4):
+        return [[] for _ in queries]
+
+
+@pytest.fixture
+def server(monkeypatch):
+    with FakeLLMServer(ttft=0.01, token_delay=0.001) as server:
+        monkeypatch.setattr(utils, "_client", LLMClient(api_key="test", base_url=server.url, max_retries=0))
+        monkeypatch.setattr(replay, "get_shared_retriever", NoContext)
+        yield server
+
+
+CONVERSATIONS = [("c1", ["hi", "I can't sleep before exams"]), ("c2", ["I feel low"])]
+
+
+def _rows(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_failed_conversations_are_not_written_and_replay_on_rerun(server, tmp_path):
+    path = str(tmp_path / "out.jsonl")
+    server.error_rate, server.error_status = 1.0, 400
+    sink = replay.JsonlSink(path)
+    assert replay.run(CONVERSATIONS, sink, concurrency=2) == (0, 2)
+    sink.close()
+    assert _rows(path) == []
+
+    server.error_rate = 0.0
+    sink = replay.JsonlSink(path)
+    assert sink.done == set()
+    assert replay.run(CONVERSATIONS, sink, concurrency=2) == (2, 0)
+    sink.close()
+    assert sorted((r["conversation_id"], r["turn"]) for r in _rows(path)) == [("c1", 0), ("c1", 1), ("c2", 0)]
+    assert replay.JsonlSink(path).done == {"c1", "c2"}
@@ -0,0 +1,36 @@
+# tests/test_retrieval_cache.py
+import numpy as np
+
+from modules.retrieval_cache import RetrievalCache
+
+
+def _put(cache, query):
+    cache.put(query, 8, np.ones(4), [1, 2], [0.1, 0.2])
+
+
+def test_disk_tier_commits_in_batches(tmp_path):
+    path = str(tmp_path / "cache.db")
+    writer = RetrievalCache(disk_path=path)
+    writer._disk.flush_interval = 3600
+    writer.set_version("v1")
+    reader = RetrievalCache(disk_path=path)
+    reader.set_version("v1")
+
+    _put(writer, "exam stress")
+    assert reader.get("exam stress", 8) is None
+    for i in range(writer._disk.batch_size - 1):
+        _put(writer, f"query {i}")
+    # The batch filled up and was committed in one go
+    embedding, ids, _ = reader.get("Exam stress?", 8)
+    assert list(ids) == [1, 2] and embedding.shape == (4,)
+    assert reader.stats()["disk_hits"] == 1
+
+
+def test_pending_puts_of_other_versions_are_dropped(tmp_path):
+    cache = RetrievalCache(disk_path=str(tmp_path / "cache.db"))
+    cache._disk.flush_interval = 3600
+    cache.set_version("v1")
+    _put(cache, "exam stress")
+    cache.set_version("v2")
+    cache._disk.flush()
+    assert cache._disk.get("v1", ("exam stress", 8), 0) is None
@@ -0,0 +1,81 @@
+# tests/test_streaming.py
+import asyncio
+
+import pytest
+
+from modules import utils
+from modules.chat_manager import BUSY_REPLY, ChatManager
+from modules.fake_llm import DEFAULT_REPLY, TEST_OFFER, FakeLLMServer
+from modules.llm_client import AsyncLLMClient, LLMClient
+
+
+class NoContext:
+    def retrieve(self, query, top_k=4, **options):
+        return []
+
+
+@pytest.fixture
+def server(monkeypatch):
+    with FakeLLMServer(ttft=0.01, token_delay=0.001) as server:
+        monkeypatch.setattr(utils, "_client", LLMClient(api_key="test", base_url=server.url, backoff_base=0.01))
+        yield server
+
+
+def _chat():
+    return ChatManager(rag=NoContext(), store=False, analytics=False)
+
+
+def test_reply_streams_in_pieces(server):
+    chat = _chat()
+    chunks = list(chat.generate_reply_stream("I can't focus on my studies"))
+    assert len(chunks) > 2
+    assert "".join(chunks) == "🧠 " + DEFAULT_REPLY
+    assert chat.last_reply == ("🧠 " + DEFAULT_REPLY, False, "PHQ9")
+    assert chat.get_messages()[-1]["content"] == "🧠 " + DEFAULT_REPLY
+
+
+def test_questionnaire_offer_is_detected_on_the_accumulated_text(server):
+    chat = _chat()
+    chat.exchange_count = 2
+    chunks = list(chat.generate_reply_stream("I have been feeling low for weeks"))
+    assert "".join(chunks).endswith(TEST_OFFER)
+    # The offer spans several streamed pieces; only the full text matches
+    assert not any("Would you like to take" in chunk for chunk in chunks)
+    reply, show_buttons, test_type = chat.last_reply
+    assert show_buttons and test_type == "PHQ9"
+
+
+def test_llm_failure_before_the_first_piece_falls_back(server):
+    server.error_rate, server.error_status = 1.0, 400
+    chat = _chat()
+    assert "".join(chat.generate_reply_stream("I can't sleep")) == "🧠 " + BUSY_REPLY
+    assert chat.last_reply[0] == "🧠 " + BUSY_REPLY
+
+
+def test_mid_stream_timeout_keeps_what_was_shown(server, monkeypatch):
+    server.token_delay = 1.0
+    monkeypatch.setattr(utils, "_client", LLMClient(api_key="test", base_url=server.url, request_timeout=0.3,
+                                                    max_retries=0))
+    chat = _chat()
+    chunks = list(chat.generate_reply_stream("I can't sleep"))
+    assert chunks == ["🧠 ", DEFAULT_REPLY.split(" ")[0]]
+    assert chat.last_reply[0] == "🧠 " + chunks[1]
+
+
+def test_closing_the_async_stream_early_records_the_partial_reply(server):
+    async def main():
+        llm = AsyncLLMClient(api_key="test", base_url=server.url)
+        try:
+            chat = _chat()
+            replies = chat.generate_reply_stream_async("I can't sleep", llm)
+            chunks = [await replies.__anext__() for _ in range(3)]
+            # What chat_turn does when the client disconnects
+            await replies.aclose()
+            assert llm.stats()["in_flight"] == 0
+            return chat, chunks
+        finally:
+            await llm.aclose()
+
+    chat, chunks = asyncio.run(main())
+    assert chat.last_reply[0] == "".join(chunks)
+    assert chat.get_messages()[-1]["content"] == "".join(chunks)